@@ -1,10 +1,16 @@
 import json
-from typing import List, Dict, Any, Optional, Union
+import os
+import time
+from collections.abc import Sequence
+from typing import List, Dict, Any, Optional, Union, Iterable, Iterator, TextIO, Callable
 from datetime import datetime
 
 class ChatMessage:
     """Base class for all chat history entries"""
     
+    __slots__ = ("role", "timestamp")
+    type = ""
+    
     def __init__(self, role: str, timestamp: Optional[float] = None):
         self.role = role
         self.timestamp = timestamp or datetime.now().timestamp()
@@ -15,10 +21,12 @@ class ChatMessage:
 class TextMessage(ChatMessage):
     """Represents a text message in the chat history"""
     
+    __slots__ = ("content",)
+    type = "text"
+    
     def __init__(self, role: str, content: str, timestamp: Optional[float] = None):
         super().__init__(role, timestamp)
         self.content = content
-        self.type = "text"
 
     def __str__(self) -> str:
         return f"{self.role}: {self.content}"
@@ -30,10 +38,17 @@ class TextMessage(ChatMessage):
             "content": self.content,
             "timestamp": self.timestamp
         }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'TextMessage':
+        return cls(data.get("role", ""), data.get("content", ""), data.get("timestamp"))
 
 class ToolCallMessage(ChatMessage):
     """Represents a tool call in the chat history"""
     
+    __slots__ = ("tool_use_content",)
+    type = "tool_call"
+    
     def __init__(
         self, 
         tool_use_content: Any,
@@ -41,7 +56,6 @@ class ToolCallMessage(ChatMessage):
     ):
         super().__init__("tool_call", timestamp)
         self.tool_use_content = tool_use_content
-        self.type = "tool_call"
 
     def __str__(self) -> str:
         tool_use_content = json.dumps(self.tool_use_content, ensure_ascii=False) if self.tool_use_content else "{}"
@@ -53,10 +67,17 @@ class ToolCallMessage(ChatMessage):
             "tool_use_content": self.tool_use_content,
             "timestamp": self.timestamp
         }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ToolCallMessage':
+        return cls(data.get("tool_use_content"), data.get("timestamp"))
 
 class ToolResultMessage(ChatMessage):
     """Represents a tool result in the chat history"""
     
+    __slots__ = ("tool_use_id", "result")
+    type = "tool_result"
+    
     def __init__(
         self, 
         tool_use_id: str, 
@@ -66,7 +87,6 @@ class ToolResultMessage(ChatMessage):
         super().__init__("tool_result", timestamp)
         self.tool_use_id = tool_use_id
         self.result = result
-        self.type = "tool_result"
 
     def __str__(self) -> str:
         result_str = json.dumps(self.result, ensure_ascii=False) if self.result else "{}"
@@ -79,18 +99,329 @@ class ToolResultMessage(ChatMessage):
             "result": self.result,
             "timestamp": self.timestamp
         }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ToolResultMessage':
+        return cls(data.get("tool_use_id", ""), data.get("result"), data.get("timestamp"))
+
+MESSAGE_TYPES = {message_class.type: message_class for message_class in (TextMessage, ToolCallMessage, ToolResultMessage)}
+
+def message_from_dict(data: Dict[str, Any]) -> Optional[ChatMessage]:
+    """Rebuild a message from its to_dict() form, or return None for an unknown type"""
+    message_class = MESSAGE_TYPES.get(data.get("type", ""))
+    return message_class.from_dict(data) if message_class else None
+
+def _record_role(data: Dict[str, Any]) -> str:
+    # Tool calls and results are saved without a role: their role is their type
+    return data.get("role") or data.get("type", "")
+
+def _iter_jsonl_records(f: TextIO) -> Iterator[Dict[str, Any]]:
+    for line in f:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            # Torn last line of a log that was not closed cleanly
+            continue
+
+def _iter_json_document_records(f: TextIO, chunk_size: int = 1 << 16) -> Iterator[Dict[str, Any]]:
+    """Decode the entries of the "messages" array one at a time, reading the file in chunks"""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    eof = False
+
+    def read_more() -> bool:
+        nonlocal buffer, eof
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        buffer += chunk
+        return True
+
+    # Skip to the opening bracket of the messages array
+    while True:
+        key = buffer.find('"messages"')
+        start = buffer.find('[', key) if key >= 0 else -1
+        if start >= 0:
+            buffer = buffer[start + 1:]
+            break
+        if not read_more():
+            return
+
+    position = 0
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        if position == len(buffer):
+            buffer, position = "", 0
+            if not read_more():
+                return
+            continue
+        if buffer[position] == ']':
+            return
+        try:
+            record, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            buffer, position = buffer[position:], 0
+            if not read_more():
+                return
+            continue
+        yield record
+        position = end
+        if position > chunk_size:
+            buffer, position = buffer[position:], 0
+
+def iter_messages_from_file(
+    filepath: str,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    roles: Optional[Iterable[str]] = None,
+    types: Optional[Iterable[str]] = None
+) -> Iterator[ChatMessage]:
+    """Stream the messages of a saved history without loading the whole file.
+
+    Reads both JSON Lines logs written by JsonlHistoryWriter and JSON documents
+    written by save_to_file. Only messages with start <= timestamp < end and a
+    matching role (tool calls and results have the roles "tool_call" and
+    "tool_result") or type are built.
+    """
+    roles = set(roles) if roles is not None else None
+    types = set(types) if types is not None else None
+    with open(filepath, 'r', encoding='utf-8') as f:
+        first_line = f.readline()
+        f.seek(0)
+        try:
+            first = json.loads(first_line)
+            is_jsonl = isinstance(first, dict) and "type" in first
+        except json.JSONDecodeError:
+            is_jsonl = False
+        records = _iter_jsonl_records(f) if is_jsonl else _iter_json_document_records(f)
+
+        for record in records:
+            if not isinstance(record, dict):
+                continue
+            timestamp = record.get("timestamp") or 0
+            if start is not None and timestamp < start:
+                continue
+            if end is not None and timestamp >= end:
+                continue
+            if roles is not None and _record_role(record) not in roles:
+                continue
+            if types is not None and record.get("type") not in types:
+                continue
+            message = message_from_dict(record)
+            if message is not None:
+                yield message
+
+class MessageView(Sequence):
+    """Read-only window over a message list that does not copy it.
+
+    The window is fixed when the view is created: messages added later are
+    not part of it.
+    """
+    
+    __slots__ = ("_messages", "_start", "_stop")
+    
+    def __init__(self, messages: List[ChatMessage], start: int = 0, stop: Optional[int] = None):
+        self._messages = messages
+        self._start = start
+        self._stop = len(messages) if stop is None else stop
+    
+    def __len__(self) -> int:
+        return self._stop - self._start
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                return MessageView(self._messages, self._start + start, self._start + max(start, stop))
+            return [self._messages[self._start + i] for i in range(start, stop, step)]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("MessageView index out of range")
+        return self._messages[self._start + index]
+    
+    def __iter__(self):
+        for index in range(self._start, self._stop):
+            yield self._messages[index]
+    
+    def __repr__(self) -> str:
+        return f"MessageView({list(self)!r})"
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token), good enough for budgeting"""
+    return (len(text) + 3) // 4
+
+def estimate_bytes(text: str) -> int:
+    return len(text.encode('utf-8'))
+
+# Folds newly dropped messages into the previous summary: (summary, messages) -> summary
+Summarizer = Callable[[Optional[str], Sequence], str]
+
+def extractive_summarizer(max_chars: int = 1000) -> Summarizer:
+    """A summarizer that keeps the most recent user and assistant lines within max_chars.
+
+    It needs no model call; plug in an LLM-backed summarizer with the same
+    signature for abstractive summaries.
+    """
+    def summarize(summary: Optional[str], messages: Sequence) -> str:
+        lines = [summary] if summary else []
+        lines.extend(str(message) for message in messages if isinstance(message, TextMessage))
+        text = "\n".join(lines)
+        if len(text) > max_chars:
+            text = text[-max_chars:]
+            # Do not start in the middle of a line
+            newline = text.find("\n")
+            if 0 <= newline < len(text) - 1:
+                text = text[newline + 1:]
+        return text
+    return summarize
+
+class ConversationWindow:
+    """The most recent messages that fit a budget, plus a summary of everything before them"""
+    
+    __slots__ = ("messages", "summary", "dropped")
+    
+    def __init__(self, messages: MessageView, summary: Optional[str], dropped: int):
+        self.messages = messages
+        self.summary = summary
+        self.dropped = dropped
+    
+    def to_prompt(self) -> str:
+        """Format the window as text, e.g. to re-prime a new session's system prompt"""
+        lines = []
+        if self.summary:
+            lines.append(f"Summary of the earlier conversation:\n{self.summary}\n")
+        lines.extend(str(message) for message in self.messages)
+        return "\n".join(lines)
+
+class JsonlHistoryWriter:
+    """Appends chat history messages to a JSON Lines file as they are added.
+
+    Every message is one line, so persisting costs the same for the first
+    message of a session as for the ten-thousandth, and a crash loses at most
+    the batch that was not flushed yet.
+
+    fsync policy:
+    - "never": leave durability to the OS
+    - "flush": fsync after every batch (safest, slowest)
+    - "close": fsync once when the writer is closed
+    """
+
+    FSYNC_POLICIES = ("never", "flush", "close")
+
+    def __init__(
+        self,
+        filepath: str,
+        batch_size: int = 1,
+        flush_interval: Optional[float] = None,
+        fsync: str = "close"
+    ):
+        if fsync not in self.FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {self.FSYNC_POLICIES}")
+        directory = os.path.dirname(filepath)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.filepath = filepath
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.file = open(filepath, 'a', encoding='utf-8')
+        self.pending: List[str] = []
+        self.last_flush = time.monotonic()
+
+    def write(self, message: ChatMessage) -> None:
+        """Queue a message, flushing once the batch is full or the flush interval has passed"""
+        self.write_record(message.to_dict())
+
+    def write_record(self, record: Dict[str, Any]) -> None:
+        """Queue an already serialized message, see write"""
+        self.pending.append(json.dumps(record, ensure_ascii=False))
+        if len(self.pending) >= self.batch_size or (
+            self.flush_interval is not None and time.monotonic() - self.last_flush >= self.flush_interval
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the pending batch to the file"""
+        self.last_flush = time.monotonic()
+        if not self.pending:
+            return
+        self.file.write("\n".join(self.pending) + "\n")
+        self.pending.clear()
+        self.file.flush()
+        if self.fsync == "flush":
+            os.fsync(self.file.fileno())
+
+    def close(self) -> None:
+        """Flush pending messages and close the file"""
+        if self.file.closed:
+            return
+        self.flush()
+        if self.fsync != "never":
+            os.fsync(self.file.fileno())
+        self.file.close()
+
+    @staticmethod
+    def compact(filepath: str, output_path: Optional[str] = None) -> int:
+        """Rewrite a history log without torn or invalid lines, e.g. after a crash.
+
+        The compacted log is written to a temporary file and atomically moved
+        over output_path (the log itself by default). Returns the number of
+        messages kept.
+        """
+        output_path = output_path or filepath
+        temp_path = f"{output_path}.tmp"
+        kept = 0
+        with open(filepath, 'r', encoding='utf-8') as source, open(temp_path, 'w', encoding='utf-8') as target:
+            for line in source:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if not isinstance(record, dict) or "type" not in record:
+                    continue
+                target.write(line + "\n")
+                kept += 1
+            target.flush()
+            os.fsync(target.fileno())
+        os.replace(temp_path, output_path)
+        return kept
 
 class ChatHistory:
     """Manages the conversation history including messages and tool interactions"""
     
-    def __init__(self):
+    def __init__(self, writer: Optional[Any] = None):
         # All messages in chronological order
         self.messages: List[ChatMessage] = []
+        # Secondary indexes, kept in chronological order as messages are appended
+        self.by_role: Dict[str, List[ChatMessage]] = {}
+        self.by_type: Dict[str, List[ChatMessage]] = {}
+        # Optional log that receives every message as it is added
+        # (a JsonlHistoryWriter, or a history_writer.BackgroundHistoryWriter)
+        self.writer = writer
+        # Incremental summary of messages[:summary_upto], see get_window
+        self.summary: Optional[str] = None
+        self.summary_upto = 0
+    
+    def _append(self, message: ChatMessage) -> None:
+        self.messages.append(message)
+        self.by_role.setdefault(message.role, []).append(message)
+        self.by_type.setdefault(message.type, []).append(message)
+        if self.writer:
+            self.writer.write(message)
     
     def add_message(self, role: str, content: str) -> TextMessage:
         """Add a new text message to the chat history"""
         message = TextMessage(role, content)
-        self.messages.append(message)
+        self._append(message)
         return message
     
     def add_tool_call(
@@ -99,7 +430,7 @@ class ChatHistory:
     ) -> ToolCallMessage:
         """Add a tool call to the chat history"""
         message = ToolCallMessage(tool_use_content)
-        self.messages.append(message)
+        self._append(message)
         return message
     
     def add_tool_result(
@@ -109,7 +440,7 @@ class ChatHistory:
     ) -> ToolResultMessage:
         """Add a tool result to the chat history"""
         message = ToolResultMessage(tool_use_id, result)
-        self.messages.append(message)
+        self._append(message)
         return message
     
     def get_full_history(self) -> str:
@@ -120,25 +451,72 @@ class ChatHistory:
         
         return "\n".join(history_lines)
     
-    def get_last_n_messages(self, n: int) -> List[ChatMessage]:
-        """Get the last n messages in the chat history"""
-        return self.messages[-n:] if n < len(self.messages) else self.messages.copy()
+    def get_window(
+        self,
+        max_tokens: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        summarizer: Optional[Summarizer] = None
+    ) -> ConversationWindow:
+        """Get the most recent messages that fit a token and/or byte budget.
+
+        Only the messages inside the window are measured. With a summarizer,
+        messages that fall out of the window are folded into a cached summary,
+        so each call only summarizes the messages dropped since the last one.
+        The budget applies to the messages; the summarizer bounds the summary.
+        """
+        start = len(self.messages)
+        tokens = size = 0
+        while start > 0:
+            text = str(self.messages[start - 1])
+            if max_tokens is not None:
+                tokens += estimate_tokens(text) + 1
+                if tokens > max_tokens:
+                    break
+            if max_bytes is not None:
+                size += estimate_bytes(text) + 1
+                if size > max_bytes:
+                    break
+            start -= 1
+
+        if summarizer is None:
+            return ConversationWindow(MessageView(self.messages, start), None, start)
+
+        if start > self.summary_upto:
+            self.summary = summarizer(self.summary, MessageView(self.messages, self.summary_upto, start))
+            self.summary_upto = start
+        # Messages already in the summary are not repeated in the window
+        start = max(start, self.summary_upto)
+        return ConversationWindow(MessageView(self.messages, start), self.summary, start)
+    
+    def get_last_n_messages(self, n: int) -> MessageView:
+        """Get a view of the last n messages in the chat history"""
+        return MessageView(self.messages, max(0, len(self.messages) - max(n, 0)))
     
-    def get_messages_by_role(self, role: str) -> List[ChatMessage]:
-        """Get all messages with the specified role"""
-        return [msg for msg in self.messages if msg.role == role]
+    def get_messages_by_role(self, role: str) -> MessageView:
+        """Get a view of all messages with the specified role"""
+        return MessageView(self.by_role.get(role, []))
     
-    def get_tool_calls(self) -> List[ToolCallMessage]:
-        """Get all tool call messages"""
-        return [msg for msg in self.messages if isinstance(msg, ToolCallMessage)]
+    def get_tool_calls(self) -> MessageView:
+        """Get a view of all tool call messages"""
+        return MessageView(self.by_type.get(ToolCallMessage.type, []))
     
-    def get_tool_results(self) -> List[ToolResultMessage]:
-        """Get all tool result messages"""
-        return [msg for msg in self.messages if isinstance(msg, ToolResultMessage)]
+    def get_tool_results(self) -> MessageView:
+        """Get a view of all tool result messages"""
+        return MessageView(self.by_type.get(ToolResultMessage.type, []))
     
     def clear(self) -> None:
-        """Clear the chat history"""
-        self.messages.clear()
+        """Clear the chat history (messages already logged by the writer are kept)"""
+        # New lists, so views handed out earlier stay valid
+        self.messages = []
+        self.by_role = {}
+        self.by_type = {}
+        self.summary = None
+        self.summary_upto = 0
+    
+    def close(self) -> None:
+        """Flush and close the append-only log, if any"""
+        if self.writer:
+            self.writer.close()
     
     def to_dict(self) -> Dict[str, List[Dict[str, Any]]]:
         """Convert the chat history to a dictionary"""
@@ -153,29 +531,16 @@ class ChatHistory:
     @classmethod
     def from_dict(cls, data: Dict[str, List[Dict[str, Any]]]) -> 'ChatHistory':
         """Create a ChatHistory instance from a dictionary"""
+        return cls.from_messages(
+            message for message in map(message_from_dict, data.get("messages", [])) if message is not None
+        )
+    
+    @classmethod
+    def from_messages(cls, messages: Iterable[ChatMessage]) -> 'ChatHistory':
+        """Create a ChatHistory instance from existing messages, keeping their timestamps"""
         history = cls()
-        
-        for msg_data in data.get("messages", []):
-            msg_type = msg_data.get("type", "")
-            
-            if msg_type == "text":
-                history.add_text_message(
-                    msg_data.get("role", ""),
-                    msg_data.get("content", "")
-                )
-            elif msg_type == "tool_call":
-                history.add_tool_call(
-                    msg_data.get("tool_name", ""),
-                    msg_data.get("tool_use_id", ""),
-                    msg_data.get("input", {})
-                )
-            elif msg_type == "tool_result":
-                history.add_tool_result(
-                    msg_data.get("tool_name", ""),
-                    msg_data.get("tool_use_id", ""),
-                    msg_data.get("result", {})
-                )
-                
+        for message in messages:
+            history._append(message)
         return history
     
     @classmethod
@@ -190,8 +555,13 @@ class ChatHistory:
             f.write(self.to_json(indent=2))
     
     @classmethod
-    def load_from_file(cls, filepath: str) -> 'ChatHistory':
-        """Load chat history from a file"""
-        with open(filepath, 'r', encoding='utf-8') as f:
-            json_str = f.read()
-        return cls.from_json(json_str)
\ No newline at end of file
+    def load_from_file(
+        cls,
+        filepath: str,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        roles: Optional[Iterable[str]] = None,
+        types: Optional[Iterable[str]] = None
+    ) -> 'ChatHistory':
+        """Load chat history from a JSON or JSON Lines file, optionally filtered by time range, role or type"""
+        return cls.from_messages(iter_messages_from_file(filepath, start, end, roles, types))
\ No newline at end of file
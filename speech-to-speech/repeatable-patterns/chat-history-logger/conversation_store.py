@@ -0,0 +1,320 @@
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from chat_history import ChatHistory, ChatMessage, iter_messages_from_file, message_from_dict
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    metadata TEXT
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    session_id TEXT NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp REAL
+);
+CREATE INDEX IF NOT EXISTS messages_session ON messages(session_id, seq);
+CREATE INDEX IF NOT EXISTS messages_timestamp ON messages(timestamp);
+CREATE TABLE IF NOT EXISTS tool_calls (
+    id INTEGER PRIMARY KEY,
+    session_id TEXT NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    tool_use_id TEXT,
+    tool_name TEXT,
+    content TEXT,
+    timestamp REAL
+);
+CREATE INDEX IF NOT EXISTS tool_calls_session ON tool_calls(session_id, seq);
+CREATE INDEX IF NOT EXISTS tool_calls_name ON tool_calls(tool_name);
+CREATE TABLE IF NOT EXISTS tool_results (
+    id INTEGER PRIMARY KEY,
+    session_id TEXT NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    tool_use_id TEXT,
+    result TEXT,
+    timestamp REAL
+);
+CREATE INDEX IF NOT EXISTS tool_results_session ON tool_results(session_id, seq);
+CREATE INDEX IF NOT EXISTS tool_results_tool_use ON tool_results(tool_use_id);
+"""
+
+# Full-text index over message content, kept in sync with the messages table by triggers
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    content, content='messages', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+END;
+"""
+
+
+def _to_json(value: Any) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _from_json(value: Optional[str]) -> Any:
+    if value is None:
+        return None
+    try:
+        return json.loads(value)
+    except json.JSONDecodeError:
+        return value
+
+
+def _tool_call_fields(tool_use_content: Any) -> Dict[str, Any]:
+    """Pull the tool use id and tool name out of a toolUse event, if it is one"""
+    if isinstance(tool_use_content, str):
+        tool_use_content = _from_json(tool_use_content)
+    if not isinstance(tool_use_content, dict):
+        return {"tool_use_id": None, "tool_name": None}
+    return {"tool_use_id": tool_use_content.get("toolUseId"), "tool_name": tool_use_content.get("toolName")}
+
+
+class ConversationStore:
+    """SQLite store of chat histories with full-text search over message text.
+
+    Sessions, text messages, tool calls and tool results live in separate
+    tables sharing a per-session sequence number, so a session can be reloaded
+    in its original order. The database runs in WAL mode, so searches can run
+    while sessions are being written. Each save or append is a single
+    transaction with bulk inserts.
+
+    Full-text search uses FTS5 when the SQLite build includes it, and falls
+    back to a LIKE scan otherwise.
+    """
+
+    def __init__(self, database: str):
+        directory = os.path.dirname(database)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.database = database
+        self.connection = sqlite3.connect(database)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("PRAGMA foreign_keys=ON")
+        self.connection.executescript(SCHEMA)
+        try:
+            self.connection.executescript(FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError:
+            self.fts = False
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self) -> 'ConversationStore':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _next_seq(self, session_id: str) -> int:
+        row = self.connection.execute(
+            "SELECT message_count FROM sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def append_records(
+        self,
+        session_id: str,
+        records: Iterable[Dict[str, Any]],
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> int:
+        """Append serialized messages (ChatMessage.to_dict() records) to a session in one transaction.
+
+        Returns the number of records stored.
+        """
+        now = time.time()
+        texts, calls, results = [], [], []
+        with self.connection:
+            seq = self._next_seq(session_id)
+            for record in records:
+                record_type = record.get("type")
+                timestamp = record.get("timestamp")
+                if record_type == "text":
+                    texts.append((session_id, seq, record.get("role", ""), record.get("content") or "", timestamp))
+                elif record_type == "tool_call":
+                    content = record.get("tool_use_content")
+                    fields = _tool_call_fields(content)
+                    calls.append((session_id, seq, fields["tool_use_id"], fields["tool_name"], _to_json(content), timestamp))
+                elif record_type == "tool_result":
+                    results.append((session_id, seq, record.get("tool_use_id"), _to_json(record.get("result")), timestamp))
+                else:
+                    continue
+                seq += 1
+
+            self.connection.execute(
+                "INSERT INTO sessions (id, created, updated, message_count, metadata) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET updated = excluded.updated, message_count = excluded.message_count, "
+                "metadata = COALESCE(excluded.metadata, sessions.metadata)",
+                (session_id, now, now, seq, _to_json(metadata))
+            )
+            self.connection.executemany(
+                "INSERT INTO messages (session_id, seq, role, content, timestamp) VALUES (?, ?, ?, ?, ?)", texts
+            )
+            self.connection.executemany(
+                "INSERT INTO tool_calls (session_id, seq, tool_use_id, tool_name, content, timestamp) "
+                "VALUES (?, ?, ?, ?, ?, ?)", calls
+            )
+            self.connection.executemany(
+                "INSERT INTO tool_results (session_id, seq, tool_use_id, result, timestamp) VALUES (?, ?, ?, ?, ?)",
+                results
+            )
+        return len(texts) + len(calls) + len(results)
+
+    def append_messages(self, session_id: str, messages: Iterable[ChatMessage]) -> int:
+        """Append messages to a session in one transaction"""
+        return self.append_records(session_id, (message.to_dict() for message in messages))
+
+    def save_history(
+        self,
+        session_id: str,
+        history: ChatHistory,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> int:
+        """Store a whole chat history as a session, replacing any session with the same id"""
+        self.delete_session(session_id)
+        return self.append_records(session_id, (message.to_dict() for message in history.messages), metadata)
+
+    def import_file(self, filepath: str, session_id: Optional[str] = None) -> int:
+        """Store a saved JSON or JSON Lines chat history as a session named after the file"""
+        session_id = session_id or os.path.splitext(os.path.basename(filepath))[0]
+        self.delete_session(session_id)
+        return self.append_messages(session_id, iter_messages_from_file(filepath))
+
+    def delete_session(self, session_id: str) -> None:
+        with self.connection:
+            for table in ("messages", "tool_calls", "tool_results"):
+                self.connection.execute(f"DELETE FROM {table} WHERE session_id = ?", (session_id,))
+            self.connection.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def sessions(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """Return the most recently updated sessions"""
+        rows = self.connection.execute(
+            "SELECT id, created, updated, message_count, metadata FROM sessions ORDER BY updated DESC LIMIT ?",
+            (limit,)
+        )
+        return [dict(row, metadata=_from_json(row["metadata"])) for row in rows]
+
+    def load_session(self, session_id: str) -> ChatHistory:
+        """Rebuild a session's ChatHistory in its original order"""
+        rows = self.connection.execute(
+            "SELECT seq, 'text' AS type, role, content, NULL AS tool_use_id, NULL AS result, timestamp "
+            "FROM messages WHERE session_id = :id "
+            "UNION ALL SELECT seq, 'tool_call', NULL, content, tool_use_id, NULL, timestamp "
+            "FROM tool_calls WHERE session_id = :id "
+            "UNION ALL SELECT seq, 'tool_result', NULL, NULL, tool_use_id, result, timestamp "
+            "FROM tool_results WHERE session_id = :id "
+            "ORDER BY seq",
+            {"id": session_id}
+        )
+        messages = []
+        for row in rows:
+            if row["type"] == "text":
+                record = {"type": "text", "role": row["role"], "content": row["content"]}
+            elif row["type"] == "tool_call":
+                record = {"type": "tool_call", "tool_use_content": _from_json(row["content"])}
+            else:
+                record = {"type": "tool_result", "tool_use_id": row["tool_use_id"], "result": _from_json(row["result"])}
+            record["timestamp"] = row["timestamp"]
+            messages.append(message_from_dict(record))
+        return ChatHistory.from_messages(messages)
+
+    def search(
+        self,
+        query: str,
+        limit: int = 20,
+        session_id: Optional[str] = None,
+        role: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Find text messages matching a full-text query, best matches first.
+
+        With FTS5 the query supports its syntax: phrases ("track my order"),
+        prefixes (refund*) and boolean operators (refund AND NOT policy).
+        """
+        filters, params = [], []
+        if session_id is not None:
+            filters.append("m.session_id = ?")
+            params.append(session_id)
+        if role is not None:
+            filters.append("m.role = ?")
+            params.append(role)
+
+        if self.fts:
+            sql = (
+                "SELECT m.session_id, m.seq, m.role, m.content, m.timestamp, "
+                "snippet(messages_fts, 0, '[', ']', '...', 12) AS snippet "
+                "FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid "
+                "WHERE messages_fts MATCH ?"
+            )
+            params.insert(0, query)
+            order = "ORDER BY bm25(messages_fts)"
+        else:
+            sql = (
+                "SELECT m.session_id, m.seq, m.role, m.content, m.timestamp, m.content AS snippet "
+                "FROM messages m WHERE m.content LIKE ?"
+            )
+            params.insert(0, f"%{query}%")
+            order = "ORDER BY m.timestamp DESC"
+        for condition in filters:
+            sql += f" AND {condition}"
+        rows = self.connection.execute(f"{sql} {order} LIMIT ?", (*params, limit))
+        return [dict(row) for row in rows]
+
+    def tool_calls(self, tool_name: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """Return the latest calls of a tool with their results"""
+        rows = self.connection.execute(
+            "SELECT c.session_id, c.tool_use_id, c.content, r.result, c.timestamp "
+            "FROM tool_calls c LEFT JOIN tool_results r "
+            "ON r.session_id = c.session_id AND r.tool_use_id = c.tool_use_id "
+            "WHERE c.tool_name = ? ORDER BY c.timestamp DESC LIMIT ?",
+            (tool_name, limit)
+        )
+        return [dict(row, content=_from_json(row["content"]), result=_from_json(row["result"])) for row in rows]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Import and search chat histories')
+    parser.add_argument('--db', default=os.path.join("chat_histories", "chat_history.db"), help='SQLite database')
+    commands = parser.add_subparsers(dest='command', required=True)
+    import_parser = commands.add_parser('import', help='Import saved .json/.jsonl chat histories')
+    import_parser.add_argument('files', nargs='+')
+    search_parser = commands.add_parser('search', help='Full-text search over messages')
+    search_parser.add_argument('query')
+    search_parser.add_argument('--role')
+    search_parser.add_argument('--session')
+    search_parser.add_argument('--limit', type=int, default=20)
+    commands.add_parser('sessions', help='List the most recent sessions')
+    args = parser.parse_args()
+
+    with ConversationStore(args.db) as store:
+        if args.command == 'import':
+            for filepath in args.files:
+                print(f"{filepath}: {store.import_file(filepath)} messages")
+        elif args.command == 'search':
+            start = time.perf_counter()
+            matches = store.search(args.query, limit=args.limit, session_id=args.session, role=args.role)
+            for match in matches:
+                print(f"{match['session_id']} #{match['seq']} {match['role']}: {match['snippet']}")
+            print(f"{len(matches)} matches in {(time.perf_counter() - start) * 1000:.1f} ms")
+        else:
+            for session in store.sessions():
+                print(f"{session['id']}: {session['message_count']} messages")
@@ -0,0 +1,194 @@
+import json
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from chat_history import ChatMessage, JsonlHistoryWriter
+from conversation_store import ConversationStore
+
+
+class JsonlFileSink:
+    """Appends batches of messages to a local JSON Lines log"""
+
+    def __init__(self, filepath: str, fsync: str = "close"):
+        self.filepath = filepath
+        self.fsync = fsync
+        self.writer: Optional[JsonlHistoryWriter] = None
+
+    def write_batch(self, records: List[Dict[str, Any]]) -> None:
+        # Opened on first use so the directory is created on the writer thread
+        if self.writer is None:
+            self.writer = JsonlHistoryWriter(self.filepath, batch_size=len(records) + 1, fsync=self.fsync)
+        for record in records:
+            self.writer.write_record(record)
+        self.writer.flush()
+
+    def close(self) -> None:
+        if self.writer:
+            self.writer.close()
+
+    def __str__(self) -> str:
+        return self.filepath
+
+
+class SqliteSink:
+    """Appends batches of messages to a session in a ConversationStore, one transaction per batch"""
+
+    def __init__(self, database: str, session_id: str):
+        self.database = database
+        self.session_id = session_id
+        self.store: Optional[ConversationStore] = None
+
+    def write_batch(self, records: List[Dict[str, Any]]) -> None:
+        # SQLite connections belong to the thread that opened them: open on the writer thread
+        if self.store is None:
+            self.store = ConversationStore(self.database)
+        self.store.append_records(self.session_id, records)
+
+    def close(self) -> None:
+        if self.store:
+            self.store.close()
+
+    def __str__(self) -> str:
+        return f"{self.database} (session {self.session_id})"
+
+
+class LocalObjectStore:
+    """Stand-in for an S3 client that stores objects as files under a directory.
+
+    Implements the put_object call used by ObjectStoreSink, so the sink can be
+    exercised without an AWS account.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes, **kwargs) -> Dict[str, Any]:
+        path = os.path.join(self.directory, Bucket, *Key.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(Body)
+        return {}
+
+
+class ObjectStoreSink:
+    """Uploads each batch of messages as a JSON Lines object to an S3-compatible store.
+
+    Objects cannot be appended to, so batches are written as numbered parts
+    under <prefix>/<session_id>/. Pass a boto3 S3 client (any endpoint that
+    speaks the S3 API works) or a LocalObjectStore.
+    """
+
+    def __init__(self, client: Any, bucket: str, session_id: str, prefix: str = "chat_histories"):
+        self.client = client
+        self.bucket = bucket
+        self.session_id = session_id
+        self.prefix = prefix.strip("/")
+        self.part = 0
+
+    def write_batch(self, records: List[Dict[str, Any]]) -> None:
+        self.part += 1
+        body = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        self.client.put_object(
+            Bucket=self.bucket,
+            Key=f"{self.prefix}/{self.session_id}/part-{self.part:05d}.jsonl",
+            Body=body.encode('utf-8'),
+            ContentType="application/x-ndjson"
+        )
+
+    def close(self) -> None:
+        pass
+
+    def __str__(self) -> str:
+        return f"{self.bucket}/{self.prefix}/{self.session_id}/"
+
+
+class BackgroundHistoryWriter:
+    """Persists chat history on a dedicated thread so the caller never waits on I/O.
+
+    write() only puts the serialized message on a queue. The writer thread
+    collects messages into batches of up to batch_size, or whatever arrived
+    within flush_interval seconds, and hands each batch to the sink. A sink
+    error is reported and counted but does not stop the thread.
+
+    Can be passed to ChatHistory as its writer.
+    """
+
+    _FLUSH = object()
+    _CLOSE = object()
+
+    def __init__(self, sink: Any, batch_size: int = 50, flush_interval: float = 1.0):
+        self.sink = sink
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.queue: queue.Queue = queue.Queue()
+        self.counters = {"written": 0, "batches": 0, "failed": 0}
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name="chat-history-writer", daemon=True)
+        self.thread.start()
+
+    def write(self, message: ChatMessage) -> None:
+        """Queue a message for the writer thread"""
+        if not self.closed:
+            self.queue.put(message.to_dict())
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until every message queued so far has been handed to the sink"""
+        done = threading.Event()
+        self.queue.put((self._FLUSH, done))
+        return done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Write the remaining messages, close the sink and stop the thread"""
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(self._CLOSE)
+        self.thread.join(timeout)
+
+    def _run(self) -> None:
+        batch: List[Dict[str, Any]] = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, dict):
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(batch) < self.batch_size:
+                    continue
+
+            self._write_batch(batch)
+            batch = []
+            deadline = None
+            if isinstance(item, tuple):
+                item[1].set()
+            elif item is self._CLOSE:
+                break
+
+        try:
+            self.sink.close()
+        except Exception as ex:
+            print(f"Error closing chat history sink {self.sink}: {ex}")
+
+    def _write_batch(self, batch: List[Dict[str, Any]]) -> None:
+        if not batch:
+            return
+        try:
+            self.sink.write_batch(batch)
+            self.counters["written"] += len(batch)
+            self.counters["batches"] += 1
+        except Exception as ex:
+            self.counters["failed"] += len(batch)
+            print(f"Error writing chat history to {self.sink}: {ex}")
+
+    def stats(self) -> Dict[str, int]:
+        """Return written/failed counters and the current queue depth"""
+        return dict(self.counters, queued=self.queue.qsize())
@@ -16,6 +16,7 @@ from aws_sdk_bedrock_runtime.models import InvokeModelWithBidirectionalStreamInp
 from aws_sdk_bedrock_runtime.config import Config, HTTPAuthSchemeResolver, SigV4AuthScheme
 from smithy_aws_core.credentials_resolvers.environment import EnvironmentCredentialsResolver
 from chat_history import ChatHistory
+from history_writer import BackgroundHistoryWriter, JsonlFileSink, SqliteSink, ObjectStoreSink, LocalObjectStore
 
 # Suppress warnings
 warnings.filterwarnings("ignore")
@@ -27,6 +28,13 @@ CHANNELS = 1
 FORMAT = pyaudio.paInt16
 CHUNK_SIZE = 1024  # Number of frames per buffer
 
+# Chat history logs are written here as JSON Lines, one message per line
+CHAT_HISTORY_DIRECTORY = "chat_histories"
+# Where the background writer persists chat history: "file", "sqlite" or "s3"
+CHAT_HISTORY_SINK = os.getenv("CHAT_HISTORY_SINK", "file")
+# Bucket for the "s3" sink; without one, objects are stored under CHAT_HISTORY_DIRECTORY instead
+CHAT_HISTORY_BUCKET = os.getenv("CHAT_HISTORY_BUCKET")
+
 # Debug mode flag
 DEBUG = False
 
@@ -287,8 +295,22 @@ class BedrockStreamManager:
         self.toolUseId = ""
         self.toolName = ""
 
-        # Chat history
-        self.chat_history = ChatHistory()
+        # Chat history, persisted by a background thread so logging never blocks the audio loop
+        self.chat_history_sink = self._create_history_sink(
+            f"chat_history_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        )
+        self.chat_history = ChatHistory(writer=BackgroundHistoryWriter(self.chat_history_sink))
+
+    def _create_history_sink(self, session_id):
+        """Create the chat history sink selected by CHAT_HISTORY_SINK"""
+        if CHAT_HISTORY_SINK == "sqlite":
+            return SqliteSink(os.path.join(CHAT_HISTORY_DIRECTORY, "chat_history.db"), session_id)
+        if CHAT_HISTORY_SINK == "s3":
+            if CHAT_HISTORY_BUCKET:
+                import boto3
+                return ObjectStoreSink(boto3.client("s3", region_name=self.region), CHAT_HISTORY_BUCKET, session_id)
+            return ObjectStoreSink(LocalObjectStore(CHAT_HISTORY_DIRECTORY), "local", session_id)
+        return JsonlFileSink(os.path.join(CHAT_HISTORY_DIRECTORY, f"{session_id}.jsonl"))
 
     def _initialize_client(self):
         """Initialize the Bedrock client."""
@@ -664,20 +686,16 @@ class BedrockStreamManager:
     
     async def save_chat_history_to_file(self, directory="chat_histories"):
         """Save the current chat history to a timestamped file"""
-        import os
-        from datetime import datetime
-        
-        # Create directory if it doesn't exist
-        if not os.path.exists(directory):
-            os.makedirs(directory)
-        
         # Generate filename with timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"chat_history_{timestamp}.json"
         filepath = os.path.join(directory, filename)
         
-        # Save chat history to file
-        self.chat_history.save_to_file(filepath)
+        # Save chat history to file off the event loop
+        def save():
+            os.makedirs(directory, exist_ok=True)
+            self.chat_history.save_to_file(filepath)
+        await asyncio.to_thread(save)
         print(f"Chat history saved to {filepath}")
         
         return filepath
@@ -688,7 +706,9 @@ class BedrockStreamManager:
             return
        
         self.is_active = False
-        await self.save_chat_history_to_file()
+        # Waiting for the writer thread to drain happens off the event loop
+        await asyncio.to_thread(self.chat_history.close)
+        print(f"Chat history saved to {self.chat_history_sink}")
         
         if self.response_task and not self.response_task.done():
             self.response_task.cancel()
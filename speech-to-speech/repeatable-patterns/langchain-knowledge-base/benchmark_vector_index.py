@@ -0,0 +1,107 @@
+"""
+Compare top-k search latency of Chroma with the NumPy vector index.
+
+By default the benchmark runs against the knowledge base in PERSIST_DIRECTORY.
+It embeds the sample queries once through Bedrock, so only search time is
+measured. With --synthetic N it instead fills a temporary Chroma collection
+with N random embeddings and needs no AWS access.
+
+    python benchmark_vector_index.py
+    python benchmark_vector_index.py --synthetic 20000 --runs 200
+"""
+import argparse
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from langchain_community.vectorstores import Chroma
+
+from vector_index import NumpyVectorIndex
+
+SAMPLE_QUERIES = [
+    "What medical benefits does Aglaia offer?",
+    "Tell me about the vision coverage",
+    "What are the retirement benefits?",
+    "How does the dental plan work?",
+    "How many days of paid time off do employees get?",
+    "Is there a health savings account?",
+    "What life insurance is provided?",
+    "Who is eligible for benefits?",
+]
+
+
+def measure(search, query_vectors, runs):
+    """Run searches round-robin over the query vectors and return latencies in milliseconds"""
+    for query_vector in query_vectors:
+        search(query_vector)
+    latencies = []
+    for run in range(runs):
+        query_vector = query_vectors[run % len(query_vectors)]
+        start = time.perf_counter()
+        search(query_vector)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def report(name, latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"{name:<14} mean {statistics.mean(latencies):8.3f} ms   p50 {statistics.median(latencies):8.3f} ms   "
+          f"p95 {p95:8.3f} ms")
+
+
+def synthetic_store(count, dimensions, directory):
+    """A Chroma store of random embeddings and matching queries"""
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((count, dimensions)).astype(np.float32)
+    vectordb = Chroma(collection_name="benchmark", persist_directory=directory)
+    for start in range(0, count, 5000):
+        rows = range(start, min(start + 5000, count))
+        vectordb._collection.upsert(
+            ids=[str(row) for row in rows],
+            embeddings=vectors[start:start + 5000].tolist(),
+            documents=[f"chunk {row}" for row in rows],
+            metadatas=[{"row": row} for row in rows]
+        )
+    # Queries near stored vectors, like real questions near their answer
+    query_vectors = vectors[rng.choice(count, size=50)] + 0.5 * rng.standard_normal((50, dimensions))
+    return vectordb, query_vectors.astype(np.float32).tolist()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Chroma vs NumPy vector index search latency')
+    parser.add_argument('--synthetic', type=int, metavar='N', help='Benchmark N random embeddings instead of the KB')
+    parser.add_argument('--dimensions', type=int, default=1536, help='Embedding size for --synthetic')
+    parser.add_argument('--runs', type=int, default=100)
+    parser.add_argument('-k', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_directory:
+        if args.synthetic:
+            vectordb, query_vectors = synthetic_store(args.synthetic, args.dimensions, temp_directory + "/chroma")
+        else:
+            from langchain_kb import get_retriever
+            retriever = get_retriever()
+            vectordb = retriever.vectordb
+            query_vectors = [retriever.query_embeddings.embed_query(query) for query in SAMPLE_QUERIES]
+
+        NumpyVectorIndex.build_from_chroma(vectordb, temp_directory + "/index", quantize=True)
+        index = NumpyVectorIndex(temp_directory + "/index", quantized=False)
+        quantized_index = NumpyVectorIndex(temp_directory + "/index", quantized=True)
+        print(f"{len(index)} vectors, {len(query_vectors)} queries, {args.runs} runs, k={args.k}\n")
+
+        report("chroma", measure(lambda v: vectordb.similarity_search_by_vector(v, k=args.k), query_vectors, args.runs))
+        report("numpy float32", measure(lambda v: index.search(v, args.k), query_vectors, args.runs))
+        report("numpy int8", measure(lambda v: quantized_index.search(v, args.k), query_vectors, args.runs))
+
+        # The int8 index is approximate: how often does it return the same top-k?
+        same = sum(
+            [row for row, _ in index.search(v, args.k)] == [row for row, _ in quantized_index.search(v, args.k)]
+            for v in query_vectors
+        )
+        print(f"\nint8 top-{args.k} identical to float32 for {same}/{len(query_vectors)} queries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+
+def normalize_query(text: str) -> str:
+    """Cache key of a query: case, punctuation and spacing do not change its meaning"""
+    return " ".join(re.sub(r"[^\w\s']", " ", text.casefold()).split())
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    Wraps an embeddings model with an LRU cache of query embeddings.
+
+    Only embed_query is cached: questions repeat, documents are embedded once at
+    ingest time. Queries are keyed by their normalized text, so "What is the
+    dental plan?" and "what is the dental plan" share one entry.
+
+    With cache_path set, every new embedding is appended to a JSON Lines file
+    and the most recent max_entries are loaded back on start-up, so the cache
+    survives restarts. Entries are tagged with the model id and only entries
+    of the current model are loaded.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        max_entries: int = 1024,
+        cache_path: Optional[str] = None,
+        model_id: Optional[str] = None
+    ):
+        self.embeddings = embeddings
+        self.max_entries = max(1, max_entries)
+        self.cache_path = cache_path
+        self.model_id = model_id or getattr(embeddings, "model_id", None)
+        self.entries: "OrderedDict[str, List[float]]" = OrderedDict()
+        self.counters = {"hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+        if cache_path:
+            self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.cache_path):
+            return
+        lines = 0
+        with open(self.cache_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                lines += 1
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if not isinstance(record, dict) or record.get("model") != self.model_id:
+                    continue
+                self.entries[record["key"]] = record["embedding"]
+                self.entries.move_to_end(record["key"])
+                if len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+        # Drop evicted, duplicate and torn lines once the file has grown well past the cache
+        if lines > 2 * self.max_entries:
+            self._rewrite()
+
+    def _rewrite(self) -> None:
+        temp_path = f"{self.cache_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for key, embedding in self.entries.items():
+                f.write(json.dumps({"model": self.model_id, "key": key, "embedding": embedding}) + "\n")
+        os.replace(temp_path, self.cache_path)
+
+    def _persist(self, key: str, embedding: List[float]) -> None:
+        directory = os.path.dirname(self.cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.cache_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({"model": self.model_id, "key": key, "embedding": embedding}) + "\n")
+
+    def embed_query(self, text: str) -> List[float]:
+        key = normalize_query(text)
+        with self._lock:
+            embedding = self.entries.get(key)
+            if embedding is not None:
+                self.entries.move_to_end(key)
+                self.counters["hits"] += 1
+                return embedding
+            self.counters["misses"] += 1
+
+        # Embed outside the lock so one slow call does not hold up cache hits
+        embedding = self.embeddings.embed_query(text)
+        with self._lock:
+            self.entries[key] = embedding
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            if self.cache_path:
+                self._persist(key, embedding)
+        return embedding
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def clear(self) -> None:
+        """Drop all cached embeddings, including the on-disk cache"""
+        with self._lock:
+            self.entries.clear()
+            if self.cache_path and os.path.exists(self.cache_path):
+                os.remove(self.cache_path)
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters, hit rate and the number of cached queries"""
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return dict(
+            self.counters,
+            entries=len(self.entries),
+            hitRate=round(self.counters["hits"] / lookups, 3) if lookups else 0.0
+        )
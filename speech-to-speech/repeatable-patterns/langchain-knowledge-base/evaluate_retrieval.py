@@ -0,0 +1,92 @@
+"""
+Measure retrieval quality and latency on the bundled benefit policy query set.
+
+Each line of kb/eval_queries.jsonl has a question and the PDF pages (0-based)
+that answer it. A retrieved chunk counts as relevant if it comes from one of
+those pages. For each retrieval mode the script reports:
+
+- hit@k: share of questions with at least one relevant chunk in the top k
+- precision@k: share of relevant chunks in the top k
+- MRR: mean reciprocal rank of the first relevant chunk
+- p50/p95 latency of the search itself, with query embeddings cached first
+
+    python evaluate_retrieval.py
+    python evaluate_retrieval.py --modes keyword hybrid+proximity -k 3
+"""
+import argparse
+import json
+import statistics
+import time
+
+from langchain_kb import HybridRetriever, KnowledgeBaseRetriever, NumpyIndexRetriever, PERSIST_DIRECTORY
+from hybrid_search import CrossEncoderReranker, ProximityReranker
+
+QUERY_SET = "./kb/eval_queries.jsonl"
+MODES = ["vector", "keyword", "hybrid", "hybrid+proximity", "hybrid+cross-encoder"]
+
+
+def load_queries(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate(search, queries, k):
+    hits, precision, reciprocal_ranks, latencies = 0, 0.0, 0.0, []
+    for item in queries:
+        start = time.perf_counter()
+        results = search(item["query"], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        relevant = [result["metadata"].get("page") in item["pages"] for result in results[:k]]
+        hits += any(relevant)
+        precision += sum(relevant) / k
+        reciprocal_ranks += next((1.0 / rank for rank, is_relevant in enumerate(relevant, 1) if is_relevant), 0.0)
+    latencies.sort()
+    return {
+        "hit": hits / len(queries),
+        "precision": precision / len(queries),
+        "mrr": reciprocal_ranks / len(queries),
+        "p50": statistics.median(latencies),
+        "p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluate knowledge base retrieval on the bundled query set')
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES[:4])
+    parser.add_argument('--backend', choices=["chroma", "numpy"], default="chroma")
+    parser.add_argument('--queries', default=QUERY_SET)
+    parser.add_argument('-k', type=int, default=3)
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries)
+    retriever_class = NumpyIndexRetriever if args.backend == "numpy" else KnowledgeBaseRetriever
+    hybrid = HybridRetriever(retriever_class(PERSIST_DIRECTORY), reranker=None)
+    hybrid.warm_up()
+    if any(mode != "keyword" for mode in args.modes):
+        # Embed every question once so the latencies below measure search, not Bedrock
+        for item in queries:
+            hybrid.retriever.query_embeddings.embed_query(item["query"])
+
+    searches = {
+        "vector": lambda query, k: hybrid.vector_search(query, k),
+        "keyword": lambda query, k: hybrid.keyword_search(query, k),
+        "hybrid": hybrid.retrieve,
+    }
+
+    print(f"{len(queries)} queries, k={args.k}, {args.backend} vector backend\n")
+    print(f"{'mode':<22}{'hit@k':>8}{'prec@k':>8}{'MRR':>8}{'p50 ms':>10}{'p95 ms':>10}")
+    for mode in args.modes:
+        if mode.startswith("hybrid+"):
+            hybrid.reranker = (ProximityReranker(hybrid.keyword_index.idf) if mode == "hybrid+proximity"
+                               else CrossEncoderReranker())
+            search = hybrid.retrieve
+        else:
+            hybrid.reranker = None
+            search = searches[mode]
+        result = evaluate(search, queries, args.k)
+        print(f"{mode:<22}{result['hit']:>8.2f}{result['precision']:>8.2f}{result['mrr']:>8.2f}"
+              f"{result['p50']:>10.2f}{result['p95']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
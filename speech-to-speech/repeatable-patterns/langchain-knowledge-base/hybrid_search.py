@@ -0,0 +1,168 @@
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Words too common to help ranking
+STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how", "i", "if", "in",
+    "is", "it", "many", "me", "much", "my", "of", "on", "or", "tell", "that", "the", "there", "this", "to",
+    "what", "when", "where", "which", "who", "with", "you", "your"
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase terms with numbers and plan names kept whole: "$2,200,000" -> "2200000", "401(k)" -> "401k" """
+    text = text.lower().replace("’", "'")
+    text = re.sub(r"(?<=\d),(?=\d{3})", "", text)
+    text = re.sub(r"\((\w)\)", r"\1", text)
+    return [term for term in re.findall(r"[a-z0-9]+(?:[.'][a-z0-9]+)*", text) if term not in STOP_WORDS]
+
+
+class BM25Index:
+    """
+    Okapi BM25 inverted index over knowledge base chunks.
+
+    Complements embedding search on exact terms such as plan names, dollar
+    amounts and week counts, which embeddings tend to blur. Built at ingest
+    time and saved as JSON next to the vector store.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids: List[str] = []
+        self.documents: List[Dict[str, Any]] = []
+        self.lengths: List[int] = []
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.idf: Dict[str, float] = {}
+        self.rows: Dict[str, int] = {}
+        self.average_length = 0.0
+
+    @classmethod
+    def build(
+        cls,
+        ids: Sequence[str],
+        documents: Sequence[str],
+        metadatas: Optional[Sequence[Dict[str, Any]]] = None,
+        **kwargs
+    ) -> 'BM25Index':
+        index = cls(**kwargs)
+        metadatas = metadatas or [{}] * len(documents)
+        for row, (doc_id, content, metadata) in enumerate(zip(ids, documents, metadatas)):
+            terms = Counter(tokenize(content))
+            index.ids.append(doc_id)
+            index.documents.append({"content": content, "metadata": metadata or {}})
+            index.lengths.append(sum(terms.values()))
+            for term, frequency in terms.items():
+                index.postings.setdefault(term, []).append((row, frequency))
+        index._prepare()
+        return index
+
+    def _prepare(self) -> None:
+        count = len(self.ids)
+        self.rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self.average_length = sum(self.lengths) / count if count else 0.0
+        self.idf = {
+            term: math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+    def save(self, path: str) -> None:
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "k1": self.k1, "b": self.b, "ids": self.ids, "documents": self.documents,
+                "lengths": self.lengths, "postings": self.postings
+            }, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'BM25Index':
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        index = cls(data["k1"], data["b"])
+        index.ids = data["ids"]
+        index.documents = data["documents"]
+        index.lengths = data["lengths"]
+        index.postings = {term: [tuple(posting) for posting in postings] for term, postings in data["postings"].items()}
+        index._prepare()
+        return index
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """Return (chunk id, BM25 score) of the k best matching chunks"""
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for row, frequency in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[row] / self.average_length)
+                scores[row] = scores.get(row, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.ids[row], score) for row, score in best]
+
+    def document(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        """Return the content and metadata of a chunk"""
+        row = self.rows.get(doc_id)
+        return self.documents[row] if row is not None else None
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists: each id scores sum(1 / (k + rank)) over the lists it appears in"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class ProximityReranker:
+    """
+    Dependency-free reranker that rewards chunks covering the rare query terms close together.
+
+    Each candidate scores the IDF-weighted share of query terms it contains,
+    plus a bonus when the matched terms fall within a short span.
+    """
+
+    def __init__(self, idf: Dict[str, float]):
+        self.idf = idf
+
+    def score(self, query: str, content: str) -> float:
+        query_terms = set(tokenize(query))
+        if not query_terms:
+            return 0.0
+        weights = {term: self.idf.get(term, 1.0) for term in query_terms}
+        positions = [(position, term) for position, term in enumerate(tokenize(content)) if term in query_terms]
+        matched = {term for _, term in positions}
+        coverage = sum(weights[term] for term in matched) / sum(weights.values())
+        if len(matched) < 2:
+            return coverage
+
+        # Shortest window containing every matched term
+        span, counts, left = math.inf, Counter(), 0
+        for position, term in positions:
+            counts[term] += 1
+            while len(counts) == len(matched):
+                span = min(span, position - positions[left][0] + 1)
+                counts[positions[left][1]] -= 1
+                if not counts[positions[left][1]]:
+                    del counts[positions[left][1]]
+                left += 1
+        return coverage + 0.5 * len(matched) / span
+
+    def rerank(self, query: str, contents: Sequence[str]) -> List[float]:
+        return [self.score(query, content) for content in contents]
+
+
+class CrossEncoderReranker:
+    """Reranks with a small local cross-encoder model (requires sentence-transformers)"""
+
+    def __init__(self, model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"):
+        from sentence_transformers import CrossEncoder
+        self.model = CrossEncoder(model_name)
+
+    def rerank(self, query: str, contents: Sequence[str]) -> List[float]:
+        return [float(score) for score in self.model.predict([(query, content) for content in contents])]
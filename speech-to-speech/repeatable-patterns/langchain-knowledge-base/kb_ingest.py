@@ -0,0 +1,260 @@
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from langchain_community.document_loaders import PyPDFLoader
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_community.vectorstores import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from hybrid_search import BM25Index
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+# Chunks sent to the embedding model per request batch
+EMBEDDING_BATCH_SIZE = 16
+# Embedding batches in flight at once
+EMBEDDING_CONCURRENCY = 4
+# Upper bound on embedded chunks per second, to stay under the Bedrock quota
+EMBEDDING_RATE_LIMIT = 20.0
+MANIFEST_NAME = "ingest_manifest.json"
+KEYWORD_INDEX_NAME = "bm25_index.json"
+
+
+def build_keyword_index(vectordb: Chroma, persist_directory: str) -> BM25Index:
+    """Build the BM25 index over every chunk of a Chroma store and save it next to the store"""
+    data = vectordb._collection.get(include=["documents", "metadatas"])
+    index = BM25Index.build(data["ids"], data["documents"], data["metadatas"])
+    index.save(os.path.join(persist_directory, KEYWORD_INDEX_NAME))
+    return index
+
+
+class RateLimiter:
+    """Spaces out calls so that no more than `rate` units per second are started"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_time = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, units: int = 1) -> None:
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self.next_time)
+            self.next_time = start + units * self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def _load_pdf(pdf_path: str) -> Tuple[str, List[Tuple[str, Dict[str, Any]]]]:
+    """Parse a PDF into (text, metadata) pages. Runs in a worker process."""
+    pages = PyPDFLoader(pdf_path).load()
+    return pdf_path, [(page.page_content, page.metadata) for page in pages]
+
+
+def _page_hash(text: str) -> str:
+    # Chunking settings are part of the hash: changing them re-ingests every page
+    return hashlib.sha256(f"{CHUNK_SIZE}:{CHUNK_OVERLAP}:{text}".encode("utf-8")).hexdigest()
+
+
+def _chunk_ids(source: str, page_hash: str, count: int) -> List[str]:
+    # Ids depend on the file as well, so identical pages in two PDFs do not collide
+    prefix = hashlib.sha256(f"{source}:{page_hash}".encode("utf-8")).hexdigest()[:32]
+    return [f"{prefix}-{index}" for index in range(count)]
+
+
+class KnowledgeBaseIngestor:
+    """
+    Incrementally ingests PDFs into a Chroma knowledge base.
+
+    PDFs are parsed in a process pool. Pages are split into chunks and the
+    chunks are embedded in concurrent, rate-limited batches. Each batch is
+    upserted into Chroma as soon as it is embedded, so a large corpus never
+    has to be held in memory at once.
+
+    A manifest in the persist directory records the content hash and chunk
+    ids of every ingested page. On re-ingest, unchanged pages are skipped,
+    changed pages have their old chunks replaced, and pages that no longer
+    exist are deleted. A store with chunks but no manifest was built by the
+    earlier all-at-once loader, under random ids that cannot be matched to
+    pages, so it is cleared and re-ingested rather than duplicated.
+
+    After every ingest the BM25 keyword index used by hybrid retrieval is
+    rebuilt from the stored chunks.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        persist_directory: str,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        concurrency: int = EMBEDDING_CONCURRENCY,
+        rate_limit: float = EMBEDDING_RATE_LIMIT,
+        parse_workers: Optional[int] = None
+    ):
+        self.embeddings = embeddings
+        self.persist_directory = persist_directory
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.rate_limiter = RateLimiter(rate_limit)
+        self.parse_workers = parse_workers
+        self.manifest_path = os.path.join(persist_directory, MANIFEST_NAME)
+        os.makedirs(persist_directory, exist_ok=True)
+        self.text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+        self.vectordb = Chroma(persist_directory=persist_directory, embedding_function=embeddings)
+        self.manifest = self._load_manifest()
+        if not os.path.exists(self.manifest_path):
+            self._clear_unmanaged_chunks()
+
+    def _load_manifest(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """source -> page number -> {"hash", "ids"}"""
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _clear_unmanaged_chunks(self) -> None:
+        """Delete the chunks of a store that was not built by this ingestor"""
+        ids = self.vectordb._collection.get(include=[])["ids"]
+        if ids:
+            print(f"{self.persist_directory} has {len(ids)} chunks but no {MANIFEST_NAME}: "
+                  "clearing them so they are not stored twice")
+            for start in range(0, len(ids), 5000):
+                self.vectordb.delete(ids=ids[start:start + 5000])
+
+    def _save_manifest(self) -> None:
+        temp_path = f"{self.manifest_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f)
+        os.replace(temp_path, self.manifest_path)
+
+    def ingest_directory(self, directory: str, pattern: str = "**/*.pdf") -> Dict[str, int]:
+        """Ingest every PDF under a directory, removing PDFs that are no longer there"""
+        pdf_paths = sorted(os.path.normpath(path) for path in glob.glob(os.path.join(directory, pattern), recursive=True))
+        stats = self._ingest(pdf_paths)
+        removed = [source for source in self.manifest if source not in pdf_paths]
+        for source in removed:
+            stats["deleted_chunks"] += self._delete(
+                [chunk_id for page in self.manifest.pop(source).values() for chunk_id in page["ids"]]
+            )
+        if removed:
+            self._save_manifest()
+        build_keyword_index(self.vectordb, self.persist_directory)
+        return stats
+
+    def ingest(self, pdf_paths: Iterable[str]) -> Dict[str, int]:
+        """Ingest PDFs, re-embedding only pages whose content changed since the last run"""
+        stats = self._ingest(pdf_paths)
+        build_keyword_index(self.vectordb, self.persist_directory)
+        return stats
+
+    def _ingest(self, pdf_paths: Iterable[str]) -> Dict[str, int]:
+        pdf_paths = [os.path.normpath(path) for path in pdf_paths]
+        stats = {"files": len(pdf_paths), "pages": 0, "skipped_pages": 0, "chunks": 0, "deleted_chunks": 0}
+        if not pdf_paths:
+            return stats
+
+        with ProcessPoolExecutor(max_workers=self.parse_workers) as parsers, \
+                ThreadPoolExecutor(max_workers=self.concurrency) as embedders:
+            pending = set()
+            # Files waiting for their embedding batches: source -> [batches left, page entries]
+            files: Dict[str, List[Any]] = {}
+
+            for parsed in [parsers.submit(_load_pdf, pdf_path) for pdf_path in pdf_paths]:
+                source, pages = parsed.result()
+                entries, batches = self._plan(source, pages, stats)
+                files[source] = [len(batches), entries]
+                for batch in batches:
+                    pending.add(embedders.submit(self._embed, source, batch))
+                if not batches:
+                    self._commit(source, entries)
+
+                # Upsert finished batches while later files are still being parsed
+                pending = self._drain(pending, files, stats, block=False)
+
+            while pending:
+                pending = self._drain(pending, files, stats, block=True)
+        return stats
+
+    def _plan(
+        self,
+        source: str,
+        pages: List[Tuple[str, Dict[str, Any]]],
+        stats: Dict[str, int]
+    ) -> Tuple[Dict[str, Dict[str, Any]], List[List[Document]]]:
+        """Work out which pages changed and split them into embedding batches"""
+        previous = self.manifest.get(source, {})
+        entries: Dict[str, Dict[str, Any]] = {}
+        chunks: List[Document] = []
+        stale_ids: List[str] = []
+
+        for text, metadata in pages:
+            page = str(metadata.get("page", len(entries)))
+            page_hash = _page_hash(text)
+            stats["pages"] += 1
+            old = previous.get(page)
+            if old and old["hash"] == page_hash:
+                entries[page] = old
+                stats["skipped_pages"] += 1
+                continue
+            if old:
+                stale_ids.extend(old["ids"])
+
+            page_chunks = self.text_splitter.split_documents(
+                [Document(page_content=text, metadata=dict(metadata, content_hash=page_hash))]
+            )
+            ids = _chunk_ids(source, page_hash, len(page_chunks))
+            for chunk, chunk_id in zip(page_chunks, ids):
+                chunk.metadata["chunk_id"] = chunk_id
+            entries[page] = {"hash": page_hash, "ids": ids}
+            chunks.extend(page_chunks)
+
+        # Pages that disappeared from the PDF
+        for page, old in previous.items():
+            if page not in entries:
+                stale_ids.extend(old["ids"])
+        stats["deleted_chunks"] += self._delete(stale_ids)
+
+        batches = [chunks[i:i + self.batch_size] for i in range(0, len(chunks), self.batch_size)]
+        return entries, batches
+
+    def _embed(self, source: str, batch: List[Document]) -> Tuple[str, List[Document], List[List[float]]]:
+        self.rate_limiter.acquire(len(batch))
+        return source, batch, self.embeddings.embed_documents([chunk.page_content for chunk in batch])
+
+    def _drain(self, pending: set, files: Dict[str, List[Any]], stats: Dict[str, int], block: bool) -> set:
+        """Upsert the embedding batches that have finished"""
+        if not pending:
+            return pending
+        done, pending = wait(pending, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+        for future in done:
+            source, batch, vectors = future.result()
+            # Embeddings are already computed, so write them to the collection directly
+            self.vectordb._collection.upsert(
+                ids=[chunk.metadata["chunk_id"] for chunk in batch],
+                embeddings=vectors,
+                documents=[chunk.page_content for chunk in batch],
+                metadatas=[chunk.metadata for chunk in batch]
+            )
+            stats["chunks"] += len(batch)
+            files[source][0] -= 1
+            if files[source][0] == 0:
+                self._commit(source, files[source][1])
+        return pending
+
+    def _commit(self, source: str, entries: Dict[str, Dict[str, Any]]) -> None:
+        """Record a fully ingested file in the manifest"""
+        self.manifest[source] = entries
+        self._save_manifest()
+        print(f"Ingested {source}")
+
+    def _delete(self, ids: List[str]) -> int:
+        if ids:
+            self.vectordb.delete(ids=ids)
+        return len(ids)
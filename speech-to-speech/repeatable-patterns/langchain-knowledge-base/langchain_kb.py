@@ -1,14 +1,49 @@
 import os
+import json
+import threading
 import boto3
-from typing import List, Dict, Any
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from typing import List, Dict, Any, Optional, Union
 from langchain_community.vectorstores import Chroma
 from langchain_community.embeddings import BedrockEmbeddings
+from embedding_cache import CachedQueryEmbeddings
+from kb_ingest import KnowledgeBaseIngestor, MANIFEST_NAME, KEYWORD_INDEX_NAME, build_keyword_index
+from hybrid_search import BM25Index, reciprocal_rank_fusion, ProximityReranker, CrossEncoderReranker
+from vector_index import NumpyVectorIndex, INDEX_FILE, INDEX_FORMAT_VERSION
 
 # Define the path where the vector database will be stored persistently
 PERSIST_DIRECTORY = "./chroma_db"
 PDF_PATH = "./kb/Aglaia_Benefit_Policy.pdf"
+KB_DIRECTORY = "./kb"
+AWS_REGION = "us-east-1"
+EMBEDDING_MODEL_ID = "amazon.titan-embed-text-v1"
+# Query embeddings are cached so repeated questions skip the Bedrock call
+QUERY_EMBEDDING_CACHE_SIZE = 1024
+# Set to None to keep the query embedding cache in memory only
+QUERY_EMBEDDING_CACHE_PATH = "./embedding_cache/queries.jsonl"
+# Vector search backend: "chroma", or "numpy" for an in-process index exported from the Chroma store
+VECTOR_BACKEND = "chroma"
+# Store the NumPy index as int8 as well, a quarter of the memory of float32
+NUMPY_INDEX_QUANTIZE = False
+# "vector" for embedding similarity only, "hybrid" to fuse it with BM25 keyword search
+RETRIEVAL_MODE = "vector"
+# Candidates taken from each of the vector and keyword searches before fusion
+HYBRID_CANDIDATES = 20
+# Optional reranking of the fused candidates: None, "proximity" or "cross-encoder"
+RERANKER = None
+RERANK_CANDIDATES = 10
+
+def create_embeddings() -> BedrockEmbeddings:
+    """Create the Bedrock Titan embeddings used to build and query the knowledge base"""
+    # Create AWS Bedrock client
+    bedrock_client = boto3.client(
+        service_name="bedrock-runtime",
+        region_name=AWS_REGION
+    )
+    
+    return BedrockEmbeddings(
+        client=bedrock_client,
+        model_id=EMBEDDING_MODEL_ID
+    )
 
 def create_kb_from_pdf(pdf_path: str = PDF_PATH, persist_directory: str = PERSIST_DIRECTORY) -> None:
     """
@@ -18,37 +53,273 @@ def create_kb_from_pdf(pdf_path: str = PDF_PATH, persist_directory: str = PERSIS
         pdf_path: Path to the PDF file
         persist_directory: Directory to store the vector database
     """
-    # Create AWS Bedrock client
-    bedrock_client = boto3.client(
-        service_name="bedrock-runtime",
-        region_name="us-east-1"
-    )
+    stats = KnowledgeBaseIngestor(create_embeddings(), persist_directory).ingest([pdf_path])
+    print(f"Knowledge base created and stored at {persist_directory}: {stats}")
+    _reset_retriever(persist_directory)
+
+def create_kb_from_directory(directory: str = KB_DIRECTORY, persist_directory: str = PERSIST_DIRECTORY) -> Dict[str, int]:
+    """
+    Create or update a knowledge base from every PDF in a directory.
     
-    # Initialize embeddings
-    embeddings = BedrockEmbeddings(
-        client=bedrock_client,
-        model_id="amazon.titan-embed-text-v1"
-    )
+    Only pages that changed since the last run are embedded again, and PDFs
+    removed from the directory are removed from the knowledge base.
     
-    # Load and process the PDF
-    loader = PyPDFLoader(pdf_path)
-    documents = loader.load()
+    Args:
+        directory: Directory containing the PDF files
+        persist_directory: Directory to store the vector database
+        
+    Returns:
+        Ingestion statistics
+    """
+    stats = KnowledgeBaseIngestor(create_embeddings(), persist_directory).ingest_directory(directory)
+    print(f"Knowledge base updated at {persist_directory}: {stats}")
+    _reset_retriever(persist_directory)
+    return stats
+
+def _reset_retriever(persist_directory: str) -> None:
+    # A retriever loaded before the rebuild would not see the new documents
+    retriever = _retrievers.get(os.path.abspath(persist_directory))
+    if retriever:
+        retriever.reset()
+
+class KnowledgeBaseRetriever:
+    """
+    Keeps the Bedrock embeddings client and the Chroma vector store loaded between queries.
     
-    # Split the documents
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200
-    )
-    chunks = text_splitter.split_documents(documents)
+    Both are created on first use, building the knowledge base from the PDF if it
+    does not exist yet. Initialization is guarded by a lock so concurrent first
+    queries load the store only once; after that, queries run without locking.
+    """
     
-    # Create and persist the vector store
-    Chroma.from_documents(
-        documents=chunks, 
-        embedding=embeddings,
-        persist_directory=persist_directory
-    )
+    def __init__(self, persist_directory: str = PERSIST_DIRECTORY, pdf_path: str = PDF_PATH):
+        self.persist_directory = persist_directory
+        self.pdf_path = pdf_path
+        self._vectordb = None
+        self._lock = threading.Lock()
+        self.query_embeddings: Optional[CachedQueryEmbeddings] = None
+    
+    @property
+    def vectordb(self) -> Chroma:
+        if self._vectordb is None:
+            with self._lock:
+                if self._vectordb is None:
+                    # Check if the knowledge base exists, if not create it
+                    if not os.path.exists(self.persist_directory):
+                        print("Knowledge base not found. Creating new knowledge base...")
+                        create_kb_from_pdf(self.pdf_path, self.persist_directory)
+                    if self.query_embeddings is None:
+                        self.query_embeddings = CachedQueryEmbeddings(
+                            create_embeddings(),
+                            max_entries=QUERY_EMBEDDING_CACHE_SIZE,
+                            cache_path=QUERY_EMBEDDING_CACHE_PATH,
+                            model_id=EMBEDDING_MODEL_ID
+                        )
+                    self._vectordb = Chroma(
+                        persist_directory=self.persist_directory,
+                        embedding_function=self.query_embeddings
+                    )
+        return self._vectordb
+    
+    def reset(self) -> None:
+        """Reload the vector store on the next query, e.g. after the knowledge base was rebuilt"""
+        self._vectordb = None
+    
+    def warm_up(self) -> None:
+        """Load the vector store ahead of the first query"""
+        self.vectordb
+    
+    def retrieve(self, query: str, k: int = 3) -> List[Dict[str, Any]]:
+        """Return the k most similar chunks with their metadata and score"""
+        results = self.vectordb.similarity_search_with_score(query, k=k)
+        return [
+            {
+                "content": doc.page_content,
+                "metadata": doc.metadata,
+                "relevance_score": float(score)
+            }
+            for doc, score in results
+        ]
+    
+    def vector_search(self, query: str, n: int) -> List[Dict[str, Any]]:
+        """Return the n most similar chunks with their ids, best first"""
+        vectordb = self.vectordb
+        results = vectordb._collection.query(
+            query_embeddings=[self.query_embeddings.embed_query(query)],
+            n_results=n,
+            include=["documents", "metadatas", "distances"]
+        )
+        return [
+            {"id": doc_id, "content": content, "metadata": metadata or {}, "relevance_score": float(distance)}
+            for doc_id, content, metadata, distance in zip(
+                results["ids"][0], results["documents"][0], results["metadatas"][0], results["distances"][0]
+            )
+        ]
+    
+    def stats(self) -> Dict[str, Any]:
+        """Return query embedding cache statistics"""
+        return {"queryEmbeddingCache": self.query_embeddings.stats() if self.query_embeddings else None}
+
+class NumpyIndexRetriever(KnowledgeBaseRetriever):
+    """
+    Answers queries from a memory-mapped NumPy index instead of querying Chroma.
+    
+    Chroma remains the source of truth: the index is exported from it, with no
+    re-embedding, the first time it is needed and again whenever the knowledge
+    base has been re-ingested since. Relevance scores are cosine similarities
+    (higher is better), not Chroma distances.
+    """
     
-    print(f"Knowledge base created and stored at {persist_directory}")
+    def __init__(self, persist_directory: str = PERSIST_DIRECTORY, pdf_path: str = PDF_PATH,
+                 quantize: bool = NUMPY_INDEX_QUANTIZE):
+        super().__init__(persist_directory, pdf_path)
+        self.index_directory = os.path.join(persist_directory, "numpy_index")
+        self.quantize = quantize
+        self._index: Optional[NumpyVectorIndex] = None
+        self._index_lock = threading.Lock()
+    
+    def _index_is_current(self) -> bool:
+        index_file = os.path.join(self.index_directory, INDEX_FILE)
+        manifest_file = os.path.join(self.persist_directory, MANIFEST_NAME)
+        if not os.path.exists(index_file):
+            return False
+        with open(index_file, 'r', encoding='utf-8') as f:
+            info = json.load(f)
+        # Indexes written in an older format lack the chunk ids hybrid retrieval needs
+        if info.get("version") != INDEX_FORMAT_VERSION or (self.quantize and not info["quantized"]):
+            return False
+        return not os.path.exists(manifest_file) or os.path.getmtime(manifest_file) <= os.path.getmtime(index_file)
+    
+    @property
+    def index(self) -> NumpyVectorIndex:
+        if self._index is None:
+            vectordb = self.vectordb
+            with self._index_lock:
+                if self._index is None:
+                    if not self._index_is_current():
+                        print("Exporting the knowledge base to a NumPy index...")
+                        NumpyVectorIndex.build_from_chroma(vectordb, self.index_directory, self.quantize)
+                    self._index = NumpyVectorIndex(self.index_directory, quantized=self.quantize)
+        return self._index
+    
+    def reset(self) -> None:
+        super().reset()
+        self._index = None
+    
+    def warm_up(self) -> None:
+        self.index
+    
+    def retrieve(self, query: str, k: int = 3) -> List[Dict[str, Any]]:
+        index = self.index
+        return index.retrieve(self.query_embeddings.embed_query(query), k=k)
+    
+    def vector_search(self, query: str, n: int) -> List[Dict[str, Any]]:
+        index = self.index
+        return [
+            dict(index.documents[row], relevance_score=score)
+            for row, score in index.search(self.query_embeddings.embed_query(query), n)
+        ]
+
+class HybridRetriever:
+    """
+    Fuses vector search with BM25 keyword search by reciprocal-rank fusion.
+    
+    Embeddings find paraphrases; BM25 finds the exact plan names, amounts and
+    durations that embeddings blur. Each search contributes its top
+    HYBRID_CANDIDATES and chunks ranked well by both come first. An optional
+    reranker then reorders the best fused candidates. The BM25 index is
+    built at ingest time, or from the vector store on first use if missing.
+    """
+    
+    def __init__(self, retriever: KnowledgeBaseRetriever, reranker: Optional[str] = RERANKER):
+        self.retriever = retriever
+        self.persist_directory = retriever.persist_directory
+        self.reranker_name = reranker
+        self.reranker = None
+        self._keyword_index: Optional[BM25Index] = None
+        self._lock = threading.Lock()
+    
+    @property
+    def keyword_index(self) -> BM25Index:
+        if self._keyword_index is None:
+            vectordb = self.retriever.vectordb
+            with self._lock:
+                if self._keyword_index is None:
+                    path = os.path.join(self.persist_directory, KEYWORD_INDEX_NAME)
+                    if os.path.exists(path):
+                        keyword_index = BM25Index.load(path)
+                    else:
+                        keyword_index = build_keyword_index(vectordb, self.persist_directory)
+                    if self.reranker_name == "proximity":
+                        self.reranker = ProximityReranker(keyword_index.idf)
+                    elif self.reranker_name == "cross-encoder" and self.reranker is None:
+                        self.reranker = CrossEncoderReranker()
+                    self._keyword_index = keyword_index
+        return self._keyword_index
+    
+    def reset(self) -> None:
+        self.retriever.reset()
+        self._keyword_index = None
+    
+    def warm_up(self) -> None:
+        self.retriever.warm_up()
+        self.keyword_index
+    
+    def vector_search(self, query: str, n: int) -> List[Dict[str, Any]]:
+        return self.retriever.vector_search(query, n)
+    
+    def keyword_search(self, query: str, n: int) -> List[Dict[str, Any]]:
+        keyword_index = self.keyword_index
+        return [
+            dict(keyword_index.document(doc_id), id=doc_id, relevance_score=score)
+            for doc_id, score in keyword_index.search(query, n)
+        ]
+    
+    def retrieve(self, query: str, k: int = 3) -> List[Dict[str, Any]]:
+        """Return the k best chunks after fusion and optional reranking"""
+        vector_results = self.vector_search(query, HYBRID_CANDIDATES)
+        keyword_results = self.keyword_search(query, HYBRID_CANDIDATES)
+        chunks = {result["id"]: result for result in keyword_results + vector_results}
+        fused = reciprocal_rank_fusion([
+            [result["id"] for result in vector_results],
+            [result["id"] for result in keyword_results]
+        ])
+        
+        if self.reranker:
+            candidates = fused[:RERANK_CANDIDATES]
+            scores = self.reranker.rerank(query, [chunks[doc_id]["content"] for doc_id, _ in candidates])
+            # Fusion order breaks ties between equally reranked chunks
+            fused = sorted(zip((doc_id for doc_id, _ in candidates), scores), key=lambda item: item[1], reverse=True)
+        
+        return [
+            {
+                "content": chunks[doc_id]["content"],
+                "metadata": chunks[doc_id]["metadata"],
+                "relevance_score": float(score)
+            }
+            for doc_id, score in fused[:k]
+        ]
+    
+    def stats(self) -> Dict[str, Any]:
+        return self.retriever.stats()
+
+# One retriever per vector store directory, shared by every caller in the process
+_retrievers: Dict[str, Union[KnowledgeBaseRetriever, HybridRetriever]] = {}
+_retrievers_lock = threading.Lock()
+
+def get_retriever(persist_directory: str = PERSIST_DIRECTORY) -> Union[KnowledgeBaseRetriever, HybridRetriever]:
+    """Return the process-wide retriever for a vector store directory"""
+    key = os.path.abspath(persist_directory)
+    retriever = _retrievers.get(key)
+    if retriever is None:
+        with _retrievers_lock:
+            retriever = _retrievers.get(key)
+            if retriever is None:
+                retriever_class = NumpyIndexRetriever if VECTOR_BACKEND == "numpy" else KnowledgeBaseRetriever
+                retriever = retriever_class(persist_directory)
+                if RETRIEVAL_MODE == "hybrid":
+                    retriever = HybridRetriever(retriever, reranker=RERANKER)
+                _retrievers[key] = retriever
+    return retriever
 
 def retrieve_context(query: str, persist_directory: str = PERSIST_DIRECTORY, k: int = 3) -> List[Dict[str, Any]]:
     """
@@ -62,37 +333,7 @@ def retrieve_context(query: str, persist_directory: str = PERSIST_DIRECTORY, k:
     Returns:
         List of dictionaries containing the retrieved documents and their metadata
     """
-    # Create AWS Bedrock client
-    bedrock_client = boto3.client(
-        service_name="bedrock-runtime",
-        region_name="us-east-1"
-    )
-    
-    # Initialize embeddings
-    embeddings = BedrockEmbeddings(
-        client=bedrock_client,
-        model_id="amazon.titan-embed-text-v1"
-    )
-    
-    # Load the existing vector store
-    vectordb = Chroma(
-        persist_directory=persist_directory,
-        embedding_function=embeddings
-    )
-    
-    # Retrieve the most similar documents
-    results = vectordb.similarity_search_with_score(query, k=k)
-    
-    # Format results
-    retrieved_docs = []
-    for doc, score in results:
-        retrieved_docs.append({
-            "content": doc.page_content,
-            "metadata": doc.metadata,
-            "relevance_score": float(score) 
-        })
-    
-    return retrieved_docs
+    return get_retriever(persist_directory).retrieve(query, k=k)
 
 def pdf_knowledge_retrieval(query: str) -> Dict[str, Any]:
     """
@@ -105,11 +346,7 @@ def pdf_knowledge_retrieval(query: str) -> Dict[str, Any]:
         Dictionary with retrieved contexts and their metadata
     """
     try:
-        # Check if the knowledge base exists, if not create it
-        if not os.path.exists(PERSIST_DIRECTORY):
-            print("Knowledge base not found. Creating new knowledge base...")
-            create_kb_from_pdf()
-        
+        # The shared retriever builds the knowledge base on first use if needed
         contexts = retrieve_context(query)
         return {
             "status": "success",
@@ -125,8 +362,16 @@ def pdf_knowledge_retrieval(query: str) -> Dict[str, Any]:
 
 # If this script is run directly, set up the knowledge base
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='LangChain PDF knowledge base')
+    parser.add_argument('--ingest', metavar='DIRECTORY', help='(Re-)ingest every PDF in a directory')
+    args = parser.parse_args()
+    
+    if args.ingest:
+        create_kb_from_directory(args.ingest)
     # Check if the knowledge base already exists
-    if not os.path.exists(PERSIST_DIRECTORY):
+    elif not os.path.exists(PERSIST_DIRECTORY):
         print("Setting up knowledge base...")
         create_kb_from_pdf()
     else:
@@ -11,7 +11,7 @@ from aws_sdk_bedrock_runtime.client import BedrockRuntimeClient, InvokeModelWith
 from aws_sdk_bedrock_runtime.models import InvokeModelWithBidirectionalStreamInputChunk, BidirectionalInputPayloadPart
 from aws_sdk_bedrock_runtime.config import Config, HTTPAuthSchemeResolver, SigV4AuthScheme
 from smithy_aws_core.credentials_resolvers.environment import EnvironmentCredentialsResolver
-from langchain_kb import pdf_knowledge_retrieval
+from langchain_kb import pdf_knowledge_retrieval, get_retriever
 
 # Suppress warnings
 warnings.filterwarnings("ignore")
@@ -265,6 +265,7 @@ class BedrockStreamManager:
         self.toolUseContent = ""
         self.toolUseId = ""
         self.toolName = ""
+        self.kb_warm_up = None  # Task loading the knowledge base in the background
 
     def _initialize_client(self):
         """Initialize the Bedrock client."""
@@ -537,8 +538,13 @@ class BedrockStreamManager:
                         "error": "No query provided in the tool use parameters"
                     }
                 
-                # Call the knowledge base retrieval function
-                result = pdf_knowledge_retrieval(query)
+                # Let the start-up warm-up finish first; a failed warm-up has already been
+                # reported and the lookup below loads the knowledge base again
+                if self.kb_warm_up and not self.kb_warm_up.done():
+                    await asyncio.wait([self.kb_warm_up])
+
+                # Call the knowledge base retrieval function off the event loop
+                result = await asyncio.to_thread(pdf_knowledge_retrieval, query)
                 debug_print(f"Knowledge base result: {result}")
                 return result
             except Exception as e:
@@ -737,6 +743,12 @@ class AudioStreamer:
         await self.stream_manager.close() 
 
 
+def report_kb_warm_up(task):
+    """Report a failed knowledge base warm-up as soon as it happens"""
+    if not task.cancelled() and task.exception():
+        print(f"Knowledge base warm-up failed: {task.exception()}")
+
+
 async def main(debug=False):
     """Main function to run the application."""
     global DEBUG
@@ -748,6 +760,10 @@ async def main(debug=False):
     # Create audio streamer
     audio_streamer = AudioStreamer(stream_manager)
 
+    # Load the knowledge base while the stream is set up, so the first lookup is warm
+    stream_manager.kb_warm_up = asyncio.create_task(asyncio.to_thread(get_retriever().warm_up))
+    stream_manager.kb_warm_up.add_done_callback(report_kb_warm_up)
+
     # Initialize the stream
     await time_it_async("initialize_stream", stream_manager.initialize_stream)
 
@@ -0,0 +1,77 @@
+"""
+CachedQueryEmbeddings with a counting fake embeddings model, no Bedrock access needed.
+
+    python -m pytest test_embedding_cache.py
+"""
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from embedding_cache import CachedQueryEmbeddings, normalize_query
+
+
+class CountingEmbeddings(Embeddings):
+    """Deterministic fake model that records every text it is asked to embed"""
+
+    model_id = "fake-embeddings"
+
+    def __init__(self):
+        self.queries: List[str] = []
+
+    def embed_query(self, text: str) -> List[float]:
+        self.queries.append(text)
+        return [float(len(text)), float(sum(map(ord, text)) % 97)]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+
+def test_hits_and_misses():
+    model = CountingEmbeddings()
+    cache = CachedQueryEmbeddings(model)
+    first = cache.embed_query("What is the dental plan?")
+    assert cache.embed_query("What is the dental plan?") == first
+    cache.embed_query("Is there a 401(k) match?")
+    assert len(model.queries) == 2
+    assert cache.stats() == {"hits": 1, "misses": 2, "entries": 2, "hitRate": 0.333}
+
+
+def test_normalized_queries_share_an_entry():
+    assert normalize_query("  What is the DENTAL plan? ") == normalize_query("what is the dental plan")
+    model = CountingEmbeddings()
+    cache = CachedQueryEmbeddings(model)
+    first = cache.embed_query("What is the dental plan?")
+    assert cache.embed_query("what is   the dental PLAN") == first
+    assert model.queries == ["What is the dental plan?"]
+
+
+def test_least_recently_used_entry_is_evicted():
+    model = CountingEmbeddings()
+    cache = CachedQueryEmbeddings(model, max_entries=2)
+    cache.embed_query("vision")
+    cache.embed_query("dental")
+    cache.embed_query("vision")  # Refreshes "vision", so "dental" is the oldest
+    cache.embed_query("medical")
+    assert list(cache.entries) == ["vision", "medical"]
+    cache.embed_query("dental")
+    assert model.queries == ["vision", "dental", "medical", "dental"]
+
+
+def test_reload_from_persisted_cache(tmp_path):
+    cache_path = str(tmp_path / "cache" / "queries.jsonl")
+    model = CountingEmbeddings()
+    cache = CachedQueryEmbeddings(model, max_entries=2, cache_path=cache_path)
+    for query in ("vision", "dental", "medical"):
+        cache.embed_query(query)
+
+    reloaded_model = CountingEmbeddings()
+    reloaded = CachedQueryEmbeddings(reloaded_model, max_entries=2, cache_path=cache_path)
+    # Only the most recent max_entries come back
+    assert list(reloaded.entries) == ["dental", "medical"]
+    assert reloaded.embed_query("Medical?") == cache.embed_query("medical")
+    assert reloaded_model.queries == []
+
+    # Entries of another model are not reused
+    other = CountingEmbeddings()
+    other.model_id = "other-model"
+    assert not CachedQueryEmbeddings(other, cache_path=cache_path).entries
@@ -0,0 +1,142 @@
+import json
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+INDEX_FILE = "index.json"
+VECTORS_FILE = "vectors.f32"
+QUANTIZED_FILE = "vectors.i8"
+SCALES_FILE = "scales.f32"
+DOCUMENTS_FILE = "documents.jsonl"
+# Bumped when the files change shape; 2 added the chunk id to documents.jsonl
+INDEX_FORMAT_VERSION = 2
+# Rows of the int8 matrix converted to float32 at a time, small enough to stay in cache
+QUANTIZED_BLOCK_ROWS = 2048
+
+
+class NumpyVectorIndex:
+    """
+    In-process cosine-similarity index over a memory-mapped matrix of embeddings.
+
+    Embeddings are L2-normalized at build time, so top-k search is one matrix-vector
+    product followed by argpartition. With quantize=True the matrix is also
+    stored as int8 with a per-row scale. That copy is a quarter of the size, which
+    suits corpora that would not otherwise fit in memory. NumPy has to widen
+    int8 to float32 to multiply, so the int8 search is slower than the float32
+    search on the same machine.
+
+    Files in the index directory:
+    - index.json: format version, dimensions, row count and whether an int8 copy exists
+    - vectors.f32: float32 matrix, one normalized embedding per row
+    - vectors.i8, scales.f32: int8 matrix and per-row scales (quantized indexes)
+    - documents.jsonl: chunk id, text and metadata, one line per row
+    """
+
+    def __init__(self, directory: str, quantized: Optional[bool] = None):
+        self.directory = directory
+        with open(os.path.join(directory, INDEX_FILE), 'r', encoding='utf-8') as f:
+            self.info = json.load(f)
+        count, dimensions = self.info["count"], self.info["dimensions"]
+        self.quantized = self.info["quantized"] if quantized is None else quantized and self.info["quantized"]
+
+        if count == 0:
+            # An empty knowledge base writes empty files, which cannot be memory-mapped
+            self.matrix = np.zeros((0, dimensions), dtype=np.int8 if self.quantized else np.float32)
+            self.scales = np.zeros(0, dtype=np.float32) if self.quantized else None
+        elif self.quantized:
+            self.matrix = np.memmap(os.path.join(directory, QUANTIZED_FILE), dtype=np.int8, mode='r',
+                                    shape=(count, dimensions))
+            self.scales = np.memmap(os.path.join(directory, SCALES_FILE), dtype=np.float32, mode='r', shape=(count,))
+        else:
+            self.matrix = np.memmap(os.path.join(directory, VECTORS_FILE), dtype=np.float32, mode='r',
+                                    shape=(count, dimensions))
+            self.scales = None
+
+        self.documents: List[Dict[str, Any]] = []
+        with open(os.path.join(directory, DOCUMENTS_FILE), 'r', encoding='utf-8') as f:
+            for line in f:
+                self.documents.append(json.loads(line))
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    @staticmethod
+    def build(
+        directory: str,
+        vectors: Any,
+        documents: Sequence[str],
+        metadatas: Optional[Sequence[Dict[str, Any]]] = None,
+        quantize: bool = False,
+        ids: Optional[Sequence[str]] = None
+    ) -> None:
+        """Write an index for the given embeddings, chunk texts, metadata and chunk ids"""
+        os.makedirs(directory, exist_ok=True)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(documents):
+            vectors = vectors.reshape(0, vectors.shape[-1] if vectors.ndim == 2 else 0)
+        if vectors.ndim != 2 or len(vectors) != len(documents):
+            raise ValueError("vectors must be a matrix with one row per document")
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.maximum(norms, 1e-12)
+        vectors.tofile(os.path.join(directory, VECTORS_FILE))
+
+        if quantize:
+            scales = np.maximum(np.abs(vectors).max(axis=1, initial=0.0), 1e-12) / 127.0
+            quantized = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+            quantized.tofile(os.path.join(directory, QUANTIZED_FILE))
+            scales.astype(np.float32).tofile(os.path.join(directory, SCALES_FILE))
+
+        metadatas = metadatas or [{}] * len(documents)
+        ids = ids or [str(row) for row in range(len(documents))]
+        with open(os.path.join(directory, DOCUMENTS_FILE), 'w', encoding='utf-8') as f:
+            for doc_id, content, metadata in zip(ids, documents, metadatas):
+                record = {"id": doc_id, "content": content, "metadata": metadata or {}}
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+        # Written last: an index without index.json is incomplete and gets rebuilt
+        with open(os.path.join(directory, INDEX_FILE), 'w', encoding='utf-8') as f:
+            json.dump({"version": INDEX_FORMAT_VERSION, "count": len(documents),
+                       "dimensions": int(vectors.shape[1]) if len(vectors) else 0, "quantized": quantize}, f)
+
+    @staticmethod
+    def build_from_chroma(vectordb: Any, directory: str, quantize: bool = False) -> None:
+        """Export the embeddings stored in a LangChain Chroma vector store, without re-embedding"""
+        data = vectordb._collection.get(include=["embeddings", "documents", "metadatas"])
+        NumpyVectorIndex.build(directory, data["embeddings"], data["documents"], data["metadatas"], quantize, data["ids"])
+
+    def search(self, query_vector: Any, k: int = 3) -> List[Tuple[int, float]]:
+        """Return (row, cosine similarity) of the k most similar rows, best first"""
+        if not len(self.documents):
+            return []
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        if self.scales is None:
+            scores = self.matrix @ query
+        else:
+            scores = self._quantized_scores(query)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(row), float(scores[row])) for row in top]
+
+    def _quantized_scores(self, query: Any) -> Any:
+        # BLAS has no int8 kernel: convert block by block rather than the whole matrix at once
+        scores = np.empty(len(self.matrix), dtype=np.float32)
+        block = np.empty((min(QUANTIZED_BLOCK_ROWS, len(self.matrix)), self.matrix.shape[1]), dtype=np.float32)
+        for start in range(0, len(self.matrix), QUANTIZED_BLOCK_ROWS):
+            rows = self.matrix[start:start + QUANTIZED_BLOCK_ROWS]
+            np.copyto(block[:len(rows)], rows, casting='unsafe')
+            scores[start:start + len(rows)] = block[:len(rows)] @ query
+        return scores * self.scales
+
+    def retrieve(self, query_vector: Any, k: int = 3) -> List[Dict[str, Any]]:
+        """Return the k most similar chunks in the same format as retrieve_context"""
+        return [
+            {
+                "content": self.documents[row]["content"],
+                "metadata": self.documents[row]["metadata"],
+                "relevance_score": score
+            }
+            for row, score in self.search(query_vector, k)
+        ]
@@ -0,0 +1,68 @@
+import asyncio
+
+
+class CaptureRing:
+    """Preallocated ring buffer between the PyAudio capture thread and the event loop.
+
+    The capture callback copies each buffer into a fixed bytearray and only
+    wakes the event loop when a full batch of frames is available, so the
+    capture thread does no allocation, encoding or task scheduling per buffer.
+    The wake-up is only scheduled while the consumer is waiting, and is decided
+    from the read position after the copy, so a batch released concurrently
+    with a write cannot leave the consumer asleep.
+    The consumer gets each batch as a memoryview over the ring, encodes it in
+    one go and then releases it for reuse.
+    """
+
+    def __init__(self, frame_bytes, frames_per_batch=2, capacity_batches=16, loop=None):
+        self.batch_bytes = frame_bytes * frames_per_batch
+        self.capacity = self.batch_bytes * capacity_batches
+        self.buffer = bytearray(self.capacity)
+        self.view = memoryview(self.buffer)
+        self.loop = loop or asyncio.get_event_loop()
+        self.write_total = 0
+        self.read_total = 0
+        self.overruns = 0
+        self.waiting = False  # Set by read() before it waits for the capture thread
+        self._ready = asyncio.Event()
+
+    def write(self, data):
+        """Copy captured audio into the ring (called from the capture thread)"""
+        size = len(data)
+        available = self.write_total - self.read_total
+        if size > self.capacity - available:
+            # Consumer has fallen behind: drop the newest buffer rather than block capture
+            self.overruns += 1
+            return
+
+        source = memoryview(data)
+        start = self.write_total % self.capacity
+        first = min(size, self.capacity - start)
+        self.view[start:start + first] = source[:first]
+        if first < size:
+            self.view[:size - first] = source[first:]
+        self.write_total += size
+
+        # Re-read read_total: the consumer may have released a batch and started waiting since `available`
+        if self.waiting and self.write_total - self.read_total >= self.batch_bytes:
+            self.waiting = False
+            self.loop.call_soon_threadsafe(self._ready.set)
+
+    async def read(self):
+        """Wait for a batch and return a memoryview of it; call release() when done"""
+        while self.write_total - self.read_total < self.batch_bytes:
+            self.waiting = True
+            self._ready.clear()
+            if self.write_total - self.read_total >= self.batch_bytes:
+                break
+            await self._ready.wait()
+        self.waiting = False
+
+        start = self.read_total % self.capacity
+        end = min(start + self.batch_bytes, self.capacity)
+        return self.view[start:end]
+
+    def release(self, batch):
+        """Hand a batch returned by read() back to the capture thread"""
+        self.read_total += len(batch)
+        batch.release()
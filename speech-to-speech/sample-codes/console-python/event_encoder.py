@@ -0,0 +1,248 @@
+import json
+import re
+import binascii
+from json.encoder import encode_basestring
+
+# Placeholder marker used while compiling templates. json.dumps escapes the NUL
+# characters, so the marker can never collide with a real (escaped) value.
+_PLACEHOLDER_PATTERN = re.compile(r'"\\u0000(\w+)\\u0000"')
+
+
+class _Placeholder:
+    def __init__(self, name):
+        self.name = name
+
+
+def _field(name):
+    """Mark a field of an event template to be filled in at encode time"""
+    return _Placeholder(name)
+
+
+def _placeholder_default(value):
+    if isinstance(value, _Placeholder):
+        return f"\x00{value.name}\x00"
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class EventTemplate:
+    """A JSON event split into literal byte segments around its placeholders"""
+
+    def __init__(self, event):
+        text = json.dumps(event, separators=(',', ':'), default=_placeholder_default)
+        parts = _PLACEHOLDER_PATTERN.split(text)
+        self.segments = [part.encode('utf-8') for part in parts[0::2]]
+        self.fields = parts[1::2]
+
+    def render(self, **values):
+        """Encode the event, JSON-escaping every string value"""
+        out = [self.segments[0]]
+        for name, segment in zip(self.fields, self.segments[1:]):
+            out.append(encode_basestring(values[name]).encode('utf-8'))
+            out.append(segment)
+        return b"".join(out)
+
+
+class EventEncoder:
+    """Precompiled encoder for the Nova Sonic input events of a single prompt"""
+
+    SESSION_START_EVENT = json.dumps({
+        "event": {
+            "sessionStart": {
+                "inferenceConfiguration": {
+                    "maxTokens": 1024,
+                    "topP": 0.9,
+                    "temperature": 0.7
+                }
+            }
+        }
+    }).encode('utf-8')
+
+    SESSION_END_EVENT = json.dumps({
+        "event": {
+            "sessionEnd": {}
+        }
+    }).encode('utf-8')
+
+    DEFAULT_AUDIO_OUTPUT_CONFIG = {
+        "mediaType": "audio/lpcm",
+        "sampleRateHertz": 24000,
+        "sampleSizeBits": 16,
+        "channelCount": 1,
+        "voiceId": "matthew",
+        "encoding": "base64",
+        "audioType": "SPEECH"
+    }
+
+    def __init__(self, prompt_name, audio_content_name):
+        self.prompt_name = prompt_name
+        self.audio_content_name = audio_content_name
+
+        self.content_start_audio_template = EventTemplate({
+            "event": {
+                "contentStart": {
+                    "promptName": prompt_name,
+                    "contentName": audio_content_name,
+                    "type": "AUDIO",
+                    "interactive": True,
+                    "role": "USER",
+                    "audioInputConfiguration": {
+                        "mediaType": "audio/lpcm",
+                        "sampleRateHertz": 16000,
+                        "sampleSizeBits": 16,
+                        "channelCount": 1,
+                        "audioType": "SPEECH",
+                        "encoding": "base64"
+                    }
+                }
+            }
+        })
+        self.content_start_text_template = EventTemplate({
+            "event": {
+                "contentStart": {
+                    "promptName": prompt_name,
+                    "contentName": _field("content_name"),
+                    "type": "TEXT",
+                    "role": _field("role"),
+                    "interactive": True,
+                    "textInputConfiguration": {
+                        "mediaType": "text/plain"
+                    }
+                }
+            }
+        })
+        self.text_input_template = EventTemplate({
+            "event": {
+                "textInput": {
+                    "promptName": prompt_name,
+                    "contentName": _field("content_name"),
+                    "content": _field("content")
+                }
+            }
+        })
+        self.content_start_tool_template = EventTemplate({
+            "event": {
+                "contentStart": {
+                    "promptName": prompt_name,
+                    "contentName": _field("content_name"),
+                    "interactive": False,
+                    "type": "TOOL",
+                    "role": "TOOL",
+                    "toolResultInputConfiguration": {
+                        "toolUseId": _field("tool_use_id"),
+                        "type": "TEXT",
+                        "textInputConfiguration": {
+                            "mediaType": "text/plain"
+                        }
+                    }
+                }
+            }
+        })
+        self.tool_result_template = EventTemplate({
+            "event": {
+                "toolResult": {
+                    "promptName": prompt_name,
+                    "contentName": _field("content_name"),
+                    "content": _field("content")
+                }
+            }
+        })
+        self.content_end_template = EventTemplate({
+            "event": {
+                "contentEnd": {
+                    "promptName": prompt_name,
+                    "contentName": _field("content_name")
+                }
+            }
+        })
+        self.prompt_end_event = EventTemplate({
+            "event": {
+                "promptEnd": {
+                    "promptName": prompt_name
+                }
+            }
+        }).render()
+
+        # Audio events are the hot path: keep the constant prefix in a reusable
+        # buffer and append the base64 payload and suffix in place.
+        audio_template = EventTemplate({
+            "event": {
+                "audioInput": {
+                    "promptName": prompt_name,
+                    "contentName": audio_content_name,
+                    "content": _field("content")
+                }
+            }
+        })
+        self.audio_prefix = audio_template.segments[0] + b'"'
+        self.audio_suffix = b'"' + audio_template.segments[1]
+        self.audio_buffer = bytearray(self.audio_prefix)
+
+    def session_start(self):
+        """Create a sessionStart event"""
+        return self.SESSION_START_EVENT
+
+    def prompt_start(self, tool_configuration=None, audio_output_config=DEFAULT_AUDIO_OUTPUT_CONFIG):
+        """Create a promptStart event"""
+        prompt_start_event = {
+            "event": {
+                "promptStart": {
+                    "promptName": self.prompt_name,
+                    "textOutputConfiguration": {
+                        "mediaType": "text/plain"
+                    },
+                    "audioOutputConfiguration": audio_output_config,
+                    "toolUseOutputConfiguration": {
+                        "mediaType": "application/json"
+                    },
+                    "toolConfiguration": tool_configuration or {"tools": []}
+                }
+            }
+        }
+        return json.dumps(prompt_start_event).encode('utf-8')
+
+    def content_start_audio(self):
+        """Create a contentStart event for the user audio stream"""
+        return self.content_start_audio_template.render()
+
+    def content_start_text(self, content_name, role):
+        """Create a contentStart event for a text block"""
+        return self.content_start_text_template.render(content_name=content_name, role=role)
+
+    def text_input(self, content_name, content):
+        """Create a textInput event"""
+        return self.text_input_template.render(content_name=content_name, content=content)
+
+    def audio_input(self, audio_bytes):
+        """Create an audioInput event for the user audio stream from raw PCM bytes"""
+        buffer = self.audio_buffer
+        del buffer[len(self.audio_prefix):]
+        buffer += binascii.b2a_base64(audio_bytes, newline=False)
+        buffer += self.audio_suffix
+        # The payload is handed to the transport, so it gets its own copy
+        return bytes(buffer)
+
+    def content_start_tool(self, content_name, tool_use_id):
+        """Create a contentStart event for a tool result"""
+        return self.content_start_tool_template.render(content_name=content_name, tool_use_id=tool_use_id)
+
+    def tool_result(self, content_name, content):
+        """Create a toolResult event, serializing dict results to JSON"""
+        if not isinstance(content, str):
+            content = json.dumps(content)
+        return self.tool_result_template.render(content_name=content_name, content=content)
+
+    def content_end(self, content_name):
+        """Create a contentEnd event"""
+        return self.content_end_template.render(content_name=content_name)
+
+    def content_end_audio(self):
+        """Create a contentEnd event for the user audio stream"""
+        return self.content_end(self.audio_content_name)
+
+    def prompt_end(self):
+        """Create a promptEnd event"""
+        return self.prompt_end_event
+
+    def session_end(self):
+        """Create a sessionEnd event"""
+        return self.SESSION_END_EVENT
@@ -0,0 +1,144 @@
+import json
+import time
+
+
+class LatencyTracer:
+    """Records per-turn latency marks for a Nova Sonic session.
+
+    A turn starts when Nova Sonic opens a USER content block and collects the
+    first occurrence of each mark (user speech start/end, first text, first
+    audio, playback start) plus every tool call. Completed turns are written
+    as JSON lines to trace_path, and summary() reports percentiles of the
+    derived spans across the session.
+    """
+
+    # span name -> (start mark, end mark)
+    SPANS = {
+        "user_speech": ("user_speech_start", "user_speech_end"),
+        "first_text": ("user_speech_end", "first_text"),
+        "first_audio": ("user_speech_end", "first_audio"),
+        "playback_delay": ("first_audio", "playback_start"),
+        "end_to_end": ("user_speech_end", "playback_start"),
+    }
+    PERCENTILES = (50, 90, 99)
+
+    def __init__(self, trace_path=None):
+        self.trace_path = trace_path
+        self.trace_file = open(trace_path, 'a', encoding='utf-8') if trace_path else None
+        self.turn_count = 0
+        self.turn = None
+        self.span_values = {}
+
+    def _new_turn(self):
+        self.turn_count += 1
+        return {"turn": self.turn_count, "wallClock": time.time(), "marks": {}, "tools": {}}
+
+    def start_turn(self):
+        """Finish the current turn and start a new one"""
+        self.end_turn()
+        self.turn = self._new_turn()
+
+    def mark(self, name, first=True):
+        """Record a mark in the current turn, keeping the first occurrence unless first=False"""
+        if self.turn is None:
+            self.turn = self._new_turn()
+        marks = self.turn["marks"]
+        if not first or name not in marks:
+            marks[name] = time.perf_counter()
+
+    def user_speech_start(self):
+        """Record the start of user speech, starting a new turn after any model output"""
+        if self.turn is None or set(self.turn["marks"]) - {"user_speech_start", "user_speech_end"}:
+            self.start_turn()
+        self.mark("user_speech_start")
+
+    def user_speech_end(self):
+        """Record the end of user speech (the last USER block of the turn wins)"""
+        self.mark("user_speech_end", first=False)
+
+    def tool_start(self, tool_name, tool_use_id):
+        """Record the start of a tool call"""
+        self.mark("tool_start")
+        self.turn["tools"][tool_use_id] = {"name": tool_name, "start": time.perf_counter()}
+
+    def tool_end(self, tool_use_id):
+        """Record the end of a tool call"""
+        if self.turn is not None and tool_use_id in self.turn["tools"]:
+            self.turn["tools"][tool_use_id]["end"] = time.perf_counter()
+
+    def end_turn(self):
+        """Compute the spans of the current turn and export it"""
+        turn, self.turn = self.turn, None
+        if not turn or not turn["marks"]:
+            return None
+
+        marks = turn["marks"]
+        spans = {}
+        for span, (start, end) in self.SPANS.items():
+            if start in marks and end in marks:
+                spans[span] = (marks[end] - marks[start]) * 1000
+
+        tools, intervals = [], []
+        for tool_use_id, tool in turn["tools"].items():
+            if "end" in tool:
+                tools.append({"name": tool["name"], "toolUseId": tool_use_id, "ms": round((tool["end"] - tool["start"]) * 1000, 1)})
+                intervals.append((tool["start"], tool["end"]))
+        if tools:
+            # Wall-clock time with at least one tool running: concurrent tools count once
+            spans["tools"] = self._covered(intervals) * 1000
+        if "first_audio" in spans:
+            # Time spent in the model itself: only tool time before the first audio is excluded,
+            # since the model often speaks a filler line before it calls a tool
+            before_audio = [(max(start, marks["user_speech_end"]), min(end, marks["first_audio"]))
+                            for start, end in intervals]
+            spans["model"] = spans["first_audio"] - self._covered(before_audio) * 1000
+
+        for span, value in spans.items():
+            self.span_values.setdefault(span, []).append(value)
+
+        origin = min(marks.values())
+        record = {
+            "turn": turn["turn"],
+            "wallClock": turn["wallClock"],
+            "marksMs": {name: round((value - origin) * 1000, 1) for name, value in marks.items()},
+            "spansMs": {name: round(value, 1) for name, value in spans.items()},
+            "tools": tools
+        }
+        if self.trace_file:
+            self.trace_file.write(json.dumps(record) + "\n")
+            self.trace_file.flush()
+        return record
+
+    @staticmethod
+    def _covered(intervals):
+        """Length of the union of (start, end) intervals"""
+        total, covered_to = 0.0, None
+        for start, end in sorted(intervals):
+            if covered_to is not None:
+                start = max(start, covered_to)
+            if end > start:
+                total += end - start
+                covered_to = end
+        return total
+
+    def summary(self):
+        """Percentiles of every span across the session, in milliseconds"""
+        summary = {}
+        for span, values in self.span_values.items():
+            ordered = sorted(values)
+            stats = {"count": len(ordered)}
+            for p in self.PERCENTILES:
+                # Nearest-rank percentile
+                index = max(0, -(-p * len(ordered) // 100) - 1)
+                stats[f"p{p}"] = round(ordered[index], 1)
+            stats["max"] = round(ordered[-1], 1)
+            summary[span] = stats
+        return summary
+
+    def close(self):
+        """Flush the last turn, close the trace file and return the summary"""
+        self.end_turn()
+        if self.trace_file:
+            self.trace_file.close()
+            self.trace_file = None
+        return self.summary()
@@ -16,6 +16,11 @@ from aws_sdk_bedrock_runtime.client import BedrockRuntimeClient, InvokeModelWith
 from aws_sdk_bedrock_runtime.models import InvokeModelWithBidirectionalStreamInputChunk, BidirectionalInputPayloadPart
 from aws_sdk_bedrock_runtime.config import Config, HTTPAuthSchemeResolver, SigV4AuthScheme
 from smithy_aws_core.credentials_resolvers.environment import EnvironmentCredentialsResolver
+from event_encoder import EventEncoder
+from jitter_buffer import JitterBuffer
+from audio_capture import CaptureRing
+from latency_tracer import LatencyTracer
+from transcript import TranscriptAssembler, BARGE_IN_MARKER
 
 # Suppress warnings
 warnings.filterwarnings("ignore")
@@ -24,7 +29,10 @@ INPUT_SAMPLE_RATE = 16000
 OUTPUT_SAMPLE_RATE = 24000
 CHANNELS = 1
 FORMAT = pyaudio.paInt16
-CHUNK_SIZE = 512  # Number of frames per buffer
+CHUNK_SIZE = 512  # Number of frames per output buffer
+INPUT_FRAME_MS = 32  # Duration of each microphone capture buffer
+INPUT_FRAMES_PER_EVENT = 2  # Capture buffers coalesced into one audioInput event
+PLAYOUT_DELAY = 0.12  # Target output jitter buffer delay in seconds
 
 # Debug mode flag
 DEBUG = False
@@ -54,124 +62,7 @@ async def time_it_async(label, methodToRun):
 class BedrockStreamManager:
     """Manages bidirectional streaming with AWS Bedrock using RxPy for event processing"""
     
-    # Event templates
-    START_SESSION_EVENT = '''{
-        "event": {
-            "sessionStart": {
-            "inferenceConfiguration": {
-                "maxTokens": 1024,
-                "topP": 0.9,
-                "temperature": 0.7
-                }
-            }
-        }
-    }'''
-    
-    START_PROMPT_EVENT = '''{
-        "event": {
-            "promptStart": {
-            "promptName": "%s",
-            "textOutputConfiguration": {
-                "mediaType": "text/plain"
-                },
-            "audioOutputConfiguration": {
-                "mediaType": "audio/lpcm",
-                "sampleRateHertz": 24000,
-                "sampleSizeBits": 16,
-                "channelCount": 1,
-                "voiceId": "matthew",
-                "encoding": "base64",
-                "audioType": "SPEECH"
-                },
-            "toolUseOutputConfiguration": {
-                "mediaType": "application/json"
-                },
-            "toolConfiguration": {
-                "tools": []
-                }
-            }
-        }
-    }'''
-
-    CONTENT_START_EVENT = '''{
-        "event": {
-            "contentStart": {
-            "promptName": "%s",
-            "contentName": "%s",
-            "type": "AUDIO",
-            "interactive": true,
-            "role": "USER",
-            "audioInputConfiguration": {
-                "mediaType": "audio/lpcm",
-                "sampleRateHertz": 16000,
-                "sampleSizeBits": 16,
-                "channelCount": 1,
-                "audioType": "SPEECH",
-                "encoding": "base64"
-                }
-            }
-        }
-    }'''
-
-    AUDIO_EVENT_TEMPLATE = '''{
-        "event": {
-            "audioInput": {
-            "promptName": "%s",
-            "contentName": "%s",
-            "content": "%s"
-            }
-        }
-    }'''
-
-    TEXT_CONTENT_START_EVENT = '''{
-        "event": {
-            "contentStart": {
-            "promptName": "%s",
-            "contentName": "%s",
-            "role": "%s",
-            "type": "TEXT",
-            "interactive": true,
-                "textInputConfiguration": {
-                    "mediaType": "text/plain"
-                }
-            }
-        }
-    }'''
-
-    TEXT_INPUT_EVENT = '''{
-        "event": {
-            "textInput": {
-            "promptName": "%s",
-            "contentName": "%s",
-            "content": "%s"
-            }
-        }
-    }'''
-
-    CONTENT_END_EVENT = '''{
-        "event": {
-            "contentEnd": {
-            "promptName": "%s",
-            "contentName": "%s"
-            }
-        }
-    }'''
-
-    PROMPT_END_EVENT = '''{
-        "event": {
-            "promptEnd": {
-            "promptName": "%s"
-            }
-        }
-    }'''
-
-    SESSION_END_EVENT = '''{
-        "event": {
-            "sessionEnd": {}
-        }
-    }'''
-
-    def __init__(self, model_id='amazon.nova-sonic-v1:0', region='us-east-1'):
+    def __init__(self, model_id='amazon.nova-sonic-v1:0', region='us-east-1', trace_path=None):
         """Initialize the stream manager."""
         self.model_id = model_id
         self.region = region
@@ -187,16 +78,20 @@ class BedrockStreamManager:
         self.scheduler = None
         
         # Audio playback components
-        self.audio_output_queue = asyncio.Queue()
+        self.audio_output_buffer = JitterBuffer(OUTPUT_SAMPLE_RATE * 2 * CHANNELS, target_delay=PLAYOUT_DELAY)
 
         # Text response components
-        self.display_assistant_text = False
+        self.transcript = TranscriptAssembler()
         self.role = None
+
+        # Per-turn latency tracing
+        self.tracer = LatencyTracer(trace_path)
         
         # Session information
         self.prompt_name = str(uuid.uuid4())
         self.content_name = str(uuid.uuid4())
         self.audio_content_name = str(uuid.uuid4())
+        self.events = EventEncoder(self.prompt_name, self.audio_content_name)
 
     def _initialize_client(self):
         """Initialize the Bedrock client."""
@@ -225,12 +120,12 @@ class BedrockStreamManager:
             "generally two or three sentences for chatty scenarios."
             
             # Send initialization events
-            prompt_event = self.START_PROMPT_EVENT % self.prompt_name
-            text_content_start = self.TEXT_CONTENT_START_EVENT % (self.prompt_name, self.content_name, "SYSTEM")
-            text_content = self.TEXT_INPUT_EVENT % (self.prompt_name, self.content_name, default_system_prompt)
-            text_content_end = self.CONTENT_END_EVENT % (self.prompt_name, self.content_name)
+            prompt_event = self.events.prompt_start()
+            text_content_start = self.events.content_start_text(self.content_name, "SYSTEM")
+            text_content = self.events.text_input(self.content_name, default_system_prompt)
+            text_content_end = self.events.content_end(self.content_name)
             
-            init_events = [self.START_SESSION_EVENT, prompt_event, text_content_start, text_content, text_content_end]
+            init_events = [self.events.session_start(), prompt_event, text_content_start, text_content, text_content_end]
             
             for event in init_events:
                 await self.send_raw_event(event)
@@ -265,13 +160,15 @@ class BedrockStreamManager:
             raise
     
     async def send_raw_event(self, event_json):
-        """Send a raw event JSON to the Bedrock stream."""
+        """Send a raw event JSON (str or already encoded bytes) to the Bedrock stream."""
         if not self.stream_response or not self.is_active:
             debug_print("Stream not initialized or closed")
             return
         
+        if isinstance(event_json, str):
+            event_json = event_json.encode('utf-8')
         event = InvokeModelWithBidirectionalStreamInputChunk(
-            value=BidirectionalInputPayloadPart(bytes_=event_json.encode('utf-8'))
+            value=BidirectionalInputPayloadPart(bytes_=event_json)
         )
         
         try:
@@ -282,7 +179,7 @@ class BedrockStreamManager:
                     event_type = json.loads(event_json).get("event", {}).keys()
                     debug_print(f"Sent event type: {list(event_type)}")
                 else:
-                    debug_print(f"Sent event: {event_json}")
+                    debug_print(f"Sent event: {event_json.decode('utf-8')}")
         except Exception as e:
             debug_print(f"Error sending event: {str(e)}")
             if DEBUG:
@@ -292,25 +189,12 @@ class BedrockStreamManager:
     
     async def send_audio_content_start_event(self):
         """Send a content start event to the Bedrock stream."""
-        content_start_event = self.CONTENT_START_EVENT % (self.prompt_name, self.audio_content_name)
+        content_start_event = self.events.content_start_audio()
         await self.send_raw_event(content_start_event)
     
-    async def _handle_audio_input(self, data):
-        """Process audio input before sending it to the stream."""
-        audio_bytes = data.get('audio_bytes')
-        if not audio_bytes:
-            debug_print("No audio bytes received")
-            return
-        
+    async def _handle_audio_input(self, audio_event):
+        """Send an encoded audio input event to the stream."""
         try:
-            # Ensure the audio is properly formatted
-            debug_print(f"Processing audio chunk of size {len(audio_bytes)} bytes")
-            
-            # Base64 encode the audio data
-            blob = base64.b64encode(audio_bytes)
-            audio_event = self.AUDIO_EVENT_TEMPLATE % (self.prompt_name, self.audio_content_name, blob.decode('utf-8'))
-            
-            # Send the event directly
             await self.send_raw_event(audio_event)
         except Exception as e:
             debug_print(f"Error processing audio: {e}")
@@ -319,12 +203,10 @@ class BedrockStreamManager:
                 traceback.print_exc()
     
     def add_audio_chunk(self, audio_bytes):
-        """Add an audio chunk to the stream."""
-        self.audio_subject.on_next({
-            'audio_bytes': audio_bytes,
-            'prompt_name': self.prompt_name,
-            'content_name': self.audio_content_name
-        })
+        """Encode an audio chunk and add it to the stream."""
+        debug_print(f"Processing audio chunk of size {len(audio_bytes)} bytes")
+        # Encode right away: audio_bytes may be a view over the reusable capture ring
+        self.audio_subject.on_next(self.events.audio_input(audio_bytes))
     
     async def send_audio_content_end_event(self):
         """Send a content end event to the Bedrock stream."""
@@ -332,7 +214,7 @@ class BedrockStreamManager:
             debug_print("Stream is not active")
             return
         
-        content_end_event = self.CONTENT_END_EVENT % (self.prompt_name, self.audio_content_name)
+        content_end_event = self.events.content_end_audio()
         await self.send_raw_event(content_end_event)
         debug_print("Audio ended")
     
@@ -342,7 +224,7 @@ class BedrockStreamManager:
             debug_print("Stream is not active")
             return
         
-        prompt_end_event = self.PROMPT_END_EVENT % (self.prompt_name)
+        prompt_end_event = self.events.prompt_end()
         await self.send_raw_event(prompt_end_event)
         debug_print("Prompt ended")
         
@@ -352,10 +234,23 @@ class BedrockStreamManager:
             debug_print("Stream is not active")
             return
 
-        await self.send_raw_event(self.SESSION_END_EVENT)
+        await self.send_raw_event(self.events.session_end())
         self.is_active = False
         debug_print("Session ended")
     
+    def print_transcript(self, deltas):
+        """Print transcript deltas, showing each piece of text only once"""
+        for delta in deltas:
+            role = delta["role"].capitalize()
+            if delta["kind"] == "append":
+                if delta["role"] == "ASSISTANT":
+                    self.tracer.mark("first_text")
+                print(f"{role}: {delta['text']}")
+            elif delta["kind"] == "revise":
+                print(f"{role} (revised): {delta['text']}")
+            else:
+                debug_print(f"{role} speculative text discarded after barge-in")
+
     async def _process_responses(self):
         """Process incoming responses from Bedrock."""
         try:            
@@ -375,38 +270,31 @@ class BedrockStreamManager:
                                     content_start = json_data['event']['contentStart']
                                     # set role
                                     self.role = content_start['role']
-                                    # Check for speculative content
-                                    if 'additionalModelFields' in content_start:
-                                        try:
-                                            additional_fields = json.loads(content_start['additionalModelFields'])
-                                            if additional_fields.get('generationStage') == 'SPECULATIVE':
-                                                debug_print("Speculative content detected")
-                                                self.display_assistant_text = True
-                                            else:
-                                                self.display_assistant_text = False
-                                        except json.JSONDecodeError:
-                                            debug_print("Error parsing additionalModelFields")
+                                    if self.role == "USER":
+                                        self.tracer.user_speech_start()
+                                    self.transcript.content_start(content_start)
                                 elif 'contentEnd' in json_data['event']:
                                     debug_print("Content end detected")
+                                    if self.role == "USER":
+                                        self.tracer.user_speech_end()
+                                    self.print_transcript(self.transcript.content_end(json_data['event']['contentEnd']))
                                 elif 'textOutput' in json_data['event']:
-                                    text_content = json_data['event']['textOutput']['content']
+                                    text_output = json_data['event']['textOutput']
                                     # Check if there is a barge-in
-                                    if '{ "interrupted" : true }' in text_content:
+                                    if BARGE_IN_MARKER in text_output['content']:
                                         if DEBUG:
                                             print("Barge-in detected. Stopping audio output.")
                                         self.barge_in = True
 
-                                    if (self.role == "ASSISTANT" and self.display_assistant_text):
-                                        print(f"Assistant: {text_content}")
-                                    elif (self.role == "USER"):
-                                        print(f"User: {text_content}")
+                                    self.print_transcript(self.transcript.text_output(text_output))
                                 elif 'contentEnd' in json_data['event']:
                                     print (json_data)
                                 
                                 elif 'audioOutput' in json_data['event']:
                                     audio_content = json_data['event']['audioOutput']['content']
+                                    self.tracer.mark("first_audio")
                                     audio_bytes = base64.b64decode(audio_content)
-                                    await self.audio_output_queue.put(audio_bytes)
+                                    self.audio_output_buffer.put(audio_bytes)
                             
                             self.output_subject.on_next(json_data)
                         except json.JSONDecodeError:
@@ -460,14 +348,16 @@ class AudioStreamer:
         debug_print("AudioStreamer PyAudio initialized")
 
         # Initialize separate streams for input and output
-        # Input stream with callback for microphone
+        # Input stream with callback for microphone, feeding a preallocated capture ring
+        input_frames = INPUT_SAMPLE_RATE * INPUT_FRAME_MS // 1000
+        self.capture_ring = CaptureRing(input_frames * 2 * CHANNELS, INPUT_FRAMES_PER_EVENT, loop=self.loop)
         debug_print("Opening input audio stream...")
         self.input_stream = time_it("AudioStreamerOpenAudio", lambda  : self.p.open(
             format=FORMAT,
             channels=CHANNELS,
             rate=INPUT_SAMPLE_RATE,
             input=True,
-            frames_per_buffer=CHUNK_SIZE,
+            frames_per_buffer=input_frames,
             stream_callback=self.input_callback
         ))
         debug_print("input audio stream opened")
@@ -485,23 +375,24 @@ class AudioStreamer:
         debug_print("output audio stream opened")
 
     def input_callback(self, in_data, frame_count, time_info, status):
-        """Callback function that schedules audio processing in the asyncio event loop"""
+        """Callback function that copies captured audio into the capture ring"""
         if self.is_streaming and in_data:
-            # Schedule the task in the event loop
-            asyncio.run_coroutine_threadsafe(
-                self.process_input_audio(in_data), 
-                self.loop
-            )
+            self.capture_ring.write(in_data)
         return (None, pyaudio.paContinue)
 
-    async def process_input_audio(self, audio_data):
-        """Process a single audio chunk directly"""
-        try:
-            # Send audio to Bedrock immediately
-            self.stream_manager.add_audio_chunk(audio_data)
-        except Exception as e:
-            if self.is_streaming:
-                print(f"Error processing input audio: {e}")
+    async def process_input_audio(self):
+        """Send coalesced audio frames from the capture ring to Bedrock"""
+        while self.is_streaming:
+            try:
+                batch = await self.capture_ring.read()
+                # The batch is encoded before returning, so its ring slot can be reused
+                self.stream_manager.add_audio_chunk(batch)
+                self.capture_ring.release(batch)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                if self.is_streaming:
+                    print(f"Error processing input audio: {e}")
     
     async def play_output_audio(self):
         """Play audio responses from Nova Sonic"""
@@ -509,24 +400,21 @@ class AudioStreamer:
             try:
                 # Check for barge-in flag
                 if self.stream_manager.barge_in:
-                    # Clear the audio queue
-                    while not self.stream_manager.audio_output_queue.empty():
-                        try:
-                            self.stream_manager.audio_output_queue.get_nowait()
-                        except asyncio.QueueEmpty:
-                            break
+                    # Clear the audio buffer
+                    self.stream_manager.audio_output_buffer.clear()
                     self.stream_manager.barge_in = False
                     # Small sleep after clearing
                     await asyncio.sleep(0.05)
                     continue
                 
-                # Get audio data from the stream manager's queue
+                # Get audio data from the stream manager's jitter buffer
                 audio_data = await asyncio.wait_for(
-                    self.stream_manager.audio_output_queue.get(),
+                    self.stream_manager.audio_output_buffer.get(),
                     timeout=0.1
                 )
                 
                 if audio_data and self.is_streaming:
+                    self.stream_manager.tracer.mark("playback_start")
                     # Write directly to the output stream in smaller chunks
                     chunk_size = CHUNK_SIZE  # Use the same chunk size as the stream
                     
@@ -576,7 +464,7 @@ class AudioStreamer:
             self.input_stream.start_stream()
         
         # Start processing tasks
-        #self.input_task = asyncio.create_task(self.process_input_audio())
+        self.input_task = asyncio.create_task(self.process_input_audio())
         self.output_task = asyncio.create_task(self.play_output_audio())
         
         # Wait for user to press Enter to stop
@@ -619,17 +507,27 @@ class AudioStreamer:
         
         if self.p:
             self.p.terminate()
+        debug_print(f"Audio output jitter buffer: {self.stream_manager.audio_output_buffer.stats()}")
+        debug_print(f"Audio capture overruns: {self.capture_ring.overruns}")
         
         await self.stream_manager.close() 
 
+        # Report the per-turn latency collected during the session
+        tracer = self.stream_manager.tracer
+        latency_summary = tracer.close()
+        if tracer.trace_path:
+            print(f"Latency trace written to {tracer.trace_path}")
+            for span, stats in latency_summary.items():
+                print(f"  {span} (ms): {stats}")
+
 
-async def main(debug=False):
+async def main(debug=False, trace_path=None):
     """Main function to run the application."""
     global DEBUG
     DEBUG = debug
 
     # Create stream manager
-    stream_manager = BedrockStreamManager(model_id='amazon.nova-sonic-v1:0', region='us-east-1')
+    stream_manager = BedrockStreamManager(model_id='amazon.nova-sonic-v1:0', region='us-east-1', trace_path=trace_path)
 
     # Create audio streamer
     audio_streamer = AudioStreamer(stream_manager)
@@ -653,6 +551,7 @@ if __name__ == "__main__":
     
     parser = argparse.ArgumentParser(description='Nova Sonic Python Streaming')
     parser.add_argument('--debug', action='store_true', help='Enable debug mode')
+    parser.add_argument('--trace', metavar='FILE', help='Write per-turn latency traces to a JSONL file')
     args = parser.parse_args()
     # Set your AWS credentials here or use environment variables
     # os.environ['AWS_ACCESS_KEY_ID'] = "AWS_ACCESS_KEY_ID"
@@ -661,7 +560,7 @@ if __name__ == "__main__":
 
     # Run the main function
     try:
-        asyncio.run(main(debug=args.debug))
+        asyncio.run(main(debug=args.debug, trace_path=args.trace))
     except Exception as e:
         print(f"Application error: {e}")
         if args.debug:
@@ -15,6 +15,13 @@ from aws_sdk_bedrock_runtime.client import BedrockRuntimeClient, InvokeModelWith
 from aws_sdk_bedrock_runtime.models import InvokeModelWithBidirectionalStreamInputChunk, BidirectionalInputPayloadPart
 from aws_sdk_bedrock_runtime.config import Config, HTTPAuthSchemeResolver, SigV4AuthScheme
 from smithy_aws_core.credentials_resolvers.environment import EnvironmentCredentialsResolver
+from event_encoder import EventEncoder
+from jitter_buffer import JitterBuffer
+from audio_capture import CaptureRing
+from latency_tracer import LatencyTracer
+from transcript import TranscriptAssembler, BARGE_IN_MARKER
+from tool_cache import ToolResultCache, ToolCachePolicy
+from tool_registry import ToolRegistry
 
 # Suppress warnings
 warnings.filterwarnings("ignore")
@@ -24,7 +31,16 @@ INPUT_SAMPLE_RATE = 16000
 OUTPUT_SAMPLE_RATE = 24000
 CHANNELS = 1
 FORMAT = pyaudio.paInt16
-CHUNK_SIZE = 1024  # Number of frames per buffer
+CHUNK_SIZE = 1024  # Number of frames per output buffer
+INPUT_FRAME_MS = 32  # Duration of each microphone capture buffer
+INPUT_FRAMES_PER_EVENT = 2  # Capture buffers coalesced into one audioInput event
+PLAYOUT_DELAY = 0.12  # Target output jitter buffer delay in seconds
+
+# Tools whose results are cached, keyed on their normalized input
+TOOL_CACHE_POLICIES = {
+    "getdateandtimetool": ToolCachePolicy(ttl=10, max_entries=1),  # The reported time has minute resolution
+    "trackordertool": ToolCachePolicy(ttl=300, max_entries=128)  # Status only depends on the order ID
+}
 
 # Debug mode flag
 DEBUG = False
@@ -53,117 +69,7 @@ async def time_it_async(label, methodToRun):
 
 class BedrockStreamManager:
     """Manages bidirectional streaming with AWS Bedrock using asyncio"""
-    
-    # Event templates
-    START_SESSION_EVENT = '''{
-        "event": {
-            "sessionStart": {
-            "inferenceConfiguration": {
-                "maxTokens": 1024,
-                "topP": 0.9,
-                "temperature": 0.7
-                }
-            }
-        }
-    }'''
-
-    CONTENT_START_EVENT = '''{
-        "event": {
-            "contentStart": {
-            "promptName": "%s",
-            "contentName": "%s",
-            "type": "AUDIO",
-            "interactive": true,
-            "role": "USER",
-            "audioInputConfiguration": {
-                "mediaType": "audio/lpcm",
-                "sampleRateHertz": 16000,
-                "sampleSizeBits": 16,
-                "channelCount": 1,
-                "audioType": "SPEECH",
-                "encoding": "base64"
-                }
-            }
-        }
-    }'''
-
-    AUDIO_EVENT_TEMPLATE = '''{
-        "event": {
-            "audioInput": {
-            "promptName": "%s",
-            "contentName": "%s",
-            "content": "%s"
-            }
-        }
-    }'''
-
-    TEXT_CONTENT_START_EVENT = '''{
-        "event": {
-            "contentStart": {
-            "promptName": "%s",
-            "contentName": "%s",
-            "type": "TEXT",
-            "role": "%s",
-            "interactive": true,
-                "textInputConfiguration": {
-                    "mediaType": "text/plain"
-                }
-            }
-        }
-    }'''
-
-    TEXT_INPUT_EVENT = '''{
-        "event": {
-            "textInput": {
-            "promptName": "%s",
-            "contentName": "%s",
-            "content": "%s"
-            }
-        }
-    }'''
-
-    TOOL_CONTENT_START_EVENT = '''{
-        "event": {
-            "contentStart": {
-                "promptName": "%s",
-                "contentName": "%s",
-                "interactive": false,
-                "type": "TOOL",
-                "role": "TOOL",
-                "toolResultInputConfiguration": {
-                    "toolUseId": "%s",
-                    "type": "TEXT",
-                    "textInputConfiguration": {
-                        "mediaType": "text/plain"
-                    }
-                }
-            }
-        }
-    }'''
-
-    CONTENT_END_EVENT = '''{
-        "event": {
-            "contentEnd": {
-            "promptName": "%s",
-            "contentName": "%s"
-            }
-        }
-    }'''
 
-    PROMPT_END_EVENT = '''{
-        "event": {
-            "promptEnd": {
-            "promptName": "%s"
-            }
-        }
-    }'''
-
-    SESSION_END_EVENT = '''{
-        "event": {
-            "sessionEnd": {}
-        }
-    }'''
-    
     def start_prompt(self):
         """Create a promptStart event"""
         get_default_tool_schema = json.dumps({
@@ -188,81 +94,43 @@ class BedrockStreamManager:
             "required": ["orderId"]
         })
 
-        
-        prompt_start_event = {
-            "event": {
-                "promptStart": {
-                    "promptName": self.prompt_name,
-                    "textOutputConfiguration": {
-                        "mediaType": "text/plain"
-                    },
-                    "audioOutputConfiguration": {
-                        "mediaType": "audio/lpcm",
-                        "sampleRateHertz": 24000,
-                        "sampleSizeBits": 16,
-                        "channelCount": 1,
-                        "voiceId": "matthew",
-                        "encoding": "base64",
-                        "audioType": "SPEECH"
-                    },
-                    "toolUseOutputConfiguration": {
-                        "mediaType": "application/json"
-                    },
-                    "toolConfiguration": {
-                        "tools": [
-                            {
-                                "toolSpec": {
-                                    "name": "getDateAndTimeTool",
-                                    "description": "get information about the current date and time",
-                                    "inputSchema": {
-                                        "json": get_default_tool_schema
-                                    }
-                                }
-                            },
-                            {
-                                "toolSpec": {
-                                    "name": "trackOrderTool",
-                                    "description": "Retrieves real-time order tracking information and detailed status updates for customer orders by order ID. Provides estimated delivery dates. Use this tool when customers ask about their order status or delivery timeline.",
-                                    "inputSchema": {
-                                    "json": get_order_tracking_schema
-                                    }
-                                }
-                            }
-                        ]
+        tool_configuration = {
+            "tools": [
+                {
+                    "toolSpec": {
+                        "name": "getDateAndTimeTool",
+                        "description": "get information about the current date and time",
+                        "inputSchema": {
+                            "json": get_default_tool_schema
+                        }
+                    }
+                },
+                {
+                    "toolSpec": {
+                        "name": "trackOrderTool",
+                        "description": "Retrieves real-time order tracking information and detailed status updates for customer orders by order ID. Provides estimated delivery dates. Use this tool when customers ask about their order status or delivery timeline.",
+                        "inputSchema": {
+                            "json": get_order_tracking_schema
+                        }
                     }
                 }
-            }
+            ]
         }
-        
-        return json.dumps(prompt_start_event)
+
+        return self.events.prompt_start(tool_configuration)
     
     def tool_result_event(self, content_name, content, role):
         """Create a tool result event"""
-
-        if isinstance(content, dict):
-            content_json_string = json.dumps(content)
-        else:
-            content_json_string = content
-            
-        tool_result_event = {
-            "event": {
-                "toolResult": {
-                    "promptName": self.prompt_name,
-                    "contentName": content_name,
-                    "content": content_json_string
-                }
-            }
-        }
-        return json.dumps(tool_result_event)
+        return self.events.tool_result(content_name, content)
    
-    def __init__(self, model_id='amazon.nova-sonic-v1:0', region='us-east-1'):
+    def __init__(self, model_id='amazon.nova-sonic-v1:0', region='us-east-1', trace_path=None):
         """Initialize the stream manager."""
         self.model_id = model_id
         self.region = region
         
         # Replace RxPy subjects with asyncio queues
         self.audio_input_queue = asyncio.Queue()
-        self.audio_output_queue = asyncio.Queue()
+        self.audio_output_buffer = JitterBuffer(OUTPUT_SAMPLE_RATE * 2 * CHANNELS, target_delay=PLAYOUT_DELAY)
         self.output_queue = asyncio.Queue()
         
         self.response_task = None
@@ -275,13 +143,27 @@ class BedrockStreamManager:
         self.audio_player = None
         
         # Text response components
-        self.display_assistant_text = False
+        self.transcript = TranscriptAssembler()
         self.role = None
 
+        # Per-turn latency tracing
+        self.tracer = LatencyTracer(trace_path)
+
+        # Results of repeated tool requests
+        self.tool_cache = ToolResultCache(TOOL_CACHE_POLICIES)
+
+        # Tools with their latency budgets and the response used when they fail
+        self.tools = ToolRegistry()
+        self.tools.register("getdateandtimetool", self.getDateAndTimeTool, timeout=1.0,
+                            fallback={"error": "The current date and time are not available"})
+        self.tools.register("trackordertool", self.trackOrderTool, timeout=3.0, retries=1,
+                            fallback={"error": "Order tracking is temporarily unavailable, please try again later"})
+
         # Session information
         self.prompt_name = str(uuid.uuid4())
         self.content_name = str(uuid.uuid4())
         self.audio_content_name = str(uuid.uuid4())
+        self.events = EventEncoder(self.prompt_name, self.audio_content_name)
         self.toolUseContent = ""
         self.toolUseId = ""
         self.toolName = ""
@@ -310,11 +192,11 @@ class BedrockStreamManager:
             
             # Send initialization events
             prompt_event = self.start_prompt()
-            text_content_start = self.TEXT_CONTENT_START_EVENT % (self.prompt_name, self.content_name, "SYSTEM")
-            text_content = self.TEXT_INPUT_EVENT % (self.prompt_name, self.content_name, default_system_prompt)
-            text_content_end = self.CONTENT_END_EVENT % (self.prompt_name, self.content_name)
+            text_content_start = self.events.content_start_text(self.content_name, "SYSTEM")
+            text_content = self.events.text_input(self.content_name, default_system_prompt)
+            text_content_end = self.events.content_end(self.content_name)
             
-            init_events = [self.START_SESSION_EVENT, prompt_event, text_content_start, text_content, text_content_end]
+            init_events = [self.events.session_start(), prompt_event, text_content_start, text_content, text_content_end]
             
             for event in init_events:
                 await self.send_raw_event(event)
@@ -338,13 +220,15 @@ class BedrockStreamManager:
             raise
     
     async def send_raw_event(self, event_json):
-        """Send a raw event JSON to the Bedrock stream."""
+        """Send a raw event JSON (str or already encoded bytes) to the Bedrock stream."""
         if not self.stream_response or not self.is_active:
             debug_print("Stream not initialized or closed")
             return
-       
+
+        if isinstance(event_json, str):
+            event_json = event_json.encode('utf-8')
         event = InvokeModelWithBidirectionalStreamInputChunk(
-            value=BidirectionalInputPayloadPart(bytes_=event_json.encode('utf-8'))
+            value=BidirectionalInputPayloadPart(bytes_=event_json)
         )
         
         try:
@@ -355,7 +239,7 @@ class BedrockStreamManager:
                     event_type = json.loads(event_json).get("event", {}).keys()
                     debug_print(f"Sent event type: {list(event_type)}")
                 else:
-                    debug_print(f"Sent event: {event_json}")
+                    debug_print(f"Sent event: {event_json.decode('utf-8')}")
         except Exception as e:
             debug_print(f"Error sending event: {str(e)}")
             if DEBUG:
@@ -364,28 +248,15 @@ class BedrockStreamManager:
     
     async def send_audio_content_start_event(self):
         """Send a content start event to the Bedrock stream."""
-        content_start_event = self.CONTENT_START_EVENT % (self.prompt_name, self.audio_content_name)
+        content_start_event = self.events.content_start_audio()
         await self.send_raw_event(content_start_event)
     
     async def _process_audio_input(self):
-        """Process audio input from the queue and send to Bedrock."""
+        """Send encoded audio input events from the queue to Bedrock."""
         while self.is_active:
             try:
-                # Get audio data from the queue
-                data = await self.audio_input_queue.get()
-                
-                audio_bytes = data.get('audio_bytes')
-                if not audio_bytes:
-                    debug_print("No audio bytes received")
-                    continue
-                
-                # Base64 encode the audio data
-                blob = base64.b64encode(audio_bytes)
-                audio_event = self.AUDIO_EVENT_TEMPLATE % (
-                    self.prompt_name, 
-                    self.audio_content_name, 
-                    blob.decode('utf-8')
-                )
+                # Get the next audio event from the queue
+                audio_event = await self.audio_input_queue.get()
                 
                 # Send the event
                 await self.send_raw_event(audio_event)
@@ -399,12 +270,9 @@ class BedrockStreamManager:
                     traceback.print_exc()
     
     def add_audio_chunk(self, audio_bytes):
-        """Add an audio chunk to the queue."""
-        self.audio_input_queue.put_nowait({
-            'audio_bytes': audio_bytes,
-            'prompt_name': self.prompt_name,
-            'content_name': self.audio_content_name
-        })
+        """Encode an audio chunk and add it to the queue."""
+        # Encode right away: audio_bytes may be a view over the reusable capture ring
+        self.audio_input_queue.put_nowait(self.events.audio_input(audio_bytes))
     
     async def send_audio_content_end_event(self):
         """Send a content end event to the Bedrock stream."""
@@ -412,27 +280,27 @@ class BedrockStreamManager:
             debug_print("Stream is not active")
             return
         
-        content_end_event = self.CONTENT_END_EVENT % (self.prompt_name, self.audio_content_name)
+        content_end_event = self.events.content_end_audio()
         await self.send_raw_event(content_end_event)
         debug_print("Audio ended")
     
     async def send_tool_start_event(self, content_name):
         """Send a tool content start event to the Bedrock stream."""
-        content_start_event = self.TOOL_CONTENT_START_EVENT % (self.prompt_name, content_name, self.toolUseId)
-        debug_print(f"Sending tool start event: {content_start_event}")  
+        content_start_event = self.events.content_start_tool(content_name, self.toolUseId)
+        debug_print(f"Sending tool start event: {content_start_event.decode('utf-8')}")
         await self.send_raw_event(content_start_event)
 
     async def send_tool_result_event(self, content_name, tool_result):
         """Send a tool content event to the Bedrock stream."""
         # Use the actual tool result from processToolUse
         tool_result_event = self.tool_result_event(content_name=content_name, content=tool_result, role="TOOL")
-        debug_print(f"Sending tool result event: {tool_result_event}")
+        debug_print(f"Sending tool result event: {tool_result_event.decode('utf-8')}")
         await self.send_raw_event(tool_result_event)
     
     async def send_tool_content_end_event(self, content_name):
         """Send a tool content end event to the Bedrock stream."""
-        tool_content_end_event = self.CONTENT_END_EVENT % (self.prompt_name, content_name)
-        debug_print(f"Sending tool content event: {tool_content_end_event}")
+        tool_content_end_event = self.events.content_end(content_name)
+        debug_print(f"Sending tool content event: {tool_content_end_event.decode('utf-8')}")
         await self.send_raw_event(tool_content_end_event)
     
     async def send_prompt_end_event(self):
@@ -441,7 +309,7 @@ class BedrockStreamManager:
             debug_print("Stream is not active")
             return
         
-        prompt_end_event = self.PROMPT_END_EVENT % (self.prompt_name)
+        prompt_end_event = self.events.prompt_end()
         await self.send_raw_event(prompt_end_event)
         debug_print("Prompt ended")
         
@@ -451,10 +319,23 @@ class BedrockStreamManager:
             debug_print("Stream is not active")
             return
 
-        await self.send_raw_event(self.SESSION_END_EVENT)
+        await self.send_raw_event(self.events.session_end())
         self.is_active = False
         debug_print("Session ended")
     
+    def print_transcript(self, deltas):
+        """Print transcript deltas, showing each piece of text only once"""
+        for delta in deltas:
+            role = delta["role"].capitalize()
+            if delta["kind"] == "append":
+                if delta["role"] == "ASSISTANT":
+                    self.tracer.mark("first_text")
+                print(f"{role}: {delta['text']}")
+            elif delta["kind"] == "revise":
+                print(f"{role} (revised): {delta['text']}")
+            else:
+                debug_print(f"{role} speculative text discarded after barge-in")
+
     async def _process_responses(self):
         """Process incoming responses from Bedrock."""
         try:            
@@ -474,46 +355,41 @@ class BedrockStreamManager:
                                     content_start = json_data['event']['contentStart']
                                     # set role
                                     self.role = content_start['role']
-                                    # Check for speculative content
-                                    if 'additionalModelFields' in content_start:
-                                        try:
-                                            additional_fields = json.loads(content_start['additionalModelFields'])
-                                            if additional_fields.get('generationStage') == 'SPECULATIVE':
-                                                debug_print("Speculative content detected")
-                                                self.display_assistant_text = True
-                                            else:
-                                                self.display_assistant_text = False
-                                        except json.JSONDecodeError:
-                                            debug_print("Error parsing additionalModelFields")
+                                    if self.role == "USER":
+                                        self.tracer.user_speech_start()
+                                    self.transcript.content_start(content_start)
                                 elif 'textOutput' in json_data['event']:
-                                    text_content = json_data['event']['textOutput']['content']
-                                    role = json_data['event']['textOutput']['role']
+                                    text_output = json_data['event']['textOutput']
                                     # Check if there is a barge-in
-                                    if '{ "interrupted" : true }' in text_content:
+                                    if BARGE_IN_MARKER in text_output['content']:
                                         debug_print("Barge-in detected. Stopping audio output.")
                                         self.barge_in = True
 
-                                    if (self.role == "ASSISTANT" and self.display_assistant_text):
-                                        print(f"Assistant: {text_content}")
-                                    elif (self.role == "USER"):
-                                        print(f"User: {text_content}")
+                                    self.print_transcript(self.transcript.text_output(text_output))
 
                                 elif 'audioOutput' in json_data['event']:
                                     audio_content = json_data['event']['audioOutput']['content']
+                                    self.tracer.mark("first_audio")
                                     audio_bytes = base64.b64decode(audio_content)
-                                    await self.audio_output_queue.put(audio_bytes)
+                                    self.audio_output_buffer.put(audio_bytes)
                                 elif 'toolUse' in json_data['event']:
                                     self.toolUseContent = json_data['event']['toolUse']
                                     self.toolName = json_data['event']['toolUse']['toolName']
                                     self.toolUseId = json_data['event']['toolUse']['toolUseId']
+                                    self.tracer.tool_start(self.toolName, self.toolUseId)
                                     debug_print(f"Tool use detected: {self.toolName}, ID: {self.toolUseId}")
                                 elif 'contentEnd' in json_data['event'] and json_data['event'].get('contentEnd', {}).get('type') == 'TOOL':
                                     debug_print("Processing tool use and sending result")
                                     toolResult = await self.processToolUse(self.toolName, self.toolUseContent)
+                                    self.tracer.tool_end(self.toolUseId)
                                     toolContent = str(uuid.uuid4())
                                     await self.send_tool_start_event(toolContent)
                                     await self.send_tool_result_event(toolContent, toolResult)
                                     await self.send_tool_content_end_event(toolContent)
+                                elif 'contentEnd' in json_data['event']:
+                                    if self.role == "USER":
+                                        self.tracer.user_speech_end()
+                                    self.print_transcript(self.transcript.content_end(json_data['event']['contentEnd']))
                                 
                                 elif 'completionEnd' in json_data['event']:
                                     # Handle end of conversation, no more response will be generated
@@ -541,114 +417,119 @@ class BedrockStreamManager:
             self.is_active = False
 
     async def processToolUse(self, toolName, toolUseContent):
-        """Return the tool result"""
+        """Return the tool result, reusing the cached result of a repeated request"""
         tool = toolName.lower()
         debug_print(f"Tool Use Content: {toolUseContent}")
+        if tool not in self.tools:
+            return {"error": f"Unknown tool {toolName}"}
+        return await self.tool_cache.call(tool, toolUseContent.get("content", ""),
+                                          lambda: self.tools.invoke(tool, toolUseContent))
+
+    async def getDateAndTimeTool(self, toolUseContent):
+        """Return the current date and time in PST"""
+        # Get current date in PST timezone
+        pst_timezone = pytz.timezone("America/Los_Angeles")
+        pst_date = datetime.datetime.now(pst_timezone)
         
-        if tool == "getdateandtimetool":
-            # Get current date in PST timezone
-            pst_timezone = pytz.timezone("America/Los_Angeles")
-            pst_date = datetime.datetime.now(pst_timezone)
-            
+        return {
+            "formattedTime": pst_date.strftime("%I:%M %p"),
+            "date": pst_date.strftime("%Y-%m-%d"),
+            "year": pst_date.year,
+            "month": pst_date.month,
+            "day": pst_date.day,
+            "dayOfWeek": pst_date.strftime("%A").upper(),
+            "timezone": "PST"
+        }
+
+    async def trackOrderTool(self, toolUseContent):
+        """Return the (simulated) tracking status of an order"""
+        # Extract order ID from toolUseContent
+        content = toolUseContent.get("content", {})
+        content_data = json.loads(content)
+        order_id = content_data.get("orderId", "")
+        request_notifications = toolUseContent.get("requestNotifications", False)
+        
+        # Convert order_id to string if it's an integer
+        if isinstance(order_id, int):
+            order_id = str(order_id)
+        # Validate order ID format
+        if not order_id or not isinstance(order_id, str):
             return {
-                "formattedTime": pst_date.strftime("%I:%M %p"),
-                "date": pst_date.strftime("%Y-%m-%d"),
-                "year": pst_date.year,
-                "month": pst_date.month,
-                "day": pst_date.day,
-                "dayOfWeek": pst_date.strftime("%A").upper(),
-                "timezone": "PST"
+                "error": "Invalid order ID format",
+                "orderStatus": "",
+                "estimatedDelivery": "",
+                "lastUpdate": ""
             }
         
-        elif tool == "trackordertool":
+        # Create deterministic randomness based on order ID
+        # This ensures the same order ID always returns the same status
+        seed = int(hashlib.md5(order_id.encode(), usedforsecurity=False).hexdigest(), 16) % 10000
+        random.seed(seed)
+        
+        # Possible statuses with appropriate weights
+        statuses = [
+            "Order received", 
+            "Processing", 
+            "Preparing for shipment",
+            "Shipped",
+            "In transit", 
+            "Out for delivery",
+            "Delivered",
+            "Delayed"
+        ]
+        
+        weights = [10, 15, 15, 20, 20, 10, 5, 3]
+        
+        # Select a status based on the weights
+        status = random.choices(statuses, weights=weights, k=1)[0]
+        
+        # Generate a realistic estimated delivery date
+        today = datetime.datetime.now()
+        # Handle estimated delivery date based on status
+        if status == "Delivered":
+            # For delivered items, delivery date is in the past
+            delivery_days = -random.randint(0, 3)
+            estimated_delivery = (today + datetime.timedelta(days=delivery_days)).strftime("%Y-%m-%d")
+        elif status == "Out for delivery":
+            # For out for delivery, delivery is today
+            estimated_delivery = today.strftime("%Y-%m-%d")
+        else:
+            # For other statuses, delivery is in the future
+            delivery_days = random.randint(1, 10)
+            estimated_delivery = (today + datetime.timedelta(days=delivery_days)).strftime("%Y-%m-%d")
+
+        # Handle notification request if enabled
+        notification_message = ""
+        if request_notifications and status != "Delivered":
+            notification_message = f"You will receive notifications for order {order_id}"
+
+        # Return comprehensive tracking information
+        tracking_info = {
+            "orderStatus": status,
+            "orderNumber": order_id,
+            "notificationStatus": notification_message
+        }
 
-            # Extract order ID from toolUseContent
-            content = toolUseContent.get("content", {})
-            content_data = json.loads(content)
-            order_id = content_data.get("orderId", "")
-            request_notifications = toolUseContent.get("requestNotifications", False)
-            
-            # Convert order_id to string if it's an integer
-            if isinstance(order_id, int):
-                order_id = str(order_id)
-            # Validate order ID format
-            if not order_id or not isinstance(order_id, str):
-                return {
-                    "error": "Invalid order ID format",
-                    "orderStatus": "",
-                    "estimatedDelivery": "",
-                    "lastUpdate": ""
-                }
-            
-            # Create deterministic randomness based on order ID
-            # This ensures the same order ID always returns the same status
-            seed = int(hashlib.md5(order_id.encode(), usedforsecurity=False).hexdigest(), 16) % 10000
-            random.seed(seed)
-            
-            # Possible statuses with appropriate weights
-            statuses = [
-                "Order received", 
-                "Processing", 
-                "Preparing for shipment",
-                "Shipped",
-                "In transit", 
-                "Out for delivery",
-                "Delivered",
-                "Delayed"
-            ]
-            
-            weights = [10, 15, 15, 20, 20, 10, 5, 3]
+        # Add appropriate fields based on status
+        if status == "Delivered":
+            tracking_info["deliveredOn"] = estimated_delivery
+        elif status == "Out for delivery":
+            tracking_info["expectedDelivery"] = "Today"
+        else:
+            tracking_info["estimatedDelivery"] = estimated_delivery
+
+        # Add location information based on status
+        if status == "In transit":
+            tracking_info["currentLocation"] = "Distribution Center"
+        elif status == "Delivered":
+            tracking_info["deliveryLocation"] = "Front Door"
             
-            # Select a status based on the weights
-            status = random.choices(statuses, weights=weights, k=1)[0]
+        # Add additional info for delayed status
+        if status == "Delayed":
+            tracking_info["additionalInfo"] = "Weather delays possible"
             
-            # Generate a realistic estimated delivery date
-            today = datetime.datetime.now()
-            # Handle estimated delivery date based on status
-            if status == "Delivered":
-                # For delivered items, delivery date is in the past
-                delivery_days = -random.randint(0, 3)
-                estimated_delivery = (today + datetime.timedelta(days=delivery_days)).strftime("%Y-%m-%d")
-            elif status == "Out for delivery":
-                # For out for delivery, delivery is today
-                estimated_delivery = today.strftime("%Y-%m-%d")
-            else:
-                # For other statuses, delivery is in the future
-                delivery_days = random.randint(1, 10)
-                estimated_delivery = (today + datetime.timedelta(days=delivery_days)).strftime("%Y-%m-%d")
-
-            # Handle notification request if enabled
-            notification_message = ""
-            if request_notifications and status != "Delivered":
-                notification_message = f"You will receive notifications for order {order_id}"
-
-            # Return comprehensive tracking information
-            tracking_info = {
-                "orderStatus": status,
-                "orderNumber": order_id,
-                "notificationStatus": notification_message
-            }
+        return tracking_info
 
-            # Add appropriate fields based on status
-            if status == "Delivered":
-                tracking_info["deliveredOn"] = estimated_delivery
-            elif status == "Out for delivery":
-                tracking_info["expectedDelivery"] = "Today"
-            else:
-                tracking_info["estimatedDelivery"] = estimated_delivery
-
-            # Add location information based on status
-            if status == "In transit":
-                tracking_info["currentLocation"] = "Distribution Center"
-            elif status == "Delivered":
-                tracking_info["deliveryLocation"] = "Front Door"
-                
-            # Add additional info for delayed status
-            if status == "Delayed":
-                tracking_info["additionalInfo"] = "Weather delays possible"
-                
-            return tracking_info
-    
     async def close(self):
         """Close the stream properly."""
         if not self.is_active:
@@ -679,14 +560,16 @@ class AudioStreamer:
         debug_print("AudioStreamer PyAudio initialized")
 
         # Initialize separate streams for input and output
-        # Input stream with callback for microphone
+        # Input stream with callback for microphone, feeding a preallocated capture ring
+        input_frames = INPUT_SAMPLE_RATE * INPUT_FRAME_MS // 1000
+        self.capture_ring = CaptureRing(input_frames * 2 * CHANNELS, INPUT_FRAMES_PER_EVENT, loop=self.loop)
         debug_print("Opening input audio stream...")
         self.input_stream = time_it("AudioStreamerOpenAudio", lambda  : self.p.open(
             format=FORMAT,
             channels=CHANNELS,
             rate=INPUT_SAMPLE_RATE,
             input=True,
-            frames_per_buffer=CHUNK_SIZE,
+            frames_per_buffer=input_frames,
             stream_callback=self.input_callback
         ))
         debug_print("input audio stream opened")
@@ -704,23 +587,24 @@ class AudioStreamer:
         debug_print("output audio stream opened")
 
     def input_callback(self, in_data, frame_count, time_info, status):
-        """Callback function that schedules audio processing in the asyncio event loop"""
+        """Callback function that copies captured audio into the capture ring"""
         if self.is_streaming and in_data:
-            # Schedule the task in the event loop
-            asyncio.run_coroutine_threadsafe(
-                self.process_input_audio(in_data), 
-                self.loop
-            )
+            self.capture_ring.write(in_data)
         return (None, pyaudio.paContinue)
 
-    async def process_input_audio(self, audio_data):
-        """Process a single audio chunk directly"""
-        try:
-            # Send audio to Bedrock immediately
-            self.stream_manager.add_audio_chunk(audio_data)
-        except Exception as e:
-            if self.is_streaming:
-                print(f"Error processing input audio: {e}")
+    async def process_input_audio(self):
+        """Send coalesced audio frames from the capture ring to Bedrock"""
+        while self.is_streaming:
+            try:
+                batch = await self.capture_ring.read()
+                # The batch is encoded before returning, so its ring slot can be reused
+                self.stream_manager.add_audio_chunk(batch)
+                self.capture_ring.release(batch)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                if self.is_streaming:
+                    print(f"Error processing input audio: {e}")
     
     async def play_output_audio(self):
         """Play audio responses from Nova Sonic"""
@@ -728,24 +612,21 @@ class AudioStreamer:
             try:
                 # Check for barge-in flag
                 if self.stream_manager.barge_in:
-                    # Clear the audio queue
-                    while not self.stream_manager.audio_output_queue.empty():
-                        try:
-                            self.stream_manager.audio_output_queue.get_nowait()
-                        except asyncio.QueueEmpty:
-                            break
+                    # Clear the audio buffer
+                    self.stream_manager.audio_output_buffer.clear()
                     self.stream_manager.barge_in = False
                     # Small sleep after clearing
                     await asyncio.sleep(0.05)
                     continue
                 
-                # Get audio data from the stream manager's queue
+                # Get audio data from the stream manager's jitter buffer
                 audio_data = await asyncio.wait_for(
-                    self.stream_manager.audio_output_queue.get(),
+                    self.stream_manager.audio_output_buffer.get(),
                     timeout=0.1
                 )
                 
                 if audio_data and self.is_streaming:
+                    self.stream_manager.tracer.mark("playback_start")
                     # Write directly to the output stream in smaller chunks
                     chunk_size = CHUNK_SIZE  # Use the same chunk size as the stream
                     
@@ -795,7 +676,7 @@ class AudioStreamer:
             self.input_stream.start_stream()
         
         # Start processing tasks
-        #self.input_task = asyncio.create_task(self.process_input_audio())
+        self.input_task = asyncio.create_task(self.process_input_audio())
         self.output_task = asyncio.create_task(self.play_output_audio())
         
         # Wait for user to press Enter to stop
@@ -832,17 +713,29 @@ class AudioStreamer:
             self.output_stream.close()
         if self.p:
             self.p.terminate()
+        debug_print(f"Audio output jitter buffer: {self.stream_manager.audio_output_buffer.stats()}")
+        debug_print(f"Audio capture overruns: {self.capture_ring.overruns}")
+        debug_print(f"Tool cache: {self.stream_manager.tool_cache.stats()}")
+        debug_print(f"Tools: {self.stream_manager.tools.stats()}")
         
         await self.stream_manager.close() 
 
+        # Report the per-turn latency collected during the session
+        tracer = self.stream_manager.tracer
+        latency_summary = tracer.close()
+        if tracer.trace_path:
+            print(f"Latency trace written to {tracer.trace_path}")
+            for span, stats in latency_summary.items():
+                print(f"  {span} (ms): {stats}")
+
 
-async def main(debug=False):
+async def main(debug=False, trace_path=None):
     """Main function to run the application."""
     global DEBUG
     DEBUG = debug
 
     # Create stream manager
-    stream_manager = BedrockStreamManager(model_id='amazon.nova-sonic-v1:0', region='us-east-1')
+    stream_manager = BedrockStreamManager(model_id='amazon.nova-sonic-v1:0', region='us-east-1', trace_path=trace_path)
 
     # Create audio streamer
     audio_streamer = AudioStreamer(stream_manager)
@@ -866,6 +759,7 @@ if __name__ == "__main__":
     
     parser = argparse.ArgumentParser(description='Nova Sonic Python Streaming')
     parser.add_argument('--debug', action='store_true', help='Enable debug mode')
+    parser.add_argument('--trace', metavar='FILE', help='Write per-turn latency traces to a JSONL file')
     args = parser.parse_args()
     # Set your AWS credentials here or use environment variables
     # os.environ['AWS_ACCESS_KEY_ID'] = "AWS_ACCESS_KEY_ID"
@@ -874,7 +768,7 @@ if __name__ == "__main__":
 
     # Run the main function
     try:
-        asyncio.run(main(debug=args.debug))
+        asyncio.run(main(debug=args.debug, trace_path=args.trace))
     except Exception as e:
         print(f"Application error: {e}")
         if args.debug:
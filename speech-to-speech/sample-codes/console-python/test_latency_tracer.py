@@ -0,0 +1,58 @@
+"""
+LatencyTracer spans on a scripted clock.
+
+    python -m pytest test_latency_tracer.py
+"""
+import pytest
+
+import latency_tracer
+from latency_tracer import LatencyTracer
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(latency_tracer.time, "perf_counter", lambda: now[0])
+
+    def at(seconds):
+        now[0] = seconds
+    return at
+
+
+def test_tool_before_first_audio_is_not_model_time(clock):
+    tracer = LatencyTracer()
+    clock(0.0); tracer.user_speech_start()
+    clock(1.0); tracer.user_speech_end()
+    clock(1.2); tracer.tool_start("getKbTool", "t1")
+    clock(1.7); tracer.tool_end("t1")
+    clock(2.0); tracer.mark("first_audio")
+    spans = tracer.end_turn()["spansMs"]
+    assert spans["tools"] == 500.0
+    assert spans["model"] == 500.0
+
+
+def test_tool_after_filler_line_is_not_subtracted(clock):
+    tracer = LatencyTracer()
+    clock(0.0); tracer.user_speech_start()
+    clock(1.0); tracer.user_speech_end()
+    clock(1.3); tracer.mark("first_audio")
+    clock(1.5); tracer.tool_start("getKbTool", "t1")
+    clock(3.5); tracer.tool_end("t1")
+    spans = tracer.end_turn()["spansMs"]
+    assert spans["model"] == 300.0
+    assert spans["tools"] == 2000.0
+
+
+def test_concurrent_tools_count_once(clock):
+    tracer = LatencyTracer()
+    clock(0.0); tracer.user_speech_start()
+    clock(1.0); tracer.user_speech_end()
+    clock(1.1); tracer.tool_start("getKbTool", "t1")
+    clock(1.2); tracer.tool_start("trackOrderTool", "t2")
+    clock(1.5); tracer.tool_end("t2")
+    clock(1.6); tracer.tool_end("t1")
+    clock(2.0); tracer.mark("first_audio")
+    record = tracer.end_turn()
+    assert [tool["ms"] for tool in record["tools"]] == [500.0, 300.0]
+    assert record["spansMs"]["tools"] == 500.0
+    assert record["spansMs"]["model"] == 500.0
@@ -0,0 +1,41 @@
+"""
+ToolResultCache keys: free-text fields ignore case and spacing, identifiers do not.
+
+    python -m pytest test_tool_cache.py
+"""
+import asyncio
+
+from tool_cache import ToolCachePolicy, ToolResultCache
+
+
+def test_order_ids_differing_in_case_do_not_collide():
+    cache = ToolResultCache({"trackordertool": ToolCachePolicy(ttl=300)})
+    cache.put("trackordertool", '{"orderId": "ABC123"}', {"status": "Shipped"})
+    assert cache.get("trackordertool", '{"orderId": "abc123"}') == (False, None)
+    assert cache.get("trackordertool", '{ "orderId":"ABC123" }') == (True, {"status": "Shipped"})
+
+
+def test_text_fields_ignore_case_and_spacing():
+    cache = ToolResultCache({"getkbtool": ToolCachePolicy(ttl=300, text_fields={"query"})})
+    cache.put("getkbtool", '{"query": "Refund  Policy", "region": "EU"}', ["passage"])
+    assert cache.get("getkbtool", '{"region": "EU", "query": "refund policy "}') == (True, ["passage"])
+    assert cache.get("getkbtool", '{"query": "refund policy", "region": "eu"}') == (False, None)
+    cache.put("getkbtool", "What is the  Return policy?", ["other"])
+    assert cache.get("getkbtool", "what is the return policy?") == (True, ["other"])
+
+
+def test_call_computes_once_per_key():
+    cache = ToolResultCache({"trackordertool": ToolCachePolicy(ttl=300)})
+    calls = []
+
+    async def track(order_id):
+        calls.append(order_id)
+        return {"orderId": order_id}
+
+    async def run():
+        for order_id in ("ABC123", "ABC123", "abc123"):
+            await cache.call("trackordertool", {"orderId": order_id}, lambda: track(order_id))
+
+    asyncio.run(run())
+    assert calls == ["ABC123", "abc123"]
+    assert cache.stats()["trackordertool"]["hits"] == 1
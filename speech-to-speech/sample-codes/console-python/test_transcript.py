@@ -0,0 +1,67 @@
+"""
+TranscriptAssembler on scripted Nova Sonic text events.
+
+    python -m pytest test_transcript.py
+"""
+import json
+
+from transcript import BARGE_IN_MARKER, TranscriptAssembler
+
+
+def start(assembler, content_id, role, stage):
+    assembler.content_start({
+        "type": "TEXT", "contentId": content_id, "role": role,
+        "additionalModelFields": json.dumps({"generationStage": stage})
+    })
+
+
+def text(assembler, content_id, content):
+    return assembler.text_output({"contentId": content_id, "content": content})
+
+
+def end(assembler, content_id):
+    return assembler.content_end({"contentId": content_id})
+
+
+def test_matching_final_text_produces_nothing():
+    assembler = TranscriptAssembler()
+    start(assembler, "s1", "ASSISTANT", "SPECULATIVE")
+    assert text(assembler, "s1", "Hello there.")[0]["kind"] == "append"
+    end(assembler, "s1")
+    start(assembler, "f1", "ASSISTANT", "FINAL")
+    assert text(assembler, "f1", "Hello there.") == []
+    assert end(assembler, "f1") == []
+    assert assembler.segments == [["ASSISTANT", "Hello there."]]
+
+
+def test_barge_in_during_final_block_revises_to_spoken_part():
+    assembler = TranscriptAssembler()
+    start(assembler, "s1", "ASSISTANT", "SPECULATIVE")
+    text(assembler, "s1", "Hello there, how are you today?")
+    end(assembler, "s1")
+
+    start(assembler, "f1", "ASSISTANT", "FINAL")
+    assert text(assembler, "f1", "Hello there,") == []
+    assert [delta["kind"] for delta in text(assembler, "f1", BARGE_IN_MARKER)] == ["interrupt"]
+    revisions = end(assembler, "f1")
+    assert [(delta["kind"], delta["text"]) for delta in revisions] == [("revise", "Hello there,")]
+    assert assembler.segments == [["ASSISTANT", "Hello there,"]]
+
+
+def test_barge_in_discards_unconfirmed_speculative_text():
+    assembler = TranscriptAssembler()
+    start(assembler, "s1", "ASSISTANT", "SPECULATIVE")
+    text(assembler, "s1", "First sentence.")
+    end(assembler, "s1")
+    start(assembler, "s2", "ASSISTANT", "SPECULATIVE")
+    text(assembler, "s2", "Second sentence.")
+    end(assembler, "s2")
+
+    start(assembler, "f1", "ASSISTANT", "FINAL")
+    text(assembler, "f1", "First sentence.")
+    text(assembler, "f1", BARGE_IN_MARKER)
+    assert end(assembler, "f1") == []
+    # The second speculative segment was never matched and is no longer pending
+    assert assembler.pending == {}
+    start(assembler, "f2", "USER", "FINAL")
+    assert text(assembler, "f2", "Stop")[0]["kind"] == "append"
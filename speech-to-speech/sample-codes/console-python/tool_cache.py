@@ -0,0 +1,125 @@
+import inspect
+import json
+import time
+from collections import OrderedDict
+
+
+class ToolCachePolicy:
+    """Caching policy of a single tool.
+
+    text_fields names the input fields that hold free text, such as a search
+    query. Only those are matched regardless of letter case and spacing;
+    identifiers and every other value must match exactly.
+    """
+
+    def __init__(self, ttl, max_entries=128, text_fields=()):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.text_fields = frozenset(text_fields)
+
+
+class ToolResultCache:
+    """Per-tool LRU cache of tool results with a time-to-live.
+
+    Only tools with a policy are cached. Entries are keyed on the normalized
+    tool input: JSON key order never matters, and letter case and spacing are
+    ignored in the free-text fields named by the tool's policy. Results that
+    carry an "error" key are never cached.
+    """
+
+    def __init__(self, policies=None):
+        self.policies = dict(policies or {})
+        self.entries = {}  # tool -> OrderedDict(key -> (expires, result))
+        self.counters = {}  # tool -> {"hits", "misses", "expired", "evicted"}
+
+    @staticmethod
+    def normalize(content, text_fields=()):
+        """Build a cache key from tool input given as a JSON string, dict or plain text.
+
+        Values of text_fields are case- and spacing-insensitive, and so is input
+        that is plain text rather than JSON when the tool has text fields.
+        """
+        if isinstance(content, str):
+            try:
+                content = json.loads(content)
+            except json.JSONDecodeError:
+                pass
+        if isinstance(content, dict):
+            content = {key: ToolResultCache._fold_text(value) if key in text_fields else value
+                       for key, value in content.items()}
+        elif isinstance(content, str) and text_fields:
+            content = ToolResultCache._fold_text(content)
+        return json.dumps(content, sort_keys=True, separators=(',', ':'))
+
+    @staticmethod
+    def _fold_text(value):
+        if isinstance(value, str):
+            return " ".join(value.split()).casefold()
+        if isinstance(value, list):
+            return [ToolResultCache._fold_text(item) for item in value]
+        return value
+
+    def _count(self, tool, counter):
+        counters = self.counters.setdefault(tool, {"hits": 0, "misses": 0, "expired": 0, "evicted": 0})
+        counters[counter] += 1
+
+    def get(self, tool, content):
+        """Return (True, result) on a cache hit, (False, None) otherwise"""
+        if tool not in self.policies:
+            return False, None
+        entries = self.entries.get(tool)
+        key = self.normalize(content, self.policies[tool].text_fields)
+        entry = entries.get(key) if entries else None
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                entries.move_to_end(key)
+                self._count(tool, "hits")
+                return True, entry[1]
+            del entries[key]
+            self._count(tool, "expired")
+        self._count(tool, "misses")
+        return False, None
+
+    def put(self, tool, content, result):
+        """Store a tool result if the tool has a policy and the result is not an error"""
+        policy = self.policies.get(tool)
+        if policy is None or (isinstance(result, dict) and "error" in result):
+            return
+        entries = self.entries.setdefault(tool, OrderedDict())
+        key = self.normalize(content, policy.text_fields)
+        entries[key] = (time.monotonic() + policy.ttl, result)
+        entries.move_to_end(key)
+        while len(entries) > policy.max_entries:
+            entries.popitem(last=False)
+            self._count(tool, "evicted")
+
+    async def call(self, tool, content, compute):
+        """Return the cached result for this input or compute and cache it.
+
+        compute is called without arguments and may return a result or an awaitable.
+        """
+        hit, result = self.get(tool, content)
+        if hit:
+            return result
+        result = compute()
+        if inspect.isawaitable(result):
+            result = await result
+        self.put(tool, content, result)
+        return result
+
+    def invalidate(self, tool=None):
+        """Drop the cached results of one tool, or of every tool"""
+        if tool is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(tool, None)
+
+    def stats(self):
+        """Return hit/miss counters and hit rate per cached tool"""
+        stats = {}
+        for tool, counters in self.counters.items():
+            lookups = counters["hits"] + counters["misses"]
+            stats[tool] = dict(counters,
+                               entries=len(self.entries.get(tool, ())),
+                               hitRate=round(counters["hits"] / lookups, 3) if lookups else 0.0)
+        return stats
@@ -0,0 +1,107 @@
+import json
+
+BARGE_IN_MARKER = '{ "interrupted" : true }'
+
+
+class TranscriptAssembler:
+    """Turns raw Nova Sonic text events into a de-duplicated transcript.
+
+    Nova Sonic sends assistant text twice: a SPECULATIVE block before the audio
+    is generated and a FINAL block with what was actually spoken. The assembler
+    tracks both per content block and emits only deltas:
+
+    - {"kind": "append", ...} for new text (speculative text, or final text
+      that had no speculative counterpart, such as user transcripts)
+    - {"kind": "revise", ...} when final text differs from the speculative
+      text it confirms, e.g. when a barge-in truncated the response
+    - {"kind": "interrupt", ...} when a barge-in discards the speculative
+      text that has not been confirmed yet
+
+    Final text that matches its speculative block produces nothing. The
+    committed transcript is kept in `segments` as [role, text] pairs.
+    """
+
+    def __init__(self):
+        self.blocks = {}  # contentId -> block state
+        self.pending = {}  # role -> speculative segments awaiting their FINAL block
+        self.segments = []
+        self._stages = {}  # additionalModelFields string -> generation stage
+
+    def _stage(self, additional_fields):
+        """Parse additionalModelFields once per distinct value"""
+        stage = self._stages.get(additional_fields)
+        if stage is None:
+            try:
+                stage = json.loads(additional_fields).get('generationStage', 'FINAL')
+            except (json.JSONDecodeError, AttributeError):
+                stage = 'FINAL'
+            self._stages[additional_fields] = stage
+        return stage
+
+    def _delta(self, kind, block, text):
+        return {"kind": kind, "role": block["role"], "stage": block["stage"], "text": text}
+
+    def content_start(self, content_start):
+        """Register a contentStart event"""
+        if content_start.get('type') != 'TEXT':
+            return
+        additional_fields = content_start.get('additionalModelFields')
+        stage = self._stage(additional_fields) if additional_fields else 'FINAL'
+        self.blocks[content_start.get('contentId')] = {
+            "role": content_start.get('role'),
+            "stage": stage,
+            "text": "",
+            "segment": None,
+            "speculative": None
+        }
+
+    def text_output(self, text_output):
+        """Register a textOutput event and return the transcript deltas it produces"""
+        block = self.blocks.get(text_output.get('contentId'))
+        text = text_output.get('content', '')
+        if block is None or not text:
+            return []
+
+        if BARGE_IN_MARKER in text:
+            # Speculative text that was not confirmed yet will never be spoken. A segment this
+            # block already confirms stays matched, so contentEnd revises it to the spoken part.
+            self.pending.pop(block["role"], None)
+            if block["speculative"] is None:
+                block["speculative"] = False
+            return [self._delta("interrupt", block, "")]
+
+        block["text"] += text
+        if block["stage"] == 'SPECULATIVE':
+            if block["segment"] is None:
+                self.pending.setdefault(block["role"], []).append(self._append(block, text))
+            else:
+                self._append(block, text)
+            return [self._delta("append", block, text)]
+
+        if block["speculative"] is None:
+            queue = self.pending.get(block["role"])
+            block["speculative"] = queue.pop(0) if queue else False
+        if block["speculative"] is False:
+            # Nothing speculative to confirm: this is new text
+            self._append(block, text)
+            return [self._delta("append", block, text)]
+        # Confirming a speculative segment: resolved at contentEnd
+        return []
+
+    def content_end(self, content_end):
+        """Register a contentEnd event and return any revision of speculative text"""
+        block = self.blocks.pop(content_end.get('contentId'), None)
+        if not block or not block["speculative"]:
+            return []
+        segment = block["speculative"]
+        if block["text"] == segment[1]:
+            return []
+        segment[1] = block["text"]
+        return [self._delta("revise", block, block["text"])]
+
+    def _append(self, block, text):
+        if block["segment"] is None:
+            block["segment"] = [block["role"], ""]
+            self.segments.append(block["segment"])
+        block["segment"][1] += text
+        return block["segment"]
@@ -1,12 +1,40 @@
-import json
 import boto3
 import os
+import re
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from botocore.config import Config
 
 KB_ID = os.environ.get('KB_ID')
 KB_REGION = os.environ.get('KB_REGION', 'us-east-1')
-bedrock_agent_runtime = boto3.client('bedrock-agent-runtime', region_name=KB_REGION) 
+KB_NUMBER_OF_RESULTS = int(os.environ.get('KB_NUMBER_OF_RESULTS', '3'))
+# Upper bound on concurrent KB calls across all sessions
+KB_MAX_CONCURRENCY = int(os.environ.get('KB_MAX_CONCURRENCY', '8'))
+# Answer getKbTool with a generated answer streamed back sentence by sentence
+KB_STREAM_ANSWERS = os.environ.get('KB_STREAM_ANSWERS', 'false').lower() == 'true'
+# Seconds a KB call may take, shared by the getkbtool registry entry and the HTTP client
+KB_TIMEOUT = float(os.environ.get('KB_TIMEOUT', '5'))
 
-def retrieve_kb(query):
+# One client for the whole process: its connection pool matches the worker pool,
+# so concurrent lookups reuse warm HTTPS connections instead of opening new ones.
+# The socket timeouts match the registry timeout, so a call the registry has given up
+# on releases its worker thread instead of holding a slot in the pool. Retries are
+# left to the registry, which counts them against the circuit breaker.
+bedrock_agent_runtime = boto3.client(
+    'bedrock-agent-runtime',
+    region_name=KB_REGION,
+    config=Config(
+        max_pool_connections=KB_MAX_CONCURRENCY,
+        connect_timeout=min(2.0, KB_TIMEOUT),
+        read_timeout=KB_TIMEOUT,
+        retries={'max_attempts': 1, 'mode': 'standard'}
+    )
+)
+_executor = ThreadPoolExecutor(max_workers=KB_MAX_CONCURRENCY, thread_name_prefix='kb')
+_inflight = {}  # (query, numberOfResults) -> future shared by identical concurrent lookups
+
+def retrieve_kb(query, number_of_results=KB_NUMBER_OF_RESULTS):
     print(query)
     results = []
     # Call KB
@@ -14,7 +42,7 @@ def retrieve_kb(query):
         knowledgeBaseId=KB_ID,
         retrievalConfiguration={
             'vectorSearchConfiguration': {
-                'numberOfResults': 3,
+                'numberOfResults': number_of_results,
                 'overrideSearchType': 'SEMANTIC',
             }
         },
@@ -27,9 +55,23 @@ def retrieve_kb(query):
             results.append(r["content"]["text"])
     return results
 
-def retrieve_and_generation(query):
-    results = []
-    custom_prompt = """
+async def retrieve_kb_async(query, number_of_results=KB_NUMBER_OF_RESULTS):
+    """Retrieve from the KB without blocking the event loop.
+
+    Lookups run on a bounded worker pool, and identical queries that are
+    already in flight share a single call.
+    """
+    key = (query, number_of_results)
+    future = _inflight.get(key)
+    if future is None:
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(_executor, retrieve_kb, query, number_of_results)
+        _inflight[key] = future
+        future.add_done_callback(lambda _: _inflight.pop(key, None))
+    # Shield the shared call so one cancelled caller does not cancel it for the others
+    return await asyncio.shield(future)
+
+RAG_PROMPT_TEMPLATE = """
       You are a question answering agent. I will provide you with a set of search results.
       The user will provide you with a question. Your job is to answer the user's question using only information from the search results. 
       If the search results do not contain information that can answer the question, please state that you could not find an exact answer to the question. 
@@ -40,11 +82,12 @@ def retrieve_and_generation(query):
 
       $output_format_instructions$
       """
-    response = bedrock_agent_runtime.retrieve_and_generate(
-            input={
-                'text': query
-            },
-        retrieveAndGenerateConfiguration={
+
+# Sentence boundary used to release streamed answers one sentence at a time
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+def _retrieve_and_generate_configuration():
+    return {
         'type': 'KNOWLEDGE_BASE',
         'knowledgeBaseConfiguration': {
             'knowledgeBaseId': KB_ID,
@@ -56,13 +99,87 @@ def retrieve_and_generation(query):
                 },
                 'generationConfiguration': {
                         'promptTemplate': {
-                            'textPromptTemplate': custom_prompt
+                            'textPromptTemplate': RAG_PROMPT_TEMPLATE
                         }
                     }
             }
         }
+
+def retrieve_and_generation(query):
+    results = []
+    response = bedrock_agent_runtime.retrieve_and_generate(
+            input={
+                'text': query
+            },
+        retrieveAndGenerateConfiguration=_retrieve_and_generate_configuration()
     )
     if "citations" in response:
         for r in response["citations"]:
             results.append(r["generatedResponsePart"]["textResponsePart"]["text"])
-    return results
\ No newline at end of file
+    return results
+
+def retrieve_and_generate_stream(query, stop=None):
+    """Yield the generated answer sentence by sentence as the stream produces it.
+
+    Setting the optional stop event ends the generator at the next event and
+    closes the response stream, releasing its connection.
+    """
+    response = bedrock_agent_runtime.retrieve_and_generate_stream(
+        input={
+            'text': query
+        },
+        retrieveAndGenerateConfiguration=_retrieve_and_generate_configuration()
+    )
+    stream = response["stream"]
+    pending = ""
+    try:
+        for event in stream:
+            if stop is not None and stop.is_set():
+                return
+            if "output" not in event:
+                # Citation and guardrail events carry no new answer text
+                continue
+            pending += event["output"]["text"]
+            *sentences, pending = SENTENCE_END.split(pending)
+            for sentence in sentences:
+                yield sentence
+        if pending.strip():
+            yield pending.strip()
+    finally:
+        stream.close()
+
+async def retrieve_and_generate_stream_async(query):
+    """Async version of retrieve_and_generate_stream that runs the stream on the worker pool.
+
+    When the consumer stops early (a timeout, the circuit breaker or a closed
+    session), the worker stops reading the Bedrock stream and closes it.
+    """
+    loop = asyncio.get_running_loop()
+    parts = asyncio.Queue()
+    finished = object()
+    stop = threading.Event()
+
+    def put(part):
+        if not stop.is_set():
+            loop.call_soon_threadsafe(parts.put_nowait, part)
+
+    def produce():
+        try:
+            for sentence in retrieve_and_generate_stream(query, stop):
+                put(sentence)
+        except Exception as ex:
+            put(ex)
+        finally:
+            put(finished)
+
+    loop.run_in_executor(_executor, produce)
+    try:
+        while True:
+            part = await parts.get()
+            if part is finished:
+                return
+            if isinstance(part, Exception):
+                raise part
+            yield part
+    finally:
+        stop.set()
@@ -0,0 +1,122 @@
+import asyncio
+import time
+from collections import deque
+
+
+class JitterBuffer:
+    """Adaptive playout buffer for Nova Sonic audio output.
+
+    Chunks are held until the buffered audio covers the target playout delay
+    (or the oldest chunk has waited that long) and are then released in order.
+    Each arrival is compared with the playout schedule: a chunk that arrives
+    after the previously released audio has finished playing is an underrun,
+    and its lateness feeds a smoothed jitter estimate. The target delay grows
+    with that estimate and shrinks again as arrivals are back on time.
+
+    With realtime=True the buffer also paces releases so the consumer is never
+    more than the target delay ahead of real time, which makes it usable in
+    front of a sink that does not block, such as a WebSocket.
+    """
+
+    def __init__(self, bytes_per_second, target_delay=0.12, min_delay=0.04, max_delay=0.5,
+                 jitter_multiplier=3.0, talkspurt_gap=1.0, realtime=False):
+        self.bytes_per_second = bytes_per_second
+        self.base_delay = target_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.jitter_multiplier = jitter_multiplier
+        # Gaps longer than this start a new talkspurt instead of counting as an underrun
+        self.talkspurt_gap = talkspurt_gap
+        self.realtime = realtime
+
+        self.chunks = deque()  # (arrival time, duration, chunk)
+        self.buffered_duration = 0.0
+        self.buffering = True
+        self.playout_end = 0.0
+        self.jitter = 0.0
+        self.underruns = 0
+        self._arrival = asyncio.Event()
+
+    @property
+    def target_delay(self):
+        """Current playout delay in seconds"""
+        delay = self.base_delay + self.jitter_multiplier * self.jitter
+        return min(max(delay, self.min_delay), self.max_delay)
+
+    def put(self, chunk, duration=None):
+        """Add a chunk; duration defaults to the length of raw PCM audio"""
+        now = time.monotonic()
+        if duration is None:
+            duration = len(chunk) / self.bytes_per_second
+
+        if duration > 0 and not self.buffering:
+            lateness = now - self.playout_end
+            if lateness > self.talkspurt_gap:
+                # Previous response finished long ago: rebuffer without penalty
+                self.buffering = True
+            elif lateness > 0 and not self.chunks:
+                self.underruns += 1
+                self.buffering = True
+                self._update_jitter(lateness)
+            else:
+                self._update_jitter(0.0)
+
+        self.chunks.append((now, duration, chunk))
+        self.buffered_duration += duration
+        self._arrival.set()
+
+    def _update_jitter(self, sample):
+        # Exponential smoothing with the RFC 3550 gain of 1/16
+        self.jitter += (sample - self.jitter) / 16
+
+    def _release_wait(self, now):
+        """Seconds until the head chunk may be released, or 0 if it can go now"""
+        arrival, duration, _ = self.chunks[0]
+        if duration == 0:
+            # Non-audio items at the head never wait
+            return 0.0
+        target = self.target_delay
+        if self.buffering:
+            if self.buffered_duration >= target:
+                return 0.0
+            return max(0.0, arrival + target - now)
+        if self.realtime:
+            return max(0.0, self.playout_end - target - now)
+        return 0.0
+
+    async def get(self):
+        """Wait for the next chunk to play, honouring the playout delay"""
+        while True:
+            now = time.monotonic()
+            wait = self._release_wait(now) if self.chunks else None
+            if wait == 0.0:
+                _, duration, chunk = self.chunks.popleft()
+                self.buffered_duration -= duration
+                if duration > 0:
+                    if self.buffering:
+                        self.buffering = False
+                        self.playout_end = now
+                    self.playout_end = max(self.playout_end, now) + duration
+                return chunk
+
+            self._arrival.clear()
+            try:
+                await asyncio.wait_for(self._arrival.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def clear(self):
+        """Drop buffered audio (e.g. on barge-in), keeping non-audio items in order"""
+        self.chunks = deque(item for item in self.chunks if item[1] == 0)
+        self.buffered_duration = 0.0
+        self.buffering = True
+        self.playout_end = time.monotonic()
+
+    def stats(self):
+        """Return buffer statistics"""
+        return {
+            "targetDelayMs": round(self.target_delay * 1000, 1),
+            "jitterMs": round(self.jitter * 1000, 1),
+            "bufferedMs": round(max(self.buffered_duration, 0.0) * 1000, 1),
+            "underruns": self.underruns
+        }
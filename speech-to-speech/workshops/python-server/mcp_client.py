@@ -1,66 +1,203 @@
 import asyncio
 import json
-from contextlib import AsyncExitStack
 from typing import Any, Dict, List, Optional
 import os
 
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
 
-class McpLocationClient:
-    def __init__(self):
-        # Initialize session and client objects
+# Number of MCP server processes shared by all sessions
+MCP_POOL_SIZE = int(os.getenv("MCP_POOL_SIZE", "2"))
+# Seconds between health checks of the pooled servers
+MCP_HEALTH_CHECK_INTERVAL = float(os.getenv("MCP_HEALTH_CHECK_INTERVAL", "30"))
+MCP_START_TIMEOUT = 120
+MCP_PING_TIMEOUT = 5
+
+
+class McpConnection:
+    """A single MCP server process and its client session.
+
+    The stdio transport and session are entered and exited by a dedicated
+    task, so a connection can be restarted by the health check without
+    touching the task that created the pool.
+    """
+
+    def __init__(self, server_params: StdioServerParameters, index: int):
+        self.server_params = server_params
+        self.index = index
         self.session: Optional[ClientSession] = None
-        self.exit_stack = AsyncExitStack()
-        self.stdio: Optional[Any] = None
-        self.write: Optional[Any] = None
+        self.error: Optional[BaseException] = None
+        self.task: Optional[asyncio.Task] = None
+        self.ready = asyncio.Event()
+        self.stopping = asyncio.Event()
 
-    async def connect_to_server(self):
+    @property
+    def healthy(self) -> bool:
+        return self.session is not None
+
+    async def start(self):
+        self.task = asyncio.create_task(self._run())
+        await asyncio.wait_for(self.ready.wait(), timeout=MCP_START_TIMEOUT)
+        if self.error:
+            raise self.error
+
+    async def _run(self):
+        try:
+            async with stdio_client(self.server_params) as (read, write):
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+                    self.session = session
+                    self.ready.set()
+                    await self.stopping.wait()
+        except Exception as ex:
+            self.error = ex
+        finally:
+            self.session = None
+            self.ready.set()
+
+    def mark_unhealthy(self):
+        """Take the connection out of rotation until it is restarted"""
+        self.session = None
+
+    async def ping(self) -> bool:
+        """Return True if the server answers a ping in time"""
+        if not self.session:
+            return False
+        try:
+            await asyncio.wait_for(self.session.send_ping(), timeout=MCP_PING_TIMEOUT)
+            return True
+        except Exception:
+            return False
+
+    async def close(self):
+        self.stopping.set()
+        if self.task:
+            try:
+                await asyncio.wait_for(self.task, timeout=MCP_PING_TIMEOUT)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                pass
+
+
+class McpLocationClient:
+    """Pool of AWS Location MCP servers shared by all WebSocket sessions.
+
+    Concurrent call_tool requests are dispatched round-robin over the healthy
+    servers, the tool catalogue is fetched once, and a background health check
+    restarts servers that stop answering.
+    """
+
+    def __init__(self, pool_size: int = MCP_POOL_SIZE, health_check_interval: float = MCP_HEALTH_CHECK_INTERVAL):
+        self.pool_size = max(1, pool_size)
+        self.health_check_interval = health_check_interval
+        self.connections: List[McpConnection] = []
+        self.next_index = 0
+        self.tools: Optional[List[Dict[str, Any]]] = None
+        self.health_task: Optional[asyncio.Task] = None
+        self.restarts: Dict[int, asyncio.Task] = {}  # pool slot -> restart in progress
+
+    def _server_params(self) -> StdioServerParameters:
         aws_profile = os.getenv("AWS_PROFILE")
         env = {"FASTMCP_LOG_LEVEL": "ERROR"}
         if aws_profile:
             env["AWS_PROFILE"] = aws_profile
-            
-        server_params = StdioServerParameters(
+
+        return StdioServerParameters(
                 command="uvx",
                 args=["awslabs.aws-location-mcp-server@latest"],
                 env=env
             )
-        
-        # Connect to the server
-        stdio_transport = await self.exit_stack.enter_async_context(
-            stdio_client(server_params)
-        )
-        self.stdio, self.write = stdio_transport
-        self.session = await self.exit_stack.enter_async_context(
-            ClientSession(self.stdio, self.write)
-        )
-
-        # Initialize the connection
-        await self.session.initialize()
+
+    async def _start_connection(self, index: int) -> McpConnection:
+        connection = McpConnection(self._server_params(), index)
+        try:
+            await connection.start()
+        except Exception as ex:
+            print(f"Failed to start MCP server {index}: {ex}")
+            await connection.close()
+        return connection
+
+    async def connect_to_server(self):
+        # Start the pooled servers side by side
+        self.connections = list(await asyncio.gather(
+            *(self._start_connection(index) for index in range(self.pool_size))
+        ))
+        if not any(connection.healthy for connection in self.connections):
+            raise RuntimeError("No MCP server could be started")
+        self.health_task = asyncio.create_task(self._health_check())
+
+    async def _restart(self, connection: McpConnection):
+        await connection.close()
+        self.connections[connection.index] = await self._start_connection(connection.index)
+
+    def _restart_soon(self, connection: McpConnection) -> asyncio.Task:
+        """Restart a server in the background, at most one restart per pool slot at a time"""
+        task = self.restarts.get(connection.index)
+        if task is None:
+            task = asyncio.create_task(self._restart(connection))
+            self.restarts[connection.index] = task
+            task.add_done_callback(lambda _: self.restarts.pop(connection.index, None))
+        return task
+
+    async def _health_check(self):
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            for connection in list(self.connections):
+                if not await connection.ping():
+                    print(f"MCP server {connection.index} is not responding, restarting it")
+                    await asyncio.shield(self._restart_soon(connection))
+
+    def _next_connection(self, exclude: Optional[McpConnection] = None) -> McpConnection:
+        """Pick the next healthy server round-robin"""
+        for _ in range(len(self.connections)):
+            connection = self.connections[self.next_index % len(self.connections)]
+            self.next_index += 1
+            if connection.healthy and connection is not exclude:
+                return connection
+        raise RuntimeError("No healthy MCP server available")
 
     async def get_mcp_tools(self) -> List[Dict[str, Any]]:
-        tools_result = await self.session.list_tools()
-        return [
-            {
-                "type": "function",
-                "function": {
-                    "name": tool.name,
-                    "description": tool.description,
-                    "parameters": tool.inputSchema,
-                },
-            }
-            for tool in tools_result.tools
-        ]
+        if self.tools is None:
+            tools_result = await self._next_connection().session.list_tools()
+            self.tools = [
+                {
+                    "type": "function",
+                    "function": {
+                        "name": tool.name,
+                        "description": tool.description,
+                        "parameters": tool.inputSchema,
+                    },
+                }
+                for tool in tools_result.tools
+            ]
+        return self.tools
 
     async def call_tool(self, input):
         if isinstance(input, str):
             input = json.loads(input)
-        
+
         tool_name = input.get("tool", "search_places")
         query = input.get("query", input)
 
-        response = await self.session.call_tool(tool_name, {"query":query})
+        connection = self._next_connection()
+        try:
+            response = await connection.session.call_tool(tool_name, {"query":query})
+        except Exception as ex:
+            # The server may have died since the last health check: if it no longer answers
+            # pings, take it out of rotation and restart it, then retry once on another server
+            print(f"MCP server {connection.index} failed: {ex}")
+            restart = None
+            if not await connection.ping():
+                connection.mark_unhealthy()
+                restart = self._restart_soon(connection)
+            try:
+                retry_connection = self._next_connection(exclude=connection)
+            except RuntimeError:
+                if restart is None:
+                    raise ex
+                # No other healthy server: wait for this one to come back
+                await asyncio.shield(restart)
+                retry_connection = self._next_connection()
+            response = await retry_connection.session.call_tool(tool_name, {"query":query})
         result = []
         for c in response.content:
             result.append(c.text)
@@ -68,4 +205,10 @@ class McpLocationClient:
 
     async def cleanup(self):
         """Clean up resources."""
-        await self.exit_stack.aclose()
+        if self.health_task:
+            self.health_task.cancel()
+            self.health_task = None
+        for task in list(self.restarts.values()):
+            task.cancel()
+        await asyncio.gather(*(connection.close() for connection in self.connections))
+        self.connections = []
@@ -1,10 +1,12 @@
 import asyncio
 import json
-import base64
 import warnings
 import uuid
 from s2s_events import S2sEvent
 import bedrock_knowledge_bases as kb
+from tool_cache import ToolResultCache, ToolCachePolicy
+from tool_prefetch import ToolPrefetcher
+from tool_registry import ToolRegistry
 import time
 from aws_sdk_bedrock_runtime.client import BedrockRuntimeClient, InvokeModelWithBidirectionalStreamOperationInput
 from aws_sdk_bedrock_runtime.models import InvokeModelWithBidirectionalStreamInputChunk, BidirectionalInputPayloadPart
@@ -22,11 +24,16 @@ def debug_print(message):
     if DEBUG:
         print(message)
 
+# Tool results shared by all sessions, keyed on the normalized tool input
+TOOL_CACHE = ToolResultCache({
+    "getkbtool": ToolCachePolicy(ttl=300, max_entries=256, text_fields={"query"})
+})
+
 
 class S2sSessionManager:
     """Manages bidirectional streaming with AWS Bedrock using asyncio"""
     
-    def __init__(self, model_id='amazon.nova-sonic-v1:0', region='us-east-1', mcp_client=None, strands_agent=None):
+    def __init__(self, model_id='amazon.nova-sonic-v1:0', region='us-east-1', mcp_client=None, strands_agent=None, prefetch=False):
         """Initialize the stream manager."""
         self.model_id = model_id
         self.region = region
@@ -44,12 +51,25 @@ class S2sSessionManager:
         self.prompt_name = None  # Will be set from frontend
         self.content_name = None  # Will be set from frontend
         self.audio_content_name = None  # Will be set from frontend
-        self.toolUseContent = ""
-        self.toolUseId = ""
-        self.toolName = ""
+        self.pending_tools = {}  # contentId of a toolUse -> toolUse event waiting for its contentEnd
+        self.tool_tasks = set()
+        self.tool_send_lock = asyncio.Lock()  # Serializes tool result sends; held per event while streaming
         self.mcp_loc_client = mcp_client
         self.strands_agent = strands_agent
 
+        # Optionally start likely KB and location lookups from the user's transcript.
+        # Prefetches bypass the shared result cache, so unused predictions leave nothing
+        # behind, and are skipped while the tool's circuit breaker is not closed.
+        self.prefetcher = None
+        if prefetch:
+            fetchers = {
+                "getkbtool": lambda text: None if TOOL_REGISTRY.circuit_open("getkbtool") else kb.retrieve_kb_async(text)
+            }
+            if mcp_client:
+                fetchers["locationmcptool"] = lambda text: (None if TOOL_REGISTRY.circuit_open("locationmcptool")
+                                                            else mcp_client.call_tool({"query": text}))
+            self.prefetcher = ToolPrefetcher(fetchers)
+
     def _initialize_client(self):
         """Initialize the Bedrock client."""
         config = Config(
@@ -176,35 +196,27 @@ class S2sSessionManager:
                         
                         # Handle tool use detection
                         if event_name == 'toolUse':
-                            self.toolUseContent = json_data['event']['toolUse']
-                            self.toolName = json_data['event']['toolUse']['toolName']
-                            self.toolUseId = json_data['event']['toolUse']['toolUseId']
-                            debug_print(f"Tool use detected: {self.toolName}, ID: {self.toolUseId}, "+ json.dumps(json_data['event']))
+                            toolUse = json_data['event']['toolUse']
+                            self.pending_tools[toolUse.get('contentId')] = toolUse
+                            debug_print(f"Tool use detected: {toolUse['toolName']}, ID: {toolUse['toolUseId']}, "+ json.dumps(json_data['event']))
 
                         # Process tool use when content ends
                         elif event_name == 'contentEnd' and json_data['event'][event_name].get('type') == 'TOOL':
-                            prompt_name = json_data['event']['contentEnd'].get("promptName")
-                            debug_print("Processing tool use and sending result")
-                            toolResult = await self.processToolUse(self.toolName, self.toolUseContent)
-                                
-                            # Send tool start event
-                            toolContent = str(uuid.uuid4())
-                            tool_start_event = S2sEvent.content_start_tool(prompt_name, toolContent, self.toolUseId)
-                            await self.send_raw_event(tool_start_event)
-                            
-                            # Send tool result event
-                            if isinstance(toolResult, dict):
-                                content_json_string = json.dumps(toolResult)
-                            else:
-                                content_json_string = toolResult
-
-                            tool_result_event = S2sEvent.text_input_tool(prompt_name, toolContent, content_json_string)
-                            print("Tool result", tool_result_event)
-                            await self.send_raw_event(tool_result_event)
-
-                            # Send tool content end event
-                            tool_content_end_event = S2sEvent.content_end(prompt_name, toolContent)
-                            await self.send_raw_event(tool_content_end_event)
+                            content_end = json_data['event']['contentEnd']
+                            toolUse = self.pending_tools.pop(content_end.get('contentId'), None)
+                            if toolUse is None and self.pending_tools:
+                                # No contentId to match on: take the oldest pending tool use
+                                toolUse = self.pending_tools.pop(next(iter(self.pending_tools)))
+                            if toolUse:
+                                # Run each tool in its own task so independent tools overlap
+                                # and each result is sent as soon as it is ready
+                                task = asyncio.create_task(self.runTool(content_end.get("promptName"), toolUse))
+                                self.tool_tasks.add(task)
+                                task.add_done_callback(self.tool_tasks.discard)
+
+                        # Predict tool calls from what the user said
+                        elif event_name == 'textOutput' and self.prefetcher and json_data['event']['textOutput'].get('role') == 'USER':
+                            self.prefetcher.observe(json_data['event']['textOutput'].get('content', ''))
                     
                     # Put the response in the output queue for forwarding to the frontend
                     await self.output_queue.put(json_data)
@@ -228,6 +240,41 @@ class S2sSessionManager:
         self.is_active = False
         self.close()
 
+    async def runTool(self, prompt_name, toolUse):
+        """Execute a tool and send its result back to Bedrock"""
+        toolName, toolUseId = toolUse['toolName'], toolUse['toolUseId']
+        debug_print(f"Processing tool use {toolName}, ID: {toolUseId} and sending result")
+        try:
+            if toolName.lower() == "getkbtool" and kb.KB_STREAM_ANSWERS:
+                await self.streamKbAnswer(prompt_name, toolUseId, toolUse)
+                return
+
+            toolResult = await self.processToolUse(toolName, toolUse)
+
+            # Send tool result event
+            if isinstance(toolResult, dict):
+                content_json_string = json.dumps(toolResult)
+            else:
+                content_json_string = toolResult
+
+            toolContent = str(uuid.uuid4())
+            async with self.tool_send_lock:
+                # Send tool start event
+                tool_start_event = S2sEvent.content_start_tool(prompt_name, toolContent, toolUseId)
+                await self.send_raw_event(tool_start_event)
+
+                tool_result_event = S2sEvent.text_input_tool(prompt_name, toolContent, content_json_string)
+                print("Tool result", tool_result_event)
+                await self.send_raw_event(tool_result_event)
+
+                # Send tool content end event
+                tool_content_end_event = S2sEvent.content_end(prompt_name, toolContent)
+                await self.send_raw_event(tool_content_end_event)
+        except asyncio.CancelledError:
+            raise
+        except Exception as ex:
+            print(f"Error processing tool use {toolUseId}: {ex}")
+
     async def processToolUse(self, toolName, toolUseContent):
         """Return the tool result"""
         print(f"Tool Use Content: {toolUseContent}")
@@ -241,23 +288,12 @@ class S2sSessionManager:
                 content = toolUseContent.get("content")  # Pass the JSON string directly to the agent
                 print(f"Extracted query: {content}")
             
-            # Handle built-in tools directly
-            if toolName == "getkbtool":
-                if not content:
-                    content = "amazon community policy"
-                result = kb.retrieve_kb(content)
-                
-            if toolName == "getdatetool":
-                from datetime import datetime, timezone
-                result = datetime.now(timezone.utc).strftime('%A, %Y-%m-%d %H-%M-%S')
-                                
-            if toolName == "locationmcptool":
-                if self.mcp_loc_client:
-                    result = await self.mcp_loc_client.call_tool(content)
-            
-            if toolName == "externalagent":
-                if self.strands_agent:
-                    result = self.strands_agent.query(content)
+            name = toolName
+            if name not in TOOL_REGISTRY and self.strands_agent and self.strands_agent.resolve_tool(toolName, content):
+                # Sonic already picked a concrete agent tool: skip the agent's reasoning
+                name = "strandstool"
+            if name in TOOL_REGISTRY:
+                result = await TOOL_REGISTRY.invoke(name, self, toolName, content)
 
             if not result:
                 result = "no result found"
@@ -267,6 +303,89 @@ class S2sSessionManager:
             print(ex)
             return {"result": "An error occurred while attempting to retrieve information related to the toolUse event."}
     
+    async def getKbTool(self, toolName, content):
+        """Retrieve passages from the knowledge base"""
+        if not content:
+            content = "amazon community policy"
+        return await self.lookup(toolName, content, lambda: TOOL_CACHE.call(toolName, content, lambda: kb.retrieve_kb_async(content)))
+
+    async def getDateTool(self, toolName, content):
+        """Return the current UTC date and time"""
+        from datetime import datetime, timezone
+        return datetime.now(timezone.utc).strftime('%A, %Y-%m-%d %H-%M-%S')
+
+    async def locationMcpTool(self, toolName, content):
+        """Call the location MCP server"""
+        if self.mcp_loc_client:
+            return await self.lookup(toolName, content, lambda: self.mcp_loc_client.call_tool(content))
+
+    async def externalAgent(self, toolName, content):
+        """Ask the Strands agent, or call its tool directly when the input names one"""
+        if self.strands_agent:
+            direct_tool = self.strands_agent.resolve_tool(toolName, content)
+            if direct_tool:
+                return await self.strands_agent.call_tool_async(direct_tool, content)
+            return await self.strands_agent.query_async(content)
+
+    async def strandsTool(self, toolName, content):
+        """Call a Strands agent tool named by Sonic's toolUse"""
+        direct_tool = self.strands_agent.resolve_tool(toolName, content)
+        return await self.strands_agent.call_tool_async(direct_tool, content)
+
+    async def lookup(self, toolName, content, fetch):
+        """Return the prefetched result of this tool call if there is one, otherwise fetch it"""
+        if self.prefetcher:
+            hit, result = await self.prefetcher.take(toolName, content)
+            if hit:
+                debug_print(f"Using prefetched result for {toolName}")
+                return result
+        return await fetch()
+
+    async def streamKbAnswer(self, prompt_name, toolUseId, toolUseContent):
+        """Send a generated KB answer as the tool result, one sentence per toolResult event as it is generated.
+
+        The getkbtool registry entry still applies: its circuit breaker is
+        honoured, and each sentence must arrive within its timeout. A stalled
+        or failed stream ends the result with the declared fallback text.
+        """
+        query = toolUseContent.get("content") or "amazon community policy"
+        spec = TOOL_REGISTRY.tools["getkbtool"]
+        toolContent = str(uuid.uuid4())
+        # The lock is taken per event, not across the generation, so other tool results are not held up
+        await self.send_tool_event(S2sEvent.content_start_tool(prompt_name, toolContent, toolUseId))
+
+        sent, completed = False, False
+        if TOOL_REGISTRY.allow("getkbtool"):
+            start, timed_out = time.perf_counter(), False
+            stream = kb.retrieve_and_generate_stream_async(query)
+            try:
+                while True:
+                    sentence = await asyncio.wait_for(stream.__anext__(), timeout=spec.timeout)
+                    await self.send_tool_event(S2sEvent.text_input_tool(prompt_name, toolContent, sentence if not sent else " " + sentence))
+                    sent = True
+            except StopAsyncIteration:
+                completed = True
+            except asyncio.TimeoutError:
+                timed_out = True
+                print(f"Tool getkbtool stream stalled for {spec.timeout}s")
+            except Exception as ex:
+                print(f"Tool getkbtool failed: {ex}")
+            finally:
+                await stream.aclose()
+            TOOL_REGISTRY.record("getkbtool", completed, (time.perf_counter() - start) * 1000, timed_out)
+
+        if not completed:
+            await self.send_tool_event(S2sEvent.text_input_tool(prompt_name, toolContent, spec.fallback if not sent else " " + spec.fallback))
+        elif not sent:
+            await self.send_tool_event(S2sEvent.text_input_tool(prompt_name, toolContent, "no result found"))
+
+        await self.send_tool_event(S2sEvent.content_end(prompt_name, toolContent))
+
+    async def send_tool_event(self, event):
+        """Send one event of a streamed tool result"""
+        async with self.tool_send_lock:
+            await self.send_raw_event(event)
+
     async def close(self):
         """Close the stream properly."""
         if not self.is_active:
@@ -283,4 +402,26 @@ class S2sSessionManager:
                 await self.response_task
             except asyncio.CancelledError:
                 pass
-        
\ No newline at end of file
+
+        for task in list(self.tool_tasks):
+            task.cancel()
+        self.pending_tools.clear()
+        debug_print(f"Tool cache: {TOOL_CACHE.stats()}")
+        debug_print(f"Tools: {TOOL_REGISTRY.stats()}")
+        if self.prefetcher:
+            debug_print(f"Tool prefetch: {self.prefetcher.stats()}")
+        
+
+
+# Tools shared by all sessions: timeouts, retries and fallback responses are
+# declared per tool, and circuit breakers and latency histograms span sessions
+TOOL_REGISTRY = ToolRegistry()
+TOOL_REGISTRY.register("getkbtool", S2sSessionManager.getKbTool, timeout=kb.KB_TIMEOUT, retries=1,
+                       fallback="The knowledge base is not available right now.")
+TOOL_REGISTRY.register("getdatetool", S2sSessionManager.getDateTool, timeout=1.0)
+TOOL_REGISTRY.register("locationmcptool", S2sSessionManager.locationMcpTool, timeout=8.0, retries=1,
+                       fallback="The location service is not available right now.")
+TOOL_REGISTRY.register("externalagent", S2sSessionManager.externalAgent, timeout=25.0,
+                       fallback="The agent could not answer in time.")
+TOOL_REGISTRY.register("strandstool", S2sSessionManager.strandsTool, timeout=10.0, retries=1,
+                       fallback="The location service is not available right now.")
@@ -11,6 +11,7 @@ import os
 from http import HTTPStatus
 from mcp_client import McpLocationClient
 from strands_agent import StrandsAgent
+from jitter_buffer import JitterBuffer
 
 # Configure logging
 LOGLEVEL = os.environ.get("LOGLEVEL", "INFO").upper()
@@ -30,6 +31,12 @@ def debug_print(message):
 MCP_CLIENT = None
 STRANDS_AGENT = None
 
+# Optional server-side pacing of audioOutput events, set with AUDIO_PLAYOUT_DELAY_MS
+AUDIO_PLAYOUT_DELAY = None
+AUDIO_OUTPUT_BYTES_PER_SECOND = 24000 * 2  # 24kHz, 16-bit mono
+# Prefetch likely tool results from user transcripts
+TOOL_PREFETCH = False
+
 class HealthCheckHandler(http.server.BaseHTTPRequestHandler):
     def do_GET(self):
         client_ip = self.client_address[0]
@@ -109,7 +116,7 @@ async def websocket_handler(websocket):
 
                         """Handle WebSocket connections from the frontend."""
                         # Create a new stream manager for this connection
-                        stream_manager = S2sSessionManager(model_id='amazon.nova-sonic-v1:0', region='us-east-1', mcp_client=MCP_CLIENT, strands_agent=STRANDS_AGENT)
+                        stream_manager = S2sSessionManager(model_id='amazon.nova-sonic-v1:0', region='us-east-1', mcp_client=MCP_CLIENT, strands_agent=STRANDS_AGENT, prefetch=TOOL_PREFETCH)
                         
                         # Initialize the Bedrock stream
                         await stream_manager.initialize_stream()
@@ -157,16 +164,37 @@ async def websocket_handler(websocket):
         forward_task.cancel()
         if websocket:
             websocket.close()
-        if MCP_CLIENT:
-            MCP_CLIENT.cleanup()
+
+
+async def pace_responses(stream_manager, pacer):
+    """Feed Bedrock responses into the jitter buffer, timing audio by its duration."""
+    while True:
+        response = await stream_manager.output_queue.get()
+        event = response.get("event", {})
+        if "audioOutput" in event:
+            # base64 expands 3 bytes into 4 characters
+            audio_bytes = len(event["audioOutput"]["content"]) * 3 // 4
+            pacer.put(response, duration=audio_bytes / AUDIO_OUTPUT_BYTES_PER_SECOND)
+        else:
+            # Drop audio queued for the client when the user barges in
+            if "textOutput" in event and '{ "interrupted" : true }' in event["textOutput"].get("content", ""):
+                pacer.clear()
+            pacer.put(response, duration=0)
 
 
 async def forward_responses(websocket, stream_manager):
     """Forward responses from Bedrock to the WebSocket."""
+    pacer, pace_task = None, None
+    if AUDIO_PLAYOUT_DELAY:
+        pacer = JitterBuffer(AUDIO_OUTPUT_BYTES_PER_SECOND, target_delay=AUDIO_PLAYOUT_DELAY, realtime=True)
+        pace_task = asyncio.create_task(pace_responses(stream_manager, pacer))
     try:
         while True:
-            # Get next response from the output queue
-            response = await stream_manager.output_queue.get()
+            # Get next response from the output queue, paced by the jitter buffer if enabled
+            if pacer:
+                response = await pacer.get()
+            else:
+                response = await stream_manager.output_queue.get()
             
             # Send to WebSocket
             try:
@@ -182,6 +210,10 @@ async def forward_responses(websocket, stream_manager):
         # Close connection
         websocket.close()
         stream_manager.close()
+    finally:
+        if pace_task:
+            pace_task.cancel()
+            debug_print(f"Audio output jitter buffer: {pacer.stats()}")
 
 
 async def main(host, port, health_port, enable_mcp=False, enable_strands_agent=False):
@@ -221,6 +253,10 @@ async def main(host, port, health_port, enable_mcp=False, enable_strands_agent=F
             await asyncio.Future()
     except Exception as ex:
         print("Failed to start websocket service",ex)
+    finally:
+        # The MCP server pool is shared by all connections: stop it with the server
+        if MCP_CLIENT:
+            await MCP_CLIENT.cleanup()
 
 if __name__ == "__main__":
     import argparse
@@ -237,6 +273,9 @@ if __name__ == "__main__":
         port = int(os.getenv("WS_PORT"))
     if os.getenv("HEALTH_PORT"):
         health_port = int(os.getenv("HEALTH_PORT"))
+    if os.getenv("AUDIO_PLAYOUT_DELAY_MS"):
+        AUDIO_PLAYOUT_DELAY = int(os.getenv("AUDIO_PLAYOUT_DELAY_MS")) / 1000
+    TOOL_PREFETCH = os.getenv("TOOL_PREFETCH", "false").lower() == "true"
 
     enable_mcp = args.agent == "mcp"
     enable_strands = args.agent == "strands"
@@ -252,7 +291,4 @@ if __name__ == "__main__":
             print(f"Server error: {e}")
             if args.debug:
                 import traceback
-                traceback.print_exc()
-        finally:
-            if MCP_CLIENT:
-                MCP_CLIENT.cleanup()
\ No newline at end of file
+                traceback.print_exc()
\ No newline at end of file
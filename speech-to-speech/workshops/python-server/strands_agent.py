@@ -6,7 +6,57 @@ import boto3
 import os
 import json
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import re
+import uuid
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from tool_cache import ToolResultCache, ToolCachePolicy
+
+# Seconds before an agent query or a direct tool call is abandoned
+STRANDS_QUERY_TIMEOUT = float(os.getenv("STRANDS_QUERY_TIMEOUT", "20"))
+STRANDS_TOOL_TIMEOUT = float(os.getenv("STRANDS_TOOL_TIMEOUT", "8"))
+# Seconds to reuse the answer of a repeated place or weather question
+STRANDS_CACHE_TTL = float(os.getenv("STRANDS_CACHE_TTL", "300"))
+
+# Can point at a local stub server for testing
+WEATHER_API_URL = os.getenv("WEATHER_API_URL", "https://api.open-meteo.com/v1/forecast")
+# Current weather changes slowly: reuse it for nearby coordinates for a few minutes
+WEATHER_CACHE_TTL = float(os.getenv("WEATHER_CACHE_TTL", "600"))
+WEATHER_COORDINATE_DECIMALS = 2  # About 1 km
+WEATHER_TIMEOUT = 5
+
+# Shared keep-alive session, so repeated lookups skip the TCP and TLS handshakes
+weather_session = requests.Session()
+weather_session.mount("https://", HTTPAdapter(pool_maxsize=8, max_retries=Retry(total=2, backoff_factor=0.2)))
+weather_session.mount("http://", HTTPAdapter(pool_maxsize=8))
+weather_cache = ToolResultCache({"weather": ToolCachePolicy(ttl=WEATHER_CACHE_TTL, max_entries=1024)})
+weather_cache_lock = threading.Lock()
+
+def get_current_weather(lat, lon):
+    """Return the current weather at the given coordinates, cached by rounded coordinates"""
+    key = {
+        "latitude": round(float(lat), WEATHER_COORDINATE_DECIMALS),
+        "longitude": round(float(lon), WEATHER_COORDINATE_DECIMALS)
+    }
+    with weather_cache_lock:
+        hit, current_weather = weather_cache.get("weather", key)
+    if hit:
+        return current_weather
+
+    params = dict(key, current_weather=True)
+    response = weather_session.get(WEATHER_API_URL, params=params, timeout=WEATHER_TIMEOUT)
+    response.raise_for_status()
+    current_weather = response.json()["current_weather"]
+    with weather_cache_lock:
+        weather_cache.put("weather", key, current_weather)
+    return current_weather
+
+async def get_current_weather_async(lat, lon):
+    """Async version of get_current_weather that runs the request on a worker thread"""
+    return await asyncio.to_thread(get_current_weather, lat, lon)
 
 @tool
 def weather(lat, lon: float) -> str:
@@ -16,14 +66,7 @@ def weather(lat, lon: float) -> str:
         lat: latitude of the location
         lon: logitude of the location
     """
-    url = "https://api.open-meteo.com/v1/forecast"
-    params = {
-        "latitude": str(lat),
-        "longitude": str(lon),
-        "current_weather": True
-    }
-    response = requests.get(url, params=params)
-    return response.json()["current_weather"]
+    return get_current_weather(lat, lon)
 
 class StrandsAgent:
 
@@ -60,6 +103,18 @@ class StrandsAgent:
             system_prompt="You are a chat agent tasked with answering location and weather-related questions. Please include your response within the <response></response> tag."
         )
 
+        # Tools that can be invoked directly, bypassing the agent
+        self.local_tools = {"weather": weather}
+        self.tool_names = {tool.tool_name for tool in self.aws_location_srv_tools} | set(self.local_tools)
+
+        # The agent keeps conversation state, so its queries run one at a time off the event loop.
+        # Direct tool calls do not touch the agent and get their own workers.
+        self.agent_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="strands-agent")
+        self.stalled_query = None  # Query that timed out but is still holding the agent worker
+        self.tool_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="strands-tool")
+        policy = ToolCachePolicy(ttl=STRANDS_CACHE_TTL, max_entries=256, text_fields={"query"})
+        self.cache = ToolResultCache({name: policy for name in self.tool_names | {"agent"}})
+
 
     '''
     Send the input to the agent, allowing it to handle tool selection and invocation. 
@@ -88,13 +143,65 @@ class StrandsAgent:
     '''
     def call_tool(self, tool_name, input):
         if isinstance(input, str):
-            input = json.loads(input)
-        if "query" in input:
-            input = input.get("query")
+            try:
+                input = json.loads(input)
+            except json.JSONDecodeError:
+                input = {"query": input}
+
+        if tool_name in self.local_tools:
+            arguments = {key: value for key, value in input.items() if key != "tool"}
+            return self.local_tools[tool_name](**arguments)
+
+        # Call the MCP server directly so the agent's conversation is not modified
+        arguments = {"query": input["query"] if "query" in input else input}
+        return self.aws_location_srv_client.call_tool_sync(
+            tool_use_id=str(uuid.uuid4()), name=tool_name, arguments=arguments
+        )
+
+    def resolve_tool(self, tool_name, input):
+        """Return the concrete tool named by Sonic's toolUse, either as the tool name or as a "tool" field of its input"""
+        if tool_name in self.tool_names:
+            return tool_name
+        if isinstance(input, str):
+            try:
+                input = json.loads(input)
+            except json.JSONDecodeError:
+                return None
+        if isinstance(input, dict) and input.get("tool") in self.tool_names:
+            return input["tool"]
+        return None
+
+    async def _run(self, executor, timeout, func, *args):
+        loop = asyncio.get_running_loop()
+        return await asyncio.wait_for(loop.run_in_executor(executor, func, *args), timeout=timeout)
+
+    async def query_async(self, input, timeout=STRANDS_QUERY_TIMEOUT):
+        """Run query() off the event loop, reusing the answer to a repeated question.
+
+        A timed-out query cannot be stopped and keeps the single agent worker busy.
+        Until it finishes, later queries fail immediately instead of queueing behind
+        it, so callers fall back at once rather than each waiting out the timeout.
+        """
+        return await self.cache.call("agent", input, lambda: self._query(input, timeout))
+
+    async def _query(self, input, timeout):
+        if self.stalled_query is not None and not self.stalled_query.done():
+            raise RuntimeError("The agent is still busy with a query that timed out")
+        future = self.agent_executor.submit(self.query, input)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=timeout)
+        except asyncio.TimeoutError:
+            # Cancelling only removes a query that was still queued; a running one carries on
+            if future.running():
+                self.stalled_query = future
+            raise
 
-        tool_func = getattr(self.agent.tool, tool_name)
-        return tool_func(query=input)
+    async def call_tool_async(self, tool_name, input, timeout=STRANDS_TOOL_TIMEOUT):
+        """Run call_tool() off the event loop, reusing the result of a repeated call"""
+        return await self.cache.call(tool_name, input, lambda: self._run(self.tool_executor, timeout, self.call_tool, tool_name, input))
 
     def close(self):
         # Cleanup the MCP server context
+        self.agent_executor.shutdown(wait=False)
+        self.tool_executor.shutdown(wait=False)
         self.aws_location_srv_client.__exit__(None, None, None)
\ No newline at end of file
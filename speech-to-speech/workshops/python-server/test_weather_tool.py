@@ -0,0 +1,76 @@
+"""
+Weather tool against a local stub server: one keep-alive connection, and one
+request per rounded coordinate within the cache TTL.
+
+    python -m pytest test_weather_tool.py
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import strands_agent
+
+
+class StubWeatherHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, so connection reuse is visible
+
+    def do_GET(self):
+        self.server.requests.append((self.client_address, self.path))
+        body = json.dumps({"current_weather": {"temperature": 12.5, "request": len(self.server.requests)}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubWeatherHandler)
+    server.daemon_threads = True
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(strands_agent, "WEATHER_API_URL", f"http://127.0.0.1:{server.server_port}/v1/forecast")
+    strands_agent.weather_cache.entries.clear()
+    yield server
+    # Drop the pooled keep-alive connection so the handler thread sees the close
+    strands_agent.weather_session.close()
+    server.shutdown()
+    server.server_close()
+
+
+def test_one_request_per_rounded_coordinate(stub_server):
+    first = strands_agent.get_current_weather(47.60621, -122.33207)
+    # Rounds to the same 47.61, -122.33 cell
+    assert strands_agent.get_current_weather(47.6059, -122.3321) == first
+    assert strands_agent.get_current_weather("47.606", "-122.332") == first
+    assert len(stub_server.requests) == 1
+    assert "latitude=47.61" in stub_server.requests[0][1] and "longitude=-122.33" in stub_server.requests[0][1]
+
+    strands_agent.get_current_weather(40.7128, -74.0060)
+    assert len(stub_server.requests) == 2
+
+
+def test_session_reuses_connection(stub_server):
+    for lat in (10.0, 20.0, 30.0):
+        strands_agent.get_current_weather(lat, 0.0)
+    clients = {client for client, _ in stub_server.requests}
+    assert len(stub_server.requests) == 3
+    assert len(clients) == 1
+
+
+def test_refetches_after_ttl(stub_server, monkeypatch):
+    monkeypatch.setattr(strands_agent.weather_cache.policies["weather"], "ttl", 0.2)
+    strands_agent.get_current_weather(51.5074, -0.1278)
+    strands_agent.get_current_weather(51.5074, -0.1278)
+    assert len(stub_server.requests) == 1
+    time.sleep(0.3)
+    strands_agent.get_current_weather(51.5074, -0.1278)
+    assert len(stub_server.requests) == 2
@@ -0,0 +1,92 @@
+import asyncio
+import json
+import re
+import time
+
+# Words that carry no meaning when comparing a transcript with a tool query
+STOP_WORDS = {
+    "a", "an", "the", "is", "are", "was", "be", "to", "of", "in", "on", "for", "and", "or", "what", "whats",
+    "how", "can", "could", "do", "does", "i", "me", "my", "you", "your", "it", "about", "tell", "please", "query"
+}
+
+# tool name -> transcript pattern predicting that Sonic will call it
+DEFAULT_RULES = {
+    "getkbtool": re.compile(r"\b(polic(y|ies)|guidelines?|rules?|allowed|community|refunds?|returns?)\b", re.IGNORECASE),
+    "locationmcptool": re.compile(r"\b(where|nearest|nearby|near me|directions?|address|restaurants?|cafes?|coffee|hotels?)\b", re.IGNORECASE),
+}
+
+
+def _terms(text):
+    """Meaningful lowercase words of a transcript or of the string values of a JSON tool input"""
+    try:
+        value = json.loads(text)
+        if isinstance(value, dict):
+            text = " ".join(str(item) for item in value.values())
+    except (json.JSONDecodeError, TypeError):
+        pass
+    return {word for word in re.findall(r"\w+", str(text).lower()) if word not in STOP_WORDS}
+
+
+class ToolPrefetcher:
+    """Runs likely tool lookups while Sonic is still reasoning about the user's turn.
+
+    Each USER transcript is matched against keyword rules. For every predicted
+    tool the fetcher runs in the background with the transcript as its query.
+    When Sonic then calls the tool, take() hands over the prefetched result if
+    the tool query shares enough words with the transcript. Predictions that
+    are not used within max_age seconds, or that are superseded by the next
+    transcript, are discarded.
+    """
+
+    def __init__(self, fetchers, rules=None, max_age=30.0, min_overlap=0.5):
+        self.fetchers = fetchers  # tool name -> callable(query) returning an awaitable result, or None to skip
+        self.rules = {tool: rule for tool, rule in (rules or DEFAULT_RULES).items() if tool in fetchers}
+        self.max_age = max_age
+        self.min_overlap = min_overlap
+        self.predictions = {}  # tool name -> (time, transcript terms, task)
+        self.counters = {"predicted": 0, "used": 0, "discarded": 0}
+
+    def observe(self, transcript):
+        """Predict tool calls from a USER transcript and start prefetching them"""
+        for tool, rule in self.rules.items():
+            if not rule.search(transcript):
+                continue
+            self._discard(tool)
+            fetch = self.fetchers[tool](transcript)
+            if fetch is None:
+                continue
+            task = asyncio.ensure_future(fetch)
+            # A failed prefetch only means the tool runs normally later
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self.predictions[tool] = (time.monotonic(), _terms(transcript), task)
+            self.counters["predicted"] += 1
+
+    def _discard(self, tool):
+        if self.predictions.pop(tool, None) is not None:
+            self.counters["discarded"] += 1
+
+    async def take(self, tool, query):
+        """Return (True, result) if a prefetch matches this tool call, (False, None) otherwise"""
+        prediction = self.predictions.get(tool)
+        if prediction is None:
+            return False, None
+        started, transcript_terms, task = prediction
+        query_terms = _terms(query)
+        if time.monotonic() - started > self.max_age or not query_terms:
+            self._discard(tool)
+            return False, None
+        if len(query_terms & transcript_terms) / len(query_terms) < self.min_overlap:
+            return False, None
+
+        del self.predictions[tool]
+        try:
+            result = await task
+        except Exception:
+            self.counters["discarded"] += 1
+            return False, None
+        self.counters["used"] += 1
+        return True, result
+
+    def stats(self):
+        """Return prediction counters"""
+        return dict(self.counters, outstanding=len(self.predictions))
@@ -0,0 +1,186 @@
+import asyncio
+import bisect
+import inspect
+import time
+from collections import deque
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram in milliseconds"""
+
+    BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms):
+        self.counts[bisect.bisect_left(self.BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, p):
+        """Upper bound of the bucket holding the p-th percentile, capped at the maximum observed"""
+        if not self.count:
+            return 0.0
+        rank = max(1, -(-p * self.count // 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                bound = self.BUCKETS_MS[index] if index < len(self.BUCKETS_MS) else self.max_ms
+                return round(min(bound, self.max_ms), 1)
+        return round(self.max_ms, 1)
+
+    def snapshot(self):
+        buckets = {f"le{bound}": count for bound, count in zip(self.BUCKETS_MS, self.counts)}
+        buckets["inf"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "meanMs": round(self.total_ms / self.count, 1) if self.count else 0.0,
+            "p50Ms": self.percentile(50),
+            "p95Ms": self.percentile(95),
+            "maxMs": round(self.max_ms, 1),
+            "buckets": buckets
+        }
+
+
+class CircuitBreaker:
+    """Opens when the error rate over the last calls is too high.
+
+    While open, calls are short-circuited. After the cooldown a single probe
+    call is let through: success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, window=20, min_calls=5, error_rate=0.5, cooldown=30.0):
+        self.results = deque(maxlen=window)
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.opened_at = 0.0
+
+    def allow(self):
+        """Return True if a call may go ahead"""
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+            self.state = "half_open"
+            return True
+        return self.state == "closed"
+
+    def record(self, success):
+        if self.state == "half_open":
+            if success:
+                self.state = "closed"
+                self.results.clear()
+            else:
+                self._open()
+            return
+
+        self.results.append(success)
+        failures = self.results.count(False)
+        if len(self.results) >= self.min_calls and failures / len(self.results) >= self.error_rate:
+            self._open()
+
+    def _open(self):
+        self.state = "open"
+        self.opened_at = time.monotonic()
+
+
+class ToolSpec:
+    """A registered tool with its latency budget and failure handling"""
+
+    def __init__(self, name, handler, timeout, retries, fallback, breaker):
+        self.name = name
+        self.handler = handler
+        self.timeout = timeout
+        self.retries = retries
+        self.fallback = fallback
+        self.breaker = breaker
+        self.latency = LatencyHistogram()
+        self.counters = {"calls": 0, "failures": 0, "timeouts": 0, "retries": 0, "fallbacks": 0, "shortCircuited": 0}
+
+
+class ToolRegistry:
+    """Dispatches tool calls by name, enforcing each tool's timeout, retries and fallback.
+
+    Handlers should be coroutines (or return awaitables) so the timeout can
+    interrupt them. When every attempt fails, or the tool's circuit breaker
+    is open, the caller gets the declared fallback response instead of an
+    exception.
+    """
+
+    def __init__(self):
+        self.tools = {}
+
+    def register(self, name, handler, timeout=5.0, retries=0, fallback=None, breaker=None):
+        self.tools[name] = ToolSpec(name, handler, timeout, retries, fallback, breaker or CircuitBreaker())
+
+    def __contains__(self, name):
+        return name in self.tools
+
+    async def invoke(self, name, *args):
+        """Call a registered tool, returning its fallback response if it cannot answer in time"""
+        spec = self.tools[name]
+        spec.counters["calls"] += 1
+        if not spec.breaker.allow():
+            spec.counters["shortCircuited"] += 1
+            return spec.fallback
+
+        for attempt in range(spec.retries + 1):
+            if attempt:
+                spec.counters["retries"] += 1
+            start = time.perf_counter()
+            try:
+                result = spec.handler(*args)
+                if inspect.isawaitable(result):
+                    result = await asyncio.wait_for(result, timeout=spec.timeout)
+                spec.latency.observe((time.perf_counter() - start) * 1000)
+                spec.breaker.record(True)
+                return result
+            except asyncio.TimeoutError:
+                spec.counters["timeouts"] += 1
+                print(f"Tool {name} timed out after {spec.timeout}s")
+            except Exception as ex:
+                print(f"Tool {name} failed: {ex}")
+            spec.latency.observe((time.perf_counter() - start) * 1000)
+            spec.counters["failures"] += 1
+            spec.breaker.record(False)
+            if spec.breaker.state == "open":
+                break
+
+        spec.counters["fallbacks"] += 1
+        return spec.fallback
+
+    def circuit_open(self, name):
+        """True while the tool's circuit breaker is open or probing, without taking the probe"""
+        return self.tools[name].breaker.state != "closed"
+
+    def allow(self, name):
+        """Return True if a call made outside invoke(), such as a streamed result, may go ahead"""
+        spec = self.tools[name]
+        spec.counters["calls"] += 1
+        if spec.breaker.allow():
+            return True
+        spec.counters["shortCircuited"] += 1
+        return False
+
+    def record(self, name, success, elapsed_ms, timed_out=False):
+        """Record the outcome of a call made outside invoke()"""
+        spec = self.tools[name]
+        spec.latency.observe(elapsed_ms)
+        if timed_out:
+            spec.counters["timeouts"] += 1
+        if not success:
+            spec.counters["failures"] += 1
+            spec.counters["fallbacks"] += 1
+        spec.breaker.record(success)
+
+    def stats(self):
+        """Return counters, circuit state and latency histogram per tool"""
+        return {
+            name: dict(spec.counters, circuit=spec.breaker.state, latency=spec.latency.snapshot())
+            for name, spec in self.tools.items()
+        }